@@ -6,28 +6,36 @@ Key functionalities include:
 
 - Downloading time series datasets based on predefined URLs.
 - Updating lists of selected models and datasets for analysis, which can be customized per run.
-- Running statistical analysis scripts, including fixed horizon analysis with an R script.
+- Running the fixed horizon experiments in R, as one task per chosen (dataset, model, lag) with its result files as targets.
 - Generating statistical summary tables (Table 1 and Table 2) from the processed data.
 - Transforming these tables into LaTeX format for inclusion in reports.
 - Compiling the final report from LaTeX files, ensuring all results are up-to-date and formatted correctly.
 
 Each task is defined with specific actions, dependencies, and triggers to ensure that only the necessary steps are rerun,
-optimizing the workflow's efficiency. This setup allows for a modular and scalable approach to managing complex data analysis projects, facilitating easy updates and modifications to the analysis pipeline.
+optimizing the workflow's efficiency. A task depends on the content of its inputs (the .tsf files, the result files or the
+tables it reads), on the code producing its outputs and on the part of the configuration below it uses, so running `doit`
+again after a completed run does nothing, and a run stopped midway only reruns the experiments whose results are missing.
+The experiments are independent tasks, so `doit -n <cores>` runs them in parallel.
+The tables and statistics run in the warm worker of 'src/warm_worker.py' when it is started, which keeps the parsed datasets
+and the imported modules between runs, and in the `doit` process otherwise. This setup allows for a modular and scalable approach to managing complex data analysis projects, facilitating easy updates and modifications to the analysis pipeline.
 """
 import sys
 sys.path.insert(1, './src/')
 
 
+import hashlib
+import json
+import shlex
 import config
 from pathlib import Path
-from doit.tools import run_once
+from doit.dependency import get_file_md5
+from doit.tools import config_changed
 from src.data_download import download_and_extract_zip
 from src.data_download import URLS
 from src.website_update_results import convert_tables_to_json
-from src.tables_create import convert_tsf_to_dataframe
-from src.tables_create import generate_table1_dataframe, generate_table2_dataframe
+from src.tables_create import DATASETS_TO_INFO
 from src.tables_to_latex import upload_table_download_latex
-from src.test_data_download import test_data_download
+from src.warm_worker import run_in_worker
 
 BASE_DIR = Path(config.BASE_DIR)
 OUTPUT_DIR = Path(config.OUTPUT_DIR)
@@ -60,6 +68,14 @@ CHOSEN_DATASETS = [
     'm1_yearly_dataset'
 ]
 
+"""
+The BUDGET_HOURS is the wall-clock time available to run the chosen models on BUDGET_CORES cores.
+If set, a warning is shown before running them when their runtime, predicted from past runs, exceeds it.
+"""
+
+BUDGET_HOURS = None
+BUDGET_CORES = 1
+
 """
 The OTHER_ERROR_TABLES are the tables that generate other error metrics for the models.
 """
@@ -78,6 +94,128 @@ OTHER_ERROR_TABLES = {
 }
 
 
+"""
+The code each group of tasks depends on: changing any of these files reruns the tasks.
+"""
+
+TABLES_CODE = ['src/tables_create.py', 'src/config.py', 'src/utils/instrumentation.py']
+STATISTICS_CODE = ['src/error_statistics.py', 'src/tables_create.py', 'src/config.py', 'src/utils/error_store.py']
+LATEX_CODE = ['src/tables_to_latex.py', 'src/config.py']
+WEBSITE_CODE = ['src/website_update_results.py', 'src/config.py']
+FIXED_HORIZON_CODE = [
+    'src/experiments/fixed_horizon_job.R',
+    'src/experiments/fixed_horizon_functions.R',
+    'src/models/local_univariate_models.R',
+    'src/models/global_models.R',
+    'src/utils/data_loader.R',
+    'src/utils/error_calculator.R',
+    'src/utils/global_model_helper.R',
+]
+REPORT_FILES = [
+    'reports/report.tex',
+    'reports/_article_header.tex',
+    'reports/_lean_header.tex',
+    'reports/bibliography.bib',
+    'reports/jpe.bst',
+]
+
+"""
+The error files written by each fixed horizon experiment, from 'calculate_errors' in 'error_calculator.R'.
+"""
+
+FIXED_HORIZON_ERROR_SUFFIXES = ['', '_smape', '_msmape', '_mase', '_mae', '_rmse']
+
+"""
+The arguments of 'fixed_horizon_job.R', in order, taken from the jobs of 'cost_model.r_experiment_jobs'.
+"""
+
+FIXED_HORIZON_JOB_ARGUMENTS = [
+    'call', 'dataset_name', 'method', 'input_file_name', 'lag', 'key', 'index', 'external_forecast_horizon', 'integer_conversion',
+]
+
+"""
+The results read by the tables, which are only known once the experiments ran.
+"""
+
+FIXED_HORIZON_ERRORS = ['results/fixed_horizon_errors/*.txt']
+ERROR_MATRICES = ['results/fixed_horizon_error_matrices/*']
+# The error tables read by the website, without the statistics of Table 2
+OUTPUT_TABLES = ['output/tables/table2.csv', 'output/tables/table_*.csv']
+
+
+class inputs_changed(object):
+    """
+    doit 'uptodate' check of a configuration and of the content of the files matching some glob patterns.
+
+    Unlike 'file_dep', the files are listed when the task is checked, after the tasks it depends on ran, so results
+    written earlier in the same run are taken into account. As in the MD5 checker of doit, a file whose modification
+    time and size did not change since the last successful run keeps its hash, and the others are hashed again.
+    """
+    def __init__(self, config=None, patterns=()):
+        self.config = config or {}
+        self.patterns = patterns
+        self.digest = None
+        self.file_states = {}
+
+    def current_file_states(self, last_file_states):
+        file_states = {}
+        for pattern in self.patterns:
+            for path in sorted(BASE_DIR.glob(pattern)):
+                if not path.is_file():
+                    continue
+                name = str(path.relative_to(BASE_DIR))
+                stat = path.stat()
+                last_state = last_file_states.get(name)
+                if last_state is not None and last_state[:2] == [stat.st_mtime_ns, stat.st_size]:
+                    file_states[name] = last_state
+                else:
+                    file_states[name] = [stat.st_mtime_ns, stat.st_size, get_file_md5(path)]
+        return file_states
+
+    def configure_task(self, task):
+        task.value_savers.append(lambda: {'_inputs_changed': self.digest, '_inputs_file_states': self.file_states})
+
+    def __call__(self, task, values):
+        """Returns True if the configuration and the files are UNCHANGED"""
+        self.file_states = self.current_file_states(values.get('_inputs_file_states') or {})
+        content = json.dumps(
+            {'config': self.config, 'files': {name: state[2] for name, state in self.file_states.items()}},
+            sort_keys=True
+        )
+        self.digest = hashlib.md5(content.encode('utf-8')).hexdigest()
+        return values.get('_inputs_changed') == self.digest
+
+
+def chosen_models_list():
+    """The models set to True in CHOSEN_MODELS"""
+    return [model for model, value in CHOSEN_MODELS.items() if value]
+
+
+def fixed_horizon_jobs():
+    """The experiments of 'fixed_horizon.R' for the CHOSEN_MODELS and CHOSEN_DATASETS"""
+    if chosen_models_list() == [] or CHOSEN_DATASETS == []:
+        return []
+    from src.experiments.cost_model import chosen_jobs
+    return chosen_jobs(CHOSEN_MODELS, CHOSEN_DATASETS)
+
+
+def fixed_horizon_targets(jobs):
+    """The error files of the experiments, read by the tables"""
+    return [
+        BASE_DIR / 'results' / 'fixed_horizon_errors' / f"{job['name']}{suffix}.txt"
+        for job in jobs for suffix in FIXED_HORIZON_ERROR_SUFFIXES
+    ]
+
+
+def r_argument(value):
+    """Converts an argument of an experiment to the command line of 'fixed_horizon_job.R'"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    return str(value)
+
+
 def update_chosen_models_and_datasets():
     """Update the chosen models and datasets"""
     with open('src/chosen_datasets.txt', 'w') as f:
@@ -85,10 +223,12 @@ def update_chosen_models_and_datasets():
             f.write(f'{dataset}\n')
 
     with open('src/chosen_models.txt', 'w') as f:
-        chosen_models_list = [model for model, value in CHOSEN_MODELS.items() if value]
-        chosen_models_list = ['all'] if 'all' in chosen_models_list else chosen_models_list
-        for model in chosen_models_list:
+        chosen_models = ['all'] if 'all' in chosen_models_list() else chosen_models_list()
+        for model in chosen_models:
             f.write(f'{model}\n')
+
+    from src.experiments.cost_model import warn_if_over_budget
+    warn_if_over_budget(CHOSEN_MODELS, CHOSEN_DATASETS, BUDGET_HOURS, BUDGET_CORES)
     return True
 
 
@@ -109,33 +249,55 @@ def task_update_chosen_models_and_datasets():
     return {
         'actions': [update_chosen_models_and_datasets],
         'targets': ['src/chosen_models.txt', 'src/chosen_datasets.txt'],
-        'uptodate': [False],
+        'uptodate': [config_changed({
+            'CHOSEN_MODELS': CHOSEN_MODELS,
+            'CHOSEN_DATASETS': CHOSEN_DATASETS,
+            'BUDGET_HOURS': BUDGET_HOURS,
+            'BUDGET_CORES': BUDGET_CORES,
+        })],
         'clean': True,
     }
 
 
-def task_run_fixed_horizon_R_script():
-    """Run the R script for fixed horizon analysis."""
-    def run_if_lists_not_empty(task):
-        chosen_models_list = [model for model, value in CHOSEN_MODELS.items() if value]
-        # Return True (up-to-date) if both lists are empty, False (not up-to-date) otherwise
-        if chosen_models_list == [] or CHOSEN_DATASETS == []:
-            return True
-        else:
-            return False
-
+def task_install_R_packages():
+    """Install the R packages of the fixed horizon experiments, once before they run."""
     return {
-        'actions': ['Rscript src/experiments/fixed_horizon.R'],  # Command to run the R script
-        'uptodate': [run_if_lists_not_empty],
+        'actions': ['Rscript src/experiments/install_packages.R'],
+        # Rerun only when the list of packages changes
+        'file_dep': ['src/experiments/install_packages.R'],
     }
 
 
+def task_run_fixed_horizon_R_script():
+    """Run the fixed horizon experiments of the R script, one subtask per chosen dataset, model and lag."""
+    # No subtask if no model or dataset is chosen, the tables are then generated with the current results
+    for job in fixed_horizon_jobs():
+        arguments = {name: job[name] for name in FIXED_HORIZON_JOB_ARGUMENTS}
+        data_file = DATA_DIR / job['input_file_name']
+        yield {
+            'name': job['name'],
+            'actions': [shlex.join(['Rscript', 'src/experiments/fixed_horizon_job.R'] + [r_argument(value) for value in arguments.values()])],
+            'file_dep': FIXED_HORIZON_CODE + ([data_file] if job['input_file_name'] in URLS or data_file.exists() else []),
+            'task_dep': ['update_chosen_models_and_datasets', 'install_R_packages'],
+            'targets': fixed_horizon_targets([job]),
+            # Rerun when the call of the experiment changes in 'fixed_horizon.R'
+            'uptodate': [config_changed(arguments)],
+            'clean': True,
+        }
+
+
 def task_generate_table1():
     """Generate table1.csv from the downloaded data."""
+    # The datasets of Table 1 that are either downloaded by 'task_download_data' or already in the data folder
+    dataset_files = [
+        DATA_DIR / file
+        for dataset_info in DATASETS_TO_INFO.values() for file in dataset_info['Datasets']
+        if file in URLS or (DATA_DIR / file).exists()
+    ]
     return {
-        'actions': [(generate_table1_dataframe, [DATA_DIR])],
-        'targets': [BASE_DIR / 'results' / 'tables' / 'table1.csv'],
-        'uptodate': [False],  # Force re-download every time if equals to False
+        'actions': [(run_in_worker, ['tables_create.generate_table1_dataframe', DATA_DIR])],
+        'file_dep': sorted(set(dataset_files)) + TABLES_CODE,
+        'targets': [BASE_DIR / 'output' / 'tables' / 'table1.csv', BASE_DIR / 'output' / 'tables' / 'table1.xlsx'],
         'clean': True,
     }
 
@@ -143,9 +305,26 @@ def task_generate_table1():
 def task_generate_table2():
     """Generate table2.csv from the downloaded data."""
     return {
-        'actions': [(generate_table2_dataframe, ['Mean MASE'])],
-        'targets': [BASE_DIR / 'results' / 'tables' / 'table2.csv'],
-        'uptodate': [False],  # Force re-download every time if equals to False
+        'actions': [(run_in_worker, ['tables_create.generate_table2_dataframe', 'Mean MASE'])],
+        'file_dep': TABLES_CODE + fixed_horizon_targets(fixed_horizon_jobs()),
+        'targets': [BASE_DIR / 'output' / 'tables' / 'table2.csv', BASE_DIR / 'output' / 'tables' / 'table2.xlsx'],
+        'uptodate': [inputs_changed({'error_measure': 'Mean MASE'}, FIXED_HORIZON_ERRORS)],
+        'clean': True,
+        'verbosity': 0
+    }
+
+
+def task_generate_table2_statistics():
+    """Generate the confidence intervals and model comparisons of table2 from the per-series errors."""
+    return {
+        # doit only accepts True, None, a string or a dict as the result of a successful action, not the DataFrames
+        'actions': [lambda: run_in_worker('error_statistics.generate_error_statistics_tables') is not None],
+        'file_dep': STATISTICS_CODE + fixed_horizon_targets(fixed_horizon_jobs()),
+        'targets': [
+            BASE_DIR / 'output' / 'tables' / 'table2_statistics.csv',
+            BASE_DIR / 'output' / 'tables' / 'table2_pairwise_tests.csv',
+        ],
+        'uptodate': [inputs_changed(patterns=FIXED_HORIZON_ERRORS + ERROR_MATRICES)],
         'clean': True,
         'verbosity': 0
     }
@@ -156,9 +335,10 @@ def task_generate_other_error_tables():
     for name, error_metric in OTHER_ERROR_TABLES.items():
         yield {
             'name': name,
-            'actions': [(generate_table2_dataframe, [error_metric, name])],
-            'targets': [BASE_DIR / 'results' / 'tables' / f'{name}.csv'],
-            'uptodate': [False],  # Force re-download every time if equals to False
+            'actions': [(run_in_worker, ['tables_create.generate_table2_dataframe', error_metric, name])],
+            'file_dep': TABLES_CODE + fixed_horizon_targets(fixed_horizon_jobs()),
+            'targets': [BASE_DIR / 'output' / 'tables' / f'{name}.csv', BASE_DIR / 'output' / 'tables' / f'{name}.xlsx'],
+            'uptodate': [inputs_changed({'error_measure': error_metric}, FIXED_HORIZON_ERRORS)],
             'clean': True,
             'verbosity': 0
         }
@@ -168,9 +348,8 @@ def task_transform_table1_to_latex():
     """Generate table1.csv from the downloaded data."""
     return {
         'actions': [(upload_table_download_latex, ['output/tables/table1.csv', 'table1', lambda x: '{:.0f}'.format(x)])],
-        "file_dep": [BASE_DIR / 'output' / 'tables' / 'table1.csv'],
+        "file_dep": [BASE_DIR / 'output' / 'tables' / 'table1.csv'] + LATEX_CODE,
         'targets': [BASE_DIR / 'output' / 'tables' / 'table1.tex'],
-        'uptodate': [False],  # Force to generate table1 every time
         'clean': True,
         'verbosity': 0
     }
@@ -212,9 +391,8 @@ def task_transform_other_error_tables_to_latex():
                 upload_table_download_latex,
                 [f'output/tables/{name}.csv', name, lambda x: show_numeric_results(x), lambda x: '{:.2%}'.format(x), True]
             )],
-            "file_dep": [BASE_DIR / 'output' / 'tables' / f'{name}.csv'],
+            "file_dep": [BASE_DIR / 'output' / 'tables' / f'{name}.csv'] + LATEX_CODE,
             'targets': [BASE_DIR / 'output' / 'tables' / f'{name}.tex'],
-            'uptodate': [False],  # Force to generate table2 every time
             'clean': True,
             'verbosity': 0
         }
@@ -227,9 +405,8 @@ def task_transform_table2_to_latex():
             upload_table_download_latex,
             ['output/tables/table2.csv', 'table2', lambda x: '{:.3f}'.format(x), lambda x: '{:.2%}'.format(x), True]
         )],
-        "file_dep": [BASE_DIR / 'output' / 'tables' / 'table2.csv'],
+        "file_dep": [BASE_DIR / 'output' / 'tables' / 'table2.csv'] + LATEX_CODE,
         'targets': [BASE_DIR / 'output' / 'tables' / 'table2.tex'],
-        'uptodate': [False],  # Force to generate table2 every time
         'clean': True,
         'verbosity': 0
     }
@@ -239,8 +416,10 @@ def task_update_website_results():
     """Generate table1.csv from the downloaded data."""
     return {
         'actions': [convert_tables_to_json],
+        'file_dep': WEBSITE_CODE,
+        'task_dep': ['generate_table2', 'generate_other_error_tables'],
         'targets': [BASE_DIR / 'mtsr-web' / 'src' / 'Components' / 'test.json'],
-        'uptodate': [False],
+        'uptodate': [inputs_changed(patterns=OUTPUT_TABLES)],
         'clean': True,
         'verbosity': 0
     }
@@ -254,7 +433,8 @@ def task_compile_latex_docs():
             "latexmk -xelatex -c -cd ./reports/report.tex",  # Clean
         ],
         "targets": ["./reports/report.pdf"],
-        "file_dep": ["./reports/report.tex"],
-        'uptodate': [False],
+        "file_dep": REPORT_FILES + [
+            BASE_DIR / 'output' / 'tables' / f'{name}.tex' for name in ['table1', 'table2'] + list(OTHER_ERROR_TABLES)
+        ],
         "clean": True,
     }
\ No newline at end of file
@@ -5,7 +5,19 @@ The script calculates a variety of summary statistics to describe the central te
 It also performs advanced statistical tests to assess the stationarity and heteroscedasticity of the series,
 which are essential properties for many time series modeling techniques.
 
+The pipeline is lazy: each output declares the columns it needs (STATISTICS_COLUMNS), and the per-observation timestamps
+are only materialized when one of them asks for it. The first and last timestamps of the summary statistics are otherwise
+derived from 'start_timestamp', the frequency and the length of each series, so summary-only runs do no per-observation datetime work.
+
+Series are transformed in chunks sized by a memory budget on the number of exploded points, so small datasets are processed
+in a few large chunks while very long series are split into sub-chunks whose values are gathered before their statistics are calculated.
+
+Datasets listed in STREAMING_STATISTICS_DATASETS are summarized in a single pass over the .tsf file instead, with exact
+mergeable moments and quantile sketches (see 'streaming_statistics.py'), so series larger than the memory can be summarized.
+
 The output is a comprehensive set of metrics for each time series, saved in a CSV file for further examination or reporting.
+Results are appended chunk by chunk to parquet files together with a checkpoint of the completed series, so an interrupted run
+resumes where it stopped instead of starting over. The Excel file is an optional final export built from those parts.
 This automated statistical evaluation aids in the preliminary assessment of time series data, streamlining the data analysis pipeline in forecasting projects.
 '''
 import pandas as pd
@@ -13,20 +25,21 @@ import numpy as np
 import os
 import datetime
 import sys
+import json
 import re
 from itertools import chain
 from dateutil.relativedelta import relativedelta
-from statsmodels.tsa.stattools import adfuller
 import warnings
 warnings.filterwarnings("ignore", message="divide by zero encountered in log")
-import matplotlib.pyplot as plt
-from arch import arch_model
 try:
     from src.tables_create import convert_tsf_to_dataframe
+    import src.streaming_statistics as streaming_statistics
+    from src.utils import instrumentation
 except:
     from tables_create import convert_tsf_to_dataframe
-import seaborn as sns
-sns.set_style("whitegrid")
+    import streaming_statistics
+    from utils import instrumentation
+import config
 
 EASY_FREQUENCY_TO_RELATIVEDELTA = {
     'minutely': 'minutes',
@@ -42,6 +55,41 @@ ONLY_SELECTED_DATASETS = [
     'm1_yearly_dataset.tsf'
 ]
 
+STATISTICS_DIR = 'results/summary_statistics'
+
+'''Set to False to keep only the parquet parts and skip the final Excel export'''
+EXPORT_EXCEL = True
+
+'''
+Columns of the transformed dataset needed by each output. The 'timestamp' of each observation is only built when an
+output lists it: the summary statistics take the first and last timestamps from 'calc_series_bounds' instead.
+'''
+STATISTICS_COLUMNS = {
+    'summary': ['series_value'],
+    'advanced': ['series_value'],
+}
+
+'''Outputs calculated by process_dataset. Keep only 'summary' to skip the ADF and GARCH tests'''
+STATISTICS_TO_CALCULATE = ['summary', 'advanced']
+
+'''
+Datasets summarized in streaming mode: one pass over the file, without loading it into a DataFrame.
+Mean, std and skew are exact, the median and quartiles come from quantile sketches (rank error of about 1.5%)
+and the advanced statistics (ADF and GARCH) are not calculated.
+'''
+STREAMING_STATISTICS_DATASETS = [
+    'solar_4_seconds_dataset.tsf',
+    'wind_4_seconds_dataset.tsf',
+    'london_smart_meters_dataset_with_missing_values.tsf',
+    'london_smart_meters_dataset_without_missing_values.tsf',
+]
+
+'''Number of series written per part in streaming mode'''
+STREAMING_SERIES_PER_PART = 1000
+
+'''Approximate memory used by one exploded observation: series name, timestamp and value as Python objects in a DataFrame row'''
+BYTES_PER_EXPLODED_POINT = 250
+
 
 def relative_time_func(frequency):
     """
@@ -94,7 +142,75 @@ def relative_time_func(frequency):
 
 
 
-def transform_dataset(dataset_raw, frequency):
+def plan_chunks(series_lengths, max_points_per_chunk):
+    """
+    Groups consecutive series into chunks whose total number of points does not exceed a budget.
+
+    Parameters:
+    - series_lengths (array-like): The number of points of each series, in the order of the dataset.
+    - max_points_per_chunk (int): The maximum number of points a chunk can hold.
+
+    Returns:
+    - A list of chunks, each one a list of (row, start, stop) tuples selecting the points start:stop of a row.
+      Series longer than the budget are split into sub-chunks, each one alone in its chunk.
+    """
+    chunks = []
+    current_chunk = []
+    current_points = 0
+    for row, length in enumerate(series_lengths):
+        length = int(length)
+        if length > max_points_per_chunk:
+            if current_chunk:
+                chunks.append(current_chunk)
+                current_chunk, current_points = [], 0
+            for start in range(0, length, max_points_per_chunk):
+                chunks.append([(row, start, min(start + max_points_per_chunk, length))])
+            continue
+        if current_chunk and current_points + length > max_points_per_chunk:
+            chunks.append(current_chunk)
+            current_chunk, current_points = [], 0
+        current_chunk.append((row, 0, length))
+        current_points += length
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def explode_partial_dataset(partial_dataset_raw, delta_frequency, first_index=0, with_timestamps=True):
+    """
+    Expands the series of a partial dataset into one row per observation, with its timestamp.
+
+    Parameters:
+    - partial_dataset_raw (DataFrame): The rows to expand, with 'start_timestamp' and 'series_value' columns.
+    - delta_frequency (function): Function returning the time change of a number of periods, from 'relative_time_func'.
+    - first_index (int): Position of the first value of 'series_value' inside the original series, used for sub-chunks.
+    - with_timestamps (bool): Whether to build the 'timestamp' of each observation. If False, only the values are expanded.
+
+    Returns:
+    - The expanded partial dataset (DataFrame).
+    """
+    if not with_timestamps:
+        return partial_dataset_raw.drop('start_timestamp', axis=1, errors='ignore').explode('series_value')
+    partial_dataset = (
+        partial_dataset_raw
+        .assign(timestamp=lambda df: df.apply(
+            lambda row: [
+                (row.start_timestamp + delta_frequency(i)) for i in range(first_index, first_index + len(row.series_value))
+            ], axis=1
+        ))
+        .drop('start_timestamp', axis=1)
+        .assign(timestamp_series_value=lambda df: df.apply(
+            lambda row: list(zip(row['series_value'], row['timestamp'])), axis=1
+        ))
+        .explode('timestamp_series_value')
+        .assign(series_value=lambda df: df.apply(lambda row: row.timestamp_series_value[0], axis=1))
+        .assign(timestamp=lambda df: df.apply(lambda row: row.timestamp_series_value[1], axis=1))
+        .drop('timestamp_series_value', axis=1)
+    )
+    return partial_dataset
+
+
+def transform_dataset(dataset_raw, frequency, memory_budget_mb=config.ANALYSIS_MEMORY_BUDGET_MB, columns=None):
     """
     Transforms a raw dataset by expanding each time series based on the specified frequency, creating
     a timestamp for each value in the series.
@@ -102,29 +218,34 @@ def transform_dataset(dataset_raw, frequency):
     Parameters:
     - dataset_raw (DataFrame): The raw dataset containing a 'start_timestamp' and 'series_value' columns.
     - frequency (str): The frequency at which to generate new timestamps for each series value.
+    - memory_budget_mb (float): Approximate memory a chunk may use, converted to a number of points per chunk.
+    - columns (list, optional): The columns needed by the consumers. The 'timestamp' column is only built if it is
+      listed, or if no list is given.
 
     Yields:
-    - Partial transformed datasets (DataFrame) in chunks of 100 rows.
+    - Partial transformed datasets (DataFrame), each holding at most the budgeted number of points.
+      Series longer than the budget are yielded in sub-chunks, marked with attrs['sub_chunk'] = (index, number of sub-chunks).
     """    
     delta_frequency = relative_time_func(frequency)
-    for i in range(0, len(dataset_raw.index), 100):
-        partial_dataset_raw = dataset_raw.iloc[i:min(i+100, len(dataset_raw.index))]
-        partial_dataset = (
-            partial_dataset_raw
-            .assign(timestamp=lambda df: df.apply(
-                lambda row: [
-                    (row.start_timestamp + delta_frequency(i)) for i in range(0, len(row.series_value))
-                ], axis=1
-            ))
-            .drop('start_timestamp', axis=1)
-            .assign(timestamp_series_value=lambda df: df.apply(
-                lambda row: list(zip(row['series_value'], row['timestamp'])), axis=1
-            ))
-            .explode('timestamp_series_value')
-            .assign(series_value=lambda df: df.apply(lambda row: row.timestamp_series_value[0], axis=1))
-            .assign(timestamp=lambda df: df.apply(lambda row: row.timestamp_series_value[1], axis=1))
-            .drop('timestamp_series_value', axis=1)
+    with_timestamps = columns is None or 'timestamp' in columns
+    max_points_per_chunk = max(1, int(memory_budget_mb * 1024 ** 2 / BYTES_PER_EXPLODED_POINT))
+    series_lengths = dataset_raw.series_value.map(len).to_numpy()
+    chunks = plan_chunks(series_lengths, max_points_per_chunk)
+    for chunk in chunks:
+        rows = [row for row, _, _ in chunk]
+        partial_dataset_raw = dataset_raw.iloc[rows]
+        row, start, stop = chunk[0]
+        if stop - start == series_lengths[row]:
+            yield explode_partial_dataset(partial_dataset_raw, delta_frequency, with_timestamps=with_timestamps)
+            continue
+        partial_dataset_raw = partial_dataset_raw.assign(
+            series_value=[partial_dataset_raw.series_value.iloc[0][start:stop]]
+        )
+        partial_dataset = explode_partial_dataset(
+            partial_dataset_raw, delta_frequency, first_index=start, with_timestamps=with_timestamps
         )
+        n_sub_chunks = -(-int(series_lengths[row]) // max_points_per_chunk)
+        partial_dataset.attrs['sub_chunk'] = (start // max_points_per_chunk, n_sub_chunks)
         yield partial_dataset
 
 
@@ -161,16 +282,57 @@ def transform_entire_dataset(dataset_raw, frequency):
     yield dataset
 
 
-def calc_summary_statistics(dataset):
+def calc_series_bounds(dataset_raw, frequency):
+    """
+    Derives the first and last timestamps and the number of observations of each series arithmetically,
+    from its 'start_timestamp', the frequency and its length, without expanding the series.
+
+    Parameters:
+    - dataset_raw (DataFrame): The raw dataset containing 'series_name', 'start_timestamp' and 'series_value' columns.
+    - frequency (str): The frequency of the dataset.
+
+    Returns:
+    - A DataFrame indexed by 'series_name' with the 'timestamp_min', 'timestamp_max' and 'n_obs' of each series.
+    """
+    delta_frequency = relative_time_func(frequency)
+    n_obs = dataset_raw.series_value.map(len).to_numpy()
+    return pd.DataFrame({
+        'timestamp_min': dataset_raw.start_timestamp.to_numpy(),
+        'timestamp_max': [
+            start_timestamp + delta_frequency(int(n) - 1) for start_timestamp, n in zip(dataset_raw.start_timestamp, n_obs)
+        ],
+        'n_obs': n_obs,
+    }, index=pd.Index(dataset_raw.series_name, name='series_name'))
+
+
+def calc_summary_statistics(dataset, series_bounds=None):
     """
     Calculates summary statistics for each series in the dataset.
 
     Parameters:
     - dataset (DataFrame): The dataset to calculate summary statistics for.
+    - series_bounds (DataFrame, optional): The output of 'calc_series_bounds', used for the timestamps and number of
+      observations when the dataset was transformed without its 'timestamp' column.
 
     Returns:
     - A DataFrame containing summary statistics (mean, std, median, q1, q3, skewness, etc.) for each series.
     """    
+    if 'timestamp' not in dataset.columns:
+        value_statistics = (
+            dataset
+            .assign(series_value=lambda df: df.series_value.astype(float))
+            .groupby('series_name')
+            .series_value
+            .agg(['mean', 'std', 'median', lambda x: x.quantile(.25), lambda x: x.quantile(.75), 'skew'])
+            .set_axis(['mean', 'std', 'median', 'q1', 'q3', 'skew'], axis=1)
+        )
+        return (
+            series_bounds
+            .loc[value_statistics.index]
+            .join(value_statistics)
+            .assign(lenght_days=lambda df: df.apply(lambda row: (row.timestamp_max - row.timestamp_min).days, axis=1))
+            .assign(coef_variation=lambda df: df['std'] / df['mean'])
+        )
     summary_statistics_dataset = (
         dataset
         .assign(series_value=lambda df: df.series_value.astype(float))
@@ -196,6 +358,9 @@ def test_stationarity(series):
     Returns:
     - A dictionary containing the ADF statistic and pvalue
     """    
+    # statsmodels is only imported by the advanced statistics
+    from statsmodels.tsa.stattools import adfuller
+
     try:
         series_wout_na = pd.to_numeric(series, errors='coerce').dropna()
         series_wout_na = series_wout_na.map(lambda x: ((x - series_wout_na.mean()) / series_wout_na.std()))
@@ -226,6 +391,9 @@ def test_heterocedasticity(series, stationary=False):
     - A dictionary containing the test results, including the GARCH model's R-squared and p-values for alpha, beta,
       omega, and whether the series is heteroscedastic.
     """    
+    # arch is only imported by the advanced statistics
+    from arch import arch_model
+
     try:
         series_wout_na = pd.to_numeric(series, errors='coerce').dropna()
         if not stationary:
@@ -279,21 +447,295 @@ def calc_advanced_statistics(dataset):
     return dataset_adv_stats
 
 
+def calc_chunk_statistics(dataset_part, series_bounds=None, statistics=STATISTICS_TO_CALCULATE):
+    """
+    Calculates the requested statistics of the complete series of a transformed chunk.
+
+    Parameters:
+    - dataset_part (DataFrame): A partial transformed dataset, as yielded by 'transform_dataset'.
+    - series_bounds (DataFrame, optional): The output of 'calc_series_bounds', needed for the summary statistics
+      of chunks transformed without timestamps.
+    - statistics (list): The outputs to calculate, keys of STATISTICS_COLUMNS.
+
+    Returns:
+    - A DataFrame with one row of statistics per series and a 'series_name' column.
+    """
+    statistics_parts = []
+    if 'summary' in statistics:
+        statistics_parts.append(calc_summary_statistics(dataset_part, series_bounds).reset_index())
+    if 'advanced' in statistics:
+        statistics_parts.append(calc_advanced_statistics(dataset_part))
+    if not statistics_parts:
+        raise Exception(f'No statistics to calculate: choose among {list(STATISTICS_COLUMNS)}')
+    statistics_part = statistics_parts[0]
+    for other_statistics_part in statistics_parts[1:]:
+        statistics_part = pd.merge(statistics_part, other_statistics_part, on='series_name')
+    return statistics_part
+
+
+def calc_streaming_summary_statistics(series_name, start_timestamp, n_obs, moments, sketch, delta_frequency):
+    """
+    Converts the streaming states of a series into the same summary statistics as 'calc_summary_statistics'.
+
+    Parameters:
+    - series_name (str): The name of the series.
+    - start_timestamp (datetime): The timestamp of the first value of the series, or None if not available.
+    - n_obs (int): The number of values of the series, including missing ones.
+    - moments (dict): The moments state of the series values.
+    - sketch (dict): The quantile sketch of the series values.
+    - delta_frequency (function): Function returning the time change of a number of periods, from 'relative_time_func'.
+
+    Returns:
+    - A dictionary with the summary statistics of the series.
+    """
+    moments_statistics = streaming_statistics.moments_to_statistics(moments)
+    q1, median, q3 = streaming_statistics.sketch_quantiles(sketch, [.25, .5, .75])
+    timestamp_max = start_timestamp + delta_frequency(n_obs - 1) if start_timestamp is not None else None
+    return {
+        'series_name': series_name,
+        'timestamp_min': start_timestamp,
+        'timestamp_max': timestamp_max,
+        'n_obs': n_obs,
+        'mean': moments_statistics['mean'],
+        'std': moments_statistics['std'],
+        'median': median,
+        'q1': q1,
+        'q3': q3,
+        'skew': moments_statistics['skew'],
+        'lenght_days': (timestamp_max - start_timestamp).days if start_timestamp is not None else np.nan,
+        'coef_variation': moments_statistics['std'] / moments_statistics['mean'],
+    }
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Loads the checkpoint of a dataset being processed, or an empty one if the dataset has not been started.
+
+    Parameters:
+    - checkpoint_path (str): Path of the checkpoint JSON file.
+
+    Returns:
+    - A dictionary with the names of the completed series ('completed_series') and of the written parts ('parts').
+    """
+    if not os.path.exists(checkpoint_path):
+        return {'completed_series': [], 'parts': []}
+    with open(checkpoint_path, 'r') as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint, checkpoint_path):
+    """
+    Saves the checkpoint atomically, so a crash while writing never leaves a corrupted checkpoint behind.
+
+    Parameters:
+    - checkpoint (dict): The checkpoint, as returned by 'load_checkpoint'.
+    - checkpoint_path (str): Path of the checkpoint JSON file.
+    """
+    temporary_path = checkpoint_path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def remove_orphan_parts(parts_dir, checkpoint):
+    """
+    Removes part files that were written but never recorded in the checkpoint (crash between both writes).
+    Their series are not marked as completed, so they are recalculated on resume.
+
+    Parameters:
+    - parts_dir (str): Directory containing the parquet parts of a dataset.
+    - checkpoint (dict): The checkpoint of the dataset.
+    """
+    for part_file in os.listdir(parts_dir):
+        if part_file.endswith('.parquet') and part_file not in checkpoint['parts']:
+            os.remove(os.path.join(parts_dir, part_file))
+
+
+def write_statistics_part(statistics_part, parts_dir, checkpoint, checkpoint_path):
+    """
+    Appends the statistics of one chunk as a new parquet part and records its series in the checkpoint.
+
+    Parameters:
+    - statistics_part (DataFrame): Statistics of the series of the chunk, with a 'series_name' column.
+    - parts_dir (str): Directory containing the parquet parts of the dataset.
+    - checkpoint (dict): The checkpoint of the dataset, updated in place.
+    - checkpoint_path (str): Path of the checkpoint JSON file.
+    """
+    part_file = f'part_{len(checkpoint["parts"]):05d}.parquet'
+    statistics_part.reset_index(drop=True).to_parquet(os.path.join(parts_dir, part_file), index=False)
+    checkpoint['parts'].append(part_file)
+    checkpoint['completed_series'].extend(statistics_part['series_name'].astype(str).tolist())
+    save_checkpoint(checkpoint, checkpoint_path)
+
+
+def read_statistics_parts(parts_dir, checkpoint):
+    """
+    Reads all the parquet parts recorded in the checkpoint into a single DataFrame.
+
+    Parameters:
+    - parts_dir (str): Directory containing the parquet parts of the dataset.
+    - checkpoint (dict): The checkpoint of the dataset.
+
+    Returns:
+    - A DataFrame with the statistics of all completed series.
+    """
+    parts = [pd.read_parquet(os.path.join(parts_dir, part_file)) for part_file in checkpoint['parts']]
+    if not parts:
+        return pd.DataFrame()
+    return pd.concat(parts).reset_index(drop=True)
+
+
+def process_dataset(
+        tsf_file,
+        data_dir='data',
+        statistics_dir=STATISTICS_DIR,
+        export_excel=EXPORT_EXCEL,
+        memory_budget_mb=config.ANALYSIS_MEMORY_BUDGET_MB,
+        statistics=STATISTICS_TO_CALCULATE
+):
+    """
+    Calculates the requested statistics of a dataset, writing each chunk as soon as it is completed.
+    Series already recorded in the checkpoint are skipped, so rerunning after a crash resumes the work.
+
+    Parameters:
+    - tsf_file (str): Name of the .tsf file inside 'data_dir'.
+    - data_dir (str): Directory containing the .tsf files.
+    - statistics_dir (str): Directory where the parts, the checkpoint and the Excel export are saved.
+    - export_excel (bool): Whether to export all the statistics of the dataset to a single .xlsx at the end.
+    - memory_budget_mb (float): Approximate memory each transformed chunk may use.
+    - statistics (list): The outputs to calculate, keys of STATISTICS_COLUMNS. Only the columns they need are materialized.
+
+    Returns:
+    - The path of the directory containing the parquet parts of the dataset.
+    """
+    dataset_name = tsf_file.replace('.tsf', '')
+    parts_dir = os.path.join(statistics_dir, dataset_name)
+    checkpoint_path = os.path.join(parts_dir, 'checkpoint.json')
+    os.makedirs(parts_dir, exist_ok=True)
+    checkpoint = load_checkpoint(checkpoint_path)
+    remove_orphan_parts(parts_dir, checkpoint)
+
+    run_record = instrumentation.start_run_record(
+        'process_dataset', dataset_name, dataset=dataset_name, statistics=list(statistics), memory_budget_mb=memory_budget_mb
+    )
+    with instrumentation.record_stage(run_record, 'load'):
+        dataset_list = convert_tsf_to_dataframe(os.path.join(data_dir, tsf_file))
+        dataset_raw = dataset_list[0]
+        dataset_frequency = dataset_list[1]
+        completed_series = set(checkpoint['completed_series'])
+        if completed_series:
+            print(f'Resuming {dataset_name}: {len(completed_series)} series already completed')
+            dataset_raw = dataset_raw.loc[lambda df: ~df.series_name.astype(str).isin(completed_series)]
+
+    columns = set(chain.from_iterable(STATISTICS_COLUMNS[output] for output in statistics))
+    with instrumentation.record_stage(run_record, 'statistics'):
+        series_bounds = calc_series_bounds(dataset_raw, dataset_frequency) if 'summary' in statistics else None
+    transformed_dataset_parts = transform_dataset(dataset_raw, dataset_frequency, memory_budget_mb, columns)
+    split_values = []
+    for dataset_part in instrumentation.record_iteration(run_record, 'transform', transformed_dataset_parts):
+        if 'sub_chunk' in dataset_part.attrs:
+            # Only the float values of a series split in sub-chunks are kept until its last sub-chunk
+            sub_chunk, n_sub_chunks = dataset_part.attrs['sub_chunk']
+            split_values.append(pd.to_numeric(dataset_part.series_value, errors='coerce').to_numpy(dtype=float))
+            print(f'{dataset_name}: sub-chunk {sub_chunk + 1}/{n_sub_chunks} of {dataset_part.series_name.iloc[0]}, peak RSS {instrumentation.peak_rss_mb():.0f} MB')
+            if sub_chunk < n_sub_chunks - 1:
+                continue
+            split_series = pd.DataFrame({
+                'series_name': dataset_part.series_name.iloc[0],
+                'series_value': np.concatenate(split_values)
+            })
+            with instrumentation.record_stage(run_record, 'statistics'):
+                statistics_part = calc_chunk_statistics(split_series, series_bounds, statistics)
+            split_values = []
+        else:
+            with instrumentation.record_stage(run_record, 'statistics'):
+                statistics_part = calc_chunk_statistics(dataset_part, series_bounds, statistics)
+            print(f'{dataset_name}: chunk of {len(statistics_part.index)} series and {len(dataset_part.index)} points, peak RSS {instrumentation.peak_rss_mb():.0f} MB')
+        with instrumentation.record_stage(run_record, 'write'):
+            write_statistics_part(statistics_part, parts_dir, checkpoint, checkpoint_path)
+
+    if export_excel:
+        with instrumentation.record_stage(run_record, 'export'):
+            all_statistics = read_statistics_parts(parts_dir, checkpoint)
+            all_statistics.to_excel(os.path.join(statistics_dir, f'{dataset_name}.xlsx'), index=False)
+    instrumentation.save_run_record(run_record)
+    return parts_dir
+
+
+def process_dataset_streaming(
+        tsf_file,
+        data_dir='data',
+        statistics_dir=STATISTICS_DIR,
+        export_excel=EXPORT_EXCEL,
+        series_per_part=STREAMING_SERIES_PER_PART
+):
+    """
+    Calculates the summary statistics of a dataset in a single pass over its .tsf file, updating mergeable
+    moments and quantile sketches block by block. Parts and checkpoint work as in 'process_dataset'.
+
+    Parameters:
+    - tsf_file (str): Name of the .tsf file inside 'data_dir'.
+    - data_dir (str): Directory containing the .tsf files.
+    - statistics_dir (str): Directory where the parts, the checkpoint and the Excel export are saved.
+    - export_excel (bool): Whether to export all the statistics of the dataset to a single .xlsx at the end.
+    - series_per_part (int): Number of completed series written together in a part.
+
+    Returns:
+    - The path of the directory containing the parquet parts of the dataset.
+    """
+    dataset_name = tsf_file.replace('.tsf', '')
+    parts_dir = os.path.join(statistics_dir, dataset_name)
+    checkpoint_path = os.path.join(parts_dir, 'checkpoint.json')
+    os.makedirs(parts_dir, exist_ok=True)
+    checkpoint = load_checkpoint(checkpoint_path)
+    remove_orphan_parts(parts_dir, checkpoint)
+    completed_series = set(checkpoint['completed_series'])
+
+    run_record = instrumentation.start_run_record(
+        'process_dataset_streaming', dataset_name, dataset=dataset_name, series_per_part=series_per_part
+    )
+    tsf_path = os.path.join(data_dir, tsf_file)
+    delta_frequency = relative_time_func(streaming_statistics.read_tsf_header(tsf_path)['frequency'])
+    statistics_rows = []
+    n_obs, moments, sketch = 0, streaming_statistics.init_moments(), streaming_statistics.init_sketch()
+    value_blocks = instrumentation.record_iteration(run_record, 'load', streaming_statistics.iter_tsf_value_blocks(tsf_path))
+    for attributes, values, series_end in value_blocks:
+        series_name = str(attributes['series_name'])
+        if series_name in completed_series:
+            continue
+        with instrumentation.record_stage(run_record, 'statistics'):
+            n_obs += len(values)
+            moments = streaming_statistics.update_moments(moments, values)
+            sketch = streaming_statistics.update_sketch(sketch, values)
+            if series_end:
+                statistics_rows.append(calc_streaming_summary_statistics(
+                    series_name, attributes.get('start_timestamp'), n_obs, moments, sketch, delta_frequency
+                ))
+                n_obs, moments, sketch = 0, streaming_statistics.init_moments(), streaming_statistics.init_sketch()
+        if len(statistics_rows) >= series_per_part:
+            with instrumentation.record_stage(run_record, 'write'):
+                write_statistics_part(pd.DataFrame(statistics_rows), parts_dir, checkpoint, checkpoint_path)
+            print(f'{dataset_name}: {len(checkpoint["completed_series"])} series summarized, peak RSS {instrumentation.peak_rss_mb():.0f} MB')
+            statistics_rows = []
+    if statistics_rows:
+        with instrumentation.record_stage(run_record, 'write'):
+            write_statistics_part(pd.DataFrame(statistics_rows), parts_dir, checkpoint, checkpoint_path)
+
+    if export_excel:
+        with instrumentation.record_stage(run_record, 'export'):
+            statistics = read_statistics_parts(parts_dir, checkpoint)
+            statistics.to_excel(os.path.join(statistics_dir, f'{dataset_name}.xlsx'), index=False)
+    instrumentation.save_run_record(run_record)
+    return parts_dir
+
+
 if __name__ == '__main__':
     tsf_databases = [tsf_file for tsf_file in os.listdir('data') if tsf_file.endswith('.tsf')]
     if ONLY_SELECTED_DATASETS:
         tsf_databases = [tsf_file for tsf_file in tsf_databases if tsf_file in ONLY_SELECTED_DATASETS]
     for tsf_file in tsf_databases:
         print(f'Processing {tsf_file}...')
-        dataset_list = convert_tsf_to_dataframe(f'data/{tsf_file}')
-        dataset_raw = dataset_list[0]
-        dataset_name = tsf_file.replace('.tsf', '')
-        dataset_frequency  = dataset_list[1]
-        transformed_dataset_parts = transform_dataset(dataset_raw, dataset_frequency)
-        statistics = pd.DataFrame()
-        for dataset_part in transformed_dataset_parts:
-            sum_statistics_part = calc_summary_statistics(dataset_part)
-            adv_statistics_part = calc_advanced_statistics(dataset_part)
-            statistics_part = pd.merge(sum_statistics_part, adv_statistics_part, on='series_name')
-            statistics = pd.concat([statistics,  statistics_part])
-        statistics.reset_index(drop=True).to_excel(f'results/summary_statistics/{dataset_name}.xlsx', index=False)
\ No newline at end of file
+        if tsf_file in STREAMING_STATISTICS_DATASETS:
+            process_dataset_streaming(tsf_file)
+        else:
+            process_dataset(tsf_file)
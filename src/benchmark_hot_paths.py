@@ -0,0 +1,306 @@
+'''
+This script benchmarks the hot paths of the pipeline: the .tsf parser, Table 1, Table 2, the dataset statistics and
+the LaTeX export.
+
+Each benchmark runs on generated data in a temporary workspace, so it does not depend on the downloaded datasets and does
+not overwrite the tables of the 'output' folder: .tsf files of the sizes of TSF_SIZES, and a copy of the summary error
+files of 'results/fixed_horizon_errors' for Table 2. The wall time of a benchmark is the fastest of REPEATS runs, and its
+peak memory is the peak of the Python allocations traced by 'tracemalloc' during one more run.
+
+The results are saved as JSON in BENCHMARK_DIR and compared with the baseline, 'baseline.json' in the same folder. A
+benchmark slower than the baseline by more than TIME_REGRESSION_THRESHOLD, or using more memory by more than
+MEMORY_REGRESSION_THRESHOLD, is a regression and makes the run fail. Benchmarks faster than MIN_SECONDS are not compared
+on time, since their variations are mostly noise. The baseline depends on the machine, so it is not versioned:
+
+    python src/benchmark_hot_paths.py --update-baseline    # once, on the code before the change
+    python src/benchmark_hot_paths.py                      # after the change, fails on regressions
+    python src/benchmark_hot_paths.py parse_huge table1    # only some benchmarks
+'''
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import config
+try:
+    import src.tables_create as tables_create
+    import src.analysis_general as analysis_general
+    import src.tables_to_latex as tables_to_latex
+except:
+    import tables_create
+    import analysis_general
+    import tables_to_latex
+
+BASE_DIR = Path(config.BASE_DIR)
+
+'''Folder of the results and of the baseline, relative to the base directory'''
+BENCHMARK_DIR = 'results/benchmarks'
+
+'''Number of series and length of the series of the generated .tsf files'''
+TSF_SIZES = {
+    'small': (50, 100),
+    'medium': (200, 500),
+    'huge': (2000, 2000),
+}
+
+'''The error measures of the Table 2 benchmark, as in the tables of 'dodo.py' '''
+TABLE2_ERROR_MEASURES = [
+    'Mean SMAPE', 'Median SMAPE', 'Mean mSMAPE', 'Median mSMAPE', 'Mean MASE',
+    'Median MASE', 'Mean MAE', 'Median MAE', 'Mean RMSE', 'Median RMSE',
+]
+
+'''Number of timed runs of each benchmark, the fastest being kept'''
+REPEATS = 3
+
+'''Relative increase of the time and of the peak memory over the baseline considered as a regression'''
+TIME_REGRESSION_THRESHOLD = 0.25
+MEMORY_REGRESSION_THRESHOLD = 0.25
+
+'''Benchmarks faster than this (in seconds) are not compared on time'''
+MIN_SECONDS = 0.05
+
+
+def write_benchmark_tsf(path, n_series, length, seed=0):
+    """
+    Writes a monthly .tsf file of random walks, in the format of the Monash datasets.
+
+    Parameters:
+    - path (Path): The file to write.
+    - n_series (int): The number of series.
+    - length (int): The length of each series.
+    - seed (int): The seed of the random walks.
+    """
+    rng = np.random.default_rng(seed)
+    with open(path, 'w') as f:
+        f.write('@relation benchmark\n@attribute series_name string\n@attribute start_timestamp date\n')
+        f.write('@frequency monthly\n@horizon 18\n@missing false\n@equallength true\n@data\n')
+        for i in range(n_series):
+            values = np.cumsum(rng.normal(size=length)) + 10 * length
+            f.write(f'T{i + 1}:1990-01-01 00-00-00:' + ','.join(f'{v:.3f}' for v in values) + '\n')
+
+
+@contextmanager
+def benchmark_workspace(tsf_sizes=None):
+    """
+    Creates the temporary workspace of the benchmarks and makes it the working directory and the base directory of
+    'tables_create.py', so the tables are written there.
+
+    Parameters:
+    - tsf_sizes (dict, optional): The sizes of the .tsf files. Defaults to TSF_SIZES.
+
+    Yields:
+    - The path of the workspace, with a 'data' folder holding '{size}.tsf' for each size.
+    """
+    tsf_sizes = TSF_SIZES if tsf_sizes is None else tsf_sizes
+    workspace = Path(tempfile.mkdtemp(prefix='benchmark_'))
+    (workspace / 'data').mkdir()
+    for seed, (size, (n_series, length)) in enumerate(tsf_sizes.items()):
+        write_benchmark_tsf(workspace / 'data' / f'{size}.tsf', n_series, length, seed)
+    shutil.copytree(BASE_DIR / 'results' / 'fixed_horizon_errors', workspace / 'results' / 'fixed_horizon_errors')
+    working_dir = os.getcwd()
+    module_globals = {name: getattr(tables_create, name) for name in ['BASE_DIR', 'DATA_DIR', 'DATASETS_TO_INFO']}
+    tables_create.BASE_DIR = workspace
+    tables_create.DATA_DIR = workspace / 'data'
+    # Table 1 is built from the generated files, one dataset per size
+    tables_create.DATASETS_TO_INFO = {
+        f'Benchmark {size}': {'Domain': 'Benchmark', 'Datasets': [f'{size}.tsf'], 'Multivariate': False}
+        for size in tsf_sizes
+    }
+    os.chdir(workspace)
+    try:
+        yield workspace
+    finally:
+        os.chdir(working_dir)
+        for name, value in module_globals.items():
+            setattr(tables_create, name, value)
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+def benchmark_cases(workspace, tsf_sizes=None):
+    """
+    Prepares the benchmarks, running outside of the measures what each of them needs as input.
+
+    Parameters:
+    - workspace (Path): The workspace, from 'benchmark_workspace'.
+    - tsf_sizes (dict, optional): The sizes of the .tsf files. Defaults to TSF_SIZES.
+
+    Returns:
+    - A dict of the benchmarks, from their name to the function to measure.
+    """
+    tsf_sizes = TSF_SIZES if tsf_sizes is None else tsf_sizes
+    data_dir = workspace / 'data'
+    cases = {
+        f'parse_{size}': (lambda path=data_dir / f'{size}.tsf': tables_create.convert_tsf_to_dataframe(str(path)))
+        for size in tsf_sizes
+    }
+    cases['table1'] = lambda: tables_create.generate_table1_dataframe()
+    cases['table2_all_measures'] = lambda: [
+        tables_create.generate_table2_dataframe(measure, f"table_{measure.lower().replace(' ', '_')}")
+        for measure in TABLE2_ERROR_MEASURES
+    ]
+
+    # The statistics run on the medium dataset with the columns 'process_dataset' materializes, except the ADF and
+    # GARCH tests, which are fitted series by series on the small one
+    medium_size, small_size = list(tsf_sizes)[len(tsf_sizes) // 2], list(tsf_sizes)[0]
+    dataset_raw, frequency = tables_create.convert_tsf_to_dataframe(str(data_dir / f'{medium_size}.tsf'))[:2]
+    small_raw = tables_create.convert_tsf_to_dataframe(str(data_dir / f'{small_size}.tsf'))[0]
+    columns = set(chain.from_iterable(
+        analysis_general.STATISTICS_COLUMNS[output] for output in analysis_general.STATISTICS_TO_CALCULATE
+    ))
+    transformed_dataset = pd.concat(analysis_general.transform_dataset(dataset_raw, frequency, columns=columns))
+    series_bounds = analysis_general.calc_series_bounds(dataset_raw, frequency)
+    small_dataset = pd.concat(analysis_general.transform_dataset(small_raw, frequency, columns=columns))
+    cases['transform_dataset'] = lambda: list(analysis_general.transform_dataset(dataset_raw, frequency, columns=columns))
+    cases['summary_statistics'] = lambda: analysis_general.calc_summary_statistics(transformed_dataset, series_bounds)
+    cases['advanced_statistics'] = lambda: analysis_general.calc_advanced_statistics(small_dataset)
+
+    tables_create.generate_table2_dataframe('Mean MASE', 'table2')
+    table2 = pd.read_csv(workspace / 'output' / 'tables' / 'table2.csv')
+    cases['table_to_latex'] = lambda: tables_to_latex.convert_table_to_latex(
+        table2, lambda x: '{:.3f}'.format(x), lambda x: '{:.2%}'.format(x), True
+    )
+    return cases
+
+
+def measure(function, repeats=REPEATS):
+    """
+    Measures the wall time and the peak memory of a function.
+
+    Returns:
+    - A dict with the fastest wall time of the runs in 'seconds' and the peak of the traced allocations in 'peak_memory_mb'.
+    """
+    seconds = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start_time)
+    # tracemalloc slows the allocations down, so the memory is measured in a separate run
+    tracemalloc.start()
+    try:
+        function()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(seconds), 'peak_memory_mb': peak_memory / 2 ** 20}
+
+
+def compare_with_baseline(
+        benchmarks,
+        baseline,
+        time_threshold=TIME_REGRESSION_THRESHOLD,
+        memory_threshold=MEMORY_REGRESSION_THRESHOLD,
+        min_seconds=MIN_SECONDS
+):
+    """
+    Finds the regressions of the benchmarks over the baseline.
+
+    Parameters:
+    - benchmarks (dict): The measures of each benchmark, from 'measure'.
+    - baseline (dict): The measures of the baseline. Benchmarks missing from it are not compared.
+    - time_threshold (float): Relative increase of the time considered as a regression.
+    - memory_threshold (float): Relative increase of the peak memory considered as a regression.
+    - min_seconds (float): Benchmarks faster than this in the baseline are not compared on time.
+
+    Returns:
+    - A list of the regressions (str), empty if there are none.
+    """
+    regressions = []
+    for name, result in benchmarks.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        if reference['seconds'] >= min_seconds and result['seconds'] > reference['seconds'] * (1 + time_threshold):
+            regressions.append(f"{name}: {result['seconds']:.3f} s instead of {reference['seconds']:.3f} s")
+        if result['peak_memory_mb'] > reference['peak_memory_mb'] * (1 + memory_threshold):
+            regressions.append(f"{name}: {result['peak_memory_mb']:.1f} MB instead of {reference['peak_memory_mb']:.1f} MB")
+    return regressions
+
+
+def run_benchmarks(
+        names=None,
+        benchmark_dir=None,
+        update_baseline=False,
+        tsf_sizes=None,
+        repeats=REPEATS
+):
+    """
+    Runs the benchmarks, saves their results and compares them with the baseline.
+
+    Parameters:
+    - names (list, optional): The benchmarks to run. Defaults to all of them.
+    - benchmark_dir (Path, optional): Folder of the results and of the baseline. Defaults to BENCHMARK_DIR.
+    - update_baseline (bool): Whether to save the results as the new baseline instead of comparing them with it.
+    - tsf_sizes (dict, optional): The sizes of the .tsf files. Defaults to TSF_SIZES.
+    - repeats (int): Number of timed runs of each benchmark.
+
+    Returns:
+    - The results (dict): the machine, the date and the measures of each benchmark.
+    """
+    benchmark_dir = BASE_DIR / BENCHMARK_DIR if benchmark_dir is None else Path(benchmark_dir)
+    benchmarks = {}
+    with benchmark_workspace(tsf_sizes) as workspace:
+        cases = benchmark_cases(workspace, tsf_sizes)
+        unknown_names = set(names or []) - set(cases)
+        if unknown_names:
+            raise Exception(f'Unknown benchmarks: {sorted(unknown_names)}. The benchmarks are {list(cases)}')
+        for name, function in cases.items():
+            if names and name not in names:
+                continue
+            try:
+                benchmarks[name] = measure(function, repeats)
+            except ImportError as e:
+                # e.g. the LaTeX export of pandas needs jinja2
+                print(f'Skipped {name}: {e}')
+                continue
+            print(f"{name}: {benchmarks[name]['seconds']:.3f} s, {benchmarks[name]['peak_memory_mb']:.1f} MB")
+
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'benchmarks': benchmarks,
+    }
+    os.makedirs(benchmark_dir, exist_ok=True)
+    with open(benchmark_dir / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json", 'w') as f:
+        json.dump(results, f, indent=2)
+
+    baseline_path = benchmark_dir / 'baseline.json'
+    if update_baseline:
+        # Benchmarks run separately are added to the baseline without removing the others
+        baseline = {'benchmarks': {}}
+        if baseline_path.exists():
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+        baseline.update({key: value for key, value in results.items() if key != 'benchmarks'})
+        baseline['benchmarks'].update(benchmarks)
+        with open(baseline_path, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f'Saved the baseline in {baseline_path}')
+    elif baseline_path.exists():
+        with open(baseline_path) as f:
+            regressions = compare_with_baseline(benchmarks, json.load(f)['benchmarks'])
+        if regressions:
+            raise Exception('Performance regressions over the baseline:\n' + '\n'.join(regressions))
+        print('No regression over the baseline')
+    else:
+        print(f'No baseline in {baseline_path}: run with --update-baseline to create it')
+    return results
+
+
+if __name__ == '__main__':
+    arguments = sys.argv[1:]
+    run_benchmarks(
+        names=[a for a in arguments if not a.startswith('--')] or None,
+        update_baseline='--update-baseline' in arguments
+    )
@@ -25,6 +25,17 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = config('DATA_DIR', default=(BASE_DIR / 'data'), cast=Path)
 OUTPUT_DIR = config('OUTPUT_DIR', default=(BASE_DIR / 'output'), cast=Path)
 
+# Approximate memory (in MB) that one chunk of exploded observations may use in analysis_general
+ANALYSIS_MEMORY_BUDGET_MB = config('ANALYSIS_MEMORY_BUDGET_MB', default=512, cast=float)
+
+# Number of experiments run in parallel by the sweep runner, and number of threads each of them may use
+SWEEP_MAX_WORKERS = config('SWEEP_MAX_WORKERS', default=2, cast=int)
+SWEEP_THREADS_PER_JOB = config('SWEEP_THREADS_PER_JOB', default=1, cast=int)
+
+# Unix socket of the optional warm worker (see 'warm_worker.py'), and memory (in MB) of the parsed datasets it keeps
+WARM_WORKER_SOCKET = config('WARM_WORKER_SOCKET', default=(BASE_DIR / '.warm_worker.sock'), cast=Path)
+WARM_WORKER_MEMORY_MB = config('WARM_WORKER_MEMORY_MB', default=2048, cast=float)
+
 if __name__ == "__main__":
     
     ## If they don't exist, create the data and output directories
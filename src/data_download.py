@@ -14,10 +14,7 @@ if they do not exist, and calls the 'download_and_extract_zip' function for each
 output to track the progress of these operations, making it a useful standalone utility or as part of a larger
 data preparation workflow.
 '''
-import requests
-import zipfile
 import os
-from io import BytesIO
 
 import config
 from pathlib import Path
@@ -102,6 +99,11 @@ def download_and_extract_zip(url, destination_dir):
     Returns:
     - extracted_file_path (str): The file path of the extracted file.
     """    
+    # requests is only imported when a file is downloaded, so listing the tasks of 'dodo.py' does not load it
+    import requests
+    import zipfile
+    from io import BytesIO
+
     # Send a GET request to the URL
     response = requests.get(url)
     response.raise_for_status()
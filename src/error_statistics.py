@@ -0,0 +1,318 @@
+'''
+This script adds uncertainty and significance to the point estimates of Table 2, from the error of each series.
+
+The per-series errors of a run (dataset, model and lag) are read from its error matrix ('utils/error_store.py') when it
+exists, or from the per-series files written by 'error_calculator.R' (e.g. 'm1_yearly_ets_mase.txt') otherwise.
+For each dataset and error measure (MASE and sMAPE by default) the script calculates:
+
+- Bootstrap confidence intervals of the mean and median error of each model. The resamples are drawn as a matrix of
+indexes, one row per resample, and their means and medians are calculated row-wise in batches sized to bound the memory.
+- Diebold-Mariano-style pairwise tests: for each pair of models, the difference of their errors on the same series
+is tested for a zero mean, with the variance of the differences taken from the covariance matrix of all models at once.
+- Friedman average ranks of the models over the series, the Friedman test p-value and the Nemenyi critical difference:
+two models whose average ranks differ by more than it perform significantly differently.
+
+Pairwise tests and ranks need the errors of the models on the same series, so they only use models with one error per
+series and series where every model has an error. The R per-series MASE files drop series with infinite values, so
+MASE models read from them may be left out of the comparisons.
+
+The results are written next to Table 2 as '{table_name}_statistics.csv', one row per dataset and model,
+and '{table_name}_pairwise_tests.csv', one row per dataset and pair of models, leaving 'table2.csv' unchanged.
+'''
+import os
+import re
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+import config
+
+try:
+    from src.tables_create import get_model_name, get_database_name, ORDER_MODELS, ORDER_DATASETS
+    from src.utils import error_store
+except ImportError:
+    from tables_create import get_model_name, get_database_name, ORDER_MODELS, ORDER_DATASETS
+    from utils import error_store
+
+BASE_DIR = Path(config.BASE_DIR)
+
+ERRORS_DIR = 'results/fixed_horizon_errors'
+
+'''Error measures with confidence intervals and tests'''
+ERROR_MEASURES = ['mase', 'smape']
+
+'''Number of bootstrap resamples and confidence level of the intervals'''
+N_RESAMPLES = 2000
+CONFIDENCE_LEVEL = 0.95
+
+'''Maximum number of resampled errors held in memory at once: the resamples are processed in batches of this size'''
+MAX_RESAMPLED_ERRORS = 2 ** 24
+
+'''Seed of the resamples, so the intervals are reproducible'''
+BOOTSTRAP_SEED = 0
+
+
+def list_runs(errors_dir=ERRORS_DIR, matrices_dir=error_store.ERROR_MATRICES_DIR):
+    """
+    Lists the runs with results, from the summary files of 'errors_dir' and the error matrices of 'matrices_dir'.
+    """
+    runs = set(error_store.list_error_runs(matrices_dir))
+    if os.path.exists(errors_dir):
+        runs.update(
+            f[:-len('.txt')] for f in os.listdir(errors_dir)
+            if f.endswith('.txt') and not re.search('smape[.]txt|mae[.]txt|mase[.]txt|msmape[.]txt|rmse[.]txt', f)
+        )
+    return sorted(runs)
+
+
+def load_run_errors(run_name, measure, errors_dir=ERRORS_DIR, matrices_dir=error_store.ERROR_MATRICES_DIR):
+    """
+    Loads the error of each series of a run, from its error matrix or from its per-series file.
+
+    Parameters:
+    - run_name (str): Name of the run, e.g. 'm1_yearly_ets'.
+    - measure (str): 'mase', 'smape' or 'msmape'.
+    - errors_dir (str): Directory of the per-series files.
+    - matrices_dir (str): Directory of the error matrices.
+
+    Returns:
+    - A tuple (errors, aligned): the float array of errors and whether it has one error per series of the dataset,
+      or None if the run has no per-series errors.
+    """
+    if os.path.exists(error_store.error_matrix_path(run_name, matrices_dir)):
+        return error_store.load_series_errors(run_name, measure, matrices_dir=matrices_dir), True
+    errors_path = os.path.join(errors_dir, f'{run_name}_{measure}.txt')
+    if not os.path.exists(errors_path):
+        return None
+    errors = pd.read_csv(errors_path, header=None).iloc[:, 0].to_numpy(dtype=float)
+    # The R MASE files drop the series with infinite or missing values
+    return errors, measure != 'mase'
+
+
+def group_runs_by_dataset(run_names):
+    """
+    Groups the runs by the dataset and model names used in Table 2.
+
+    Returns:
+    - A dictionary {dataset: {model: run_name}}.
+    """
+    runs_by_dataset = {}
+    for run_name in run_names:
+        file_name = f'{run_name}.txt'
+        runs_by_dataset.setdefault(get_database_name(file_name), {})[get_model_name(file_name)] = run_name
+    return runs_by_dataset
+
+
+def bootstrap_confidence_intervals(errors, n_resamples=N_RESAMPLES, confidence_level=CONFIDENCE_LEVEL, rng=None):
+    """
+    Calculates percentile bootstrap confidence intervals of the mean and median of the errors.
+    The resamples are drawn as an index matrix, one row per resample, in batches of at most MAX_RESAMPLED_ERRORS values.
+
+    Parameters:
+    - errors (array-like): The error of each series. Missing and infinite values are ignored, as in the R MASE.
+    - n_resamples (int): Number of bootstrap resamples.
+    - confidence_level (float): Coverage of the intervals.
+    - rng (Generator, optional): Random generator of the resamples.
+
+    Returns:
+    - A dictionary with the 'mean' and 'median' of the errors and the bounds of their intervals ('mean_low', 'mean_high', ...).
+    """
+    rng = np.random.default_rng(BOOTSTRAP_SEED) if rng is None else rng
+    errors = np.asarray(errors, dtype=float)
+    errors = errors[np.isfinite(errors)]
+    n_errors = len(errors)
+    if n_errors == 0:
+        return {key: np.nan for key in ['mean', 'mean_low', 'mean_high', 'median', 'median_low', 'median_high']}
+
+    resampled_means = np.empty(n_resamples)
+    resampled_medians = np.empty(n_resamples)
+    batch_size = max(1, MAX_RESAMPLED_ERRORS // n_errors)
+    for start in range(0, n_resamples, batch_size):
+        stop = min(start + batch_size, n_resamples)
+        resamples = errors[rng.integers(0, n_errors, size=(stop - start, n_errors))]
+        resampled_means[start:stop] = resamples.mean(axis=1)
+        resampled_medians[start:stop] = np.median(resamples, axis=1)
+
+    alpha = 1 - confidence_level
+    quantiles = [alpha / 2, 1 - alpha / 2]
+    mean_low, mean_high = np.quantile(resampled_means, quantiles)
+    median_low, median_high = np.quantile(resampled_medians, quantiles)
+    return {
+        'mean': errors.mean(), 'mean_low': mean_low, 'mean_high': mean_high,
+        'median': np.median(errors), 'median_low': median_low, 'median_high': median_high,
+    }
+
+
+def complete_error_matrix(errors_by_model):
+    """
+    Stacks the errors of models on the same series into a (n_series, n_models) matrix, keeping the series where every model has an error.
+
+    Parameters:
+    - errors_by_model (dict): The error of each series, by model. All arrays must have the same length.
+
+    Returns:
+    - A tuple (models, error_matrix).
+    """
+    models = list(errors_by_model)
+    error_matrix = np.column_stack([errors_by_model[model] for model in models]) if models else np.empty((0, 0))
+    return models, error_matrix[np.isfinite(error_matrix).all(axis=1)]
+
+
+def pairwise_tests(models, error_matrix):
+    """
+    Diebold-Mariano-style tests of equal mean error for every pair of models, on the same series.
+    The statistic is the mean difference of errors over its standard error, compared with a standard normal distribution.
+
+    Parameters:
+    - models (list): The names of the models, one per column of 'error_matrix'.
+    - error_matrix (ndarray): The errors, with one row per series and one column per model.
+
+    Returns:
+    - A DataFrame with one row per pair of models: their mean difference, the statistic and the two-sided p-value.
+    """
+    n_series = len(error_matrix)
+    if n_series < 2 or len(models) < 2:
+        return pd.DataFrame(columns=['model_a', 'model_b', 'mean_difference', 'dm_statistic', 'dm_pvalue'])
+    means = error_matrix.mean(axis=0)
+    covariance = np.atleast_2d(np.cov(error_matrix, rowvar=False))
+    pairs = np.array(list(combinations(range(len(models)), 2)))
+    first, second = pairs[:, 0], pairs[:, 1]
+    mean_differences = means[first] - means[second]
+    variances = covariance[first, first] + covariance[second, second] - 2 * covariance[first, second]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        statistics = mean_differences / np.sqrt(np.maximum(variances, 0) / n_series)
+    return pd.DataFrame({
+        'model_a': [models[i] for i in first],
+        'model_b': [models[i] for i in second],
+        'mean_difference': mean_differences,
+        'dm_statistic': statistics,
+        'dm_pvalue': 2 * stats.norm.sf(np.abs(statistics)),
+    })
+
+
+def friedman_nemenyi(error_matrix, confidence_level=CONFIDENCE_LEVEL):
+    """
+    Ranks the models on each series and calculates the Friedman test and the Nemenyi critical difference.
+
+    Parameters:
+    - error_matrix (ndarray): The errors, with one row per series and one column per model.
+    - confidence_level (float): Confidence level of the critical difference.
+
+    Returns:
+    - A tuple (average_ranks, friedman_pvalue, critical_difference). The best model has the lowest average rank.
+    """
+    n_series, n_models = error_matrix.shape
+    if n_series == 0 or n_models < 2:
+        return np.full(n_models, np.nan), np.nan, np.nan
+    average_ranks = stats.rankdata(error_matrix, axis=1).mean(axis=0)
+    friedman_statistic = 12 * n_series / (n_models * (n_models + 1)) * (
+        np.sum(average_ranks ** 2) - n_models * (n_models + 1) ** 2 / 4
+    )
+    friedman_pvalue = stats.chi2.sf(friedman_statistic, n_models - 1)
+    q_alpha = stats.studentized_range.ppf(confidence_level, n_models, np.inf) / np.sqrt(2)
+    critical_difference = q_alpha * np.sqrt(n_models * (n_models + 1) / (6 * n_series))
+    return average_ranks, friedman_pvalue, critical_difference
+
+
+def calc_dataset_error_statistics(errors_by_model, aligned_by_model, n_resamples=N_RESAMPLES, rng=None):
+    """
+    Calculates the confidence intervals, ranks and pairwise tests of the models of a dataset for one error measure.
+
+    Parameters:
+    - errors_by_model (dict): The error of each series, by model.
+    - aligned_by_model (dict): Whether the errors of each model have one value per series of the dataset.
+    - n_resamples (int): Number of bootstrap resamples.
+    - rng (Generator, optional): Random generator of the resamples.
+
+    Returns:
+    - A tuple (model_statistics, pairwise): a DataFrame with one row per model and the DataFrame of 'pairwise_tests'.
+    """
+    rng = np.random.default_rng(BOOTSTRAP_SEED) if rng is None else rng
+    model_statistics = pd.DataFrame({
+        model: bootstrap_confidence_intervals(errors, n_resamples, rng=rng) for model, errors in errors_by_model.items()
+    }).transpose()
+
+    aligned_errors = {model: errors for model, errors in errors_by_model.items() if aligned_by_model[model]}
+    lengths = {len(errors) for errors in aligned_errors.values()}
+    if len(lengths) > 1:
+        print(f'Models with different numbers of series, left out of the comparisons: {sorted(aligned_errors)}')
+        aligned_errors = {}
+    models, error_matrix = complete_error_matrix(aligned_errors)
+    average_ranks, friedman_pvalue, critical_difference = friedman_nemenyi(error_matrix)
+    model_statistics['average_rank'] = pd.Series(average_ranks, index=models, dtype=float)
+    model_statistics['n_compared_series'] = len(error_matrix) if models else np.nan
+    model_statistics['friedman_pvalue'] = friedman_pvalue
+    model_statistics['nemenyi_critical_difference'] = critical_difference
+
+    pairwise = pairwise_tests(models, error_matrix)
+    if len(models) > 1:
+        # p-value of the test against the model with the lowest mean error
+        best_model = models[int(np.argmin(error_matrix.mean(axis=0)))]
+        versus_best = pd.concat([
+            pairwise.loc[lambda df: df.model_b == best_model].set_index('model_a').dm_pvalue,
+            pairwise.loc[lambda df: df.model_a == best_model].set_index('model_b').dm_pvalue,
+        ])
+        model_statistics['dm_pvalue_vs_best'] = versus_best
+    return model_statistics, pairwise
+
+
+def generate_error_statistics_tables(
+        measures=ERROR_MEASURES,
+        table_name='table2',
+        errors_dir=ERRORS_DIR,
+        matrices_dir=error_store.ERROR_MATRICES_DIR,
+        n_resamples=N_RESAMPLES,
+        output_dir=os.path.join(BASE_DIR, 'output', 'tables')
+):
+    """
+    Generates the statistics of every dataset and model with per-series errors and saves them next to Table 2.
+
+    Parameters:
+    - measures (list): The error measures to analyse.
+    - table_name (str): Prefix of the output tables.
+    - errors_dir (str): Directory of the summary and per-series error files.
+    - matrices_dir (str): Directory of the error matrices.
+    - n_resamples (int): Number of bootstrap resamples.
+    - output_dir (str): Directory where the tables are saved.
+
+    Returns:
+    - A tuple (statistics, pairwise) with the DataFrames saved.
+    """
+    rng = np.random.default_rng(BOOTSTRAP_SEED)
+    runs_by_dataset = group_runs_by_dataset(list_runs(errors_dir, matrices_dir))
+    statistics_parts, pairwise_parts = [], []
+    ordered_datasets = [d for d in ORDER_DATASETS if d in runs_by_dataset] + [d for d in runs_by_dataset if d not in ORDER_DATASETS]
+    for dataset in ordered_datasets:
+        dataset_runs = runs_by_dataset[dataset]
+        ordered_models = [m for m in ORDER_MODELS if m in dataset_runs] + [m for m in dataset_runs if m not in ORDER_MODELS]
+        for measure in measures:
+            errors_by_model, aligned_by_model = {}, {}
+            for model in ordered_models:
+                run_name = dataset_runs[model]
+                run_errors = load_run_errors(run_name, measure, errors_dir, matrices_dir)
+                if run_errors is not None:
+                    errors_by_model[model], aligned_by_model[model] = run_errors
+            if not errors_by_model:
+                continue
+            model_statistics, pairwise = calc_dataset_error_statistics(errors_by_model, aligned_by_model, n_resamples, rng)
+            statistics_parts.append(model_statistics.rename_axis('Model').reset_index().assign(Dataset=dataset, Measure=measure))
+            if len(pairwise.index):
+                pairwise_parts.append(pairwise.assign(Dataset=dataset, Measure=measure))
+
+    statistics = pd.concat(statistics_parts, ignore_index=True) if statistics_parts else pd.DataFrame(columns=['Dataset', 'Measure', 'Model'])
+    pairwise = pd.concat(pairwise_parts, ignore_index=True) if pairwise_parts else pd.DataFrame(columns=['Dataset', 'Measure'])
+    statistics = statistics[['Dataset', 'Measure', 'Model'] + [c for c in statistics.columns if c not in ['Dataset', 'Measure', 'Model']]]
+    pairwise = pairwise[['Dataset', 'Measure'] + [c for c in pairwise.columns if c not in ['Dataset', 'Measure']]]
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    statistics.to_csv(os.path.join(output_dir, f'{table_name}_statistics.csv'), index=False)
+    pairwise.to_csv(os.path.join(output_dir, f'{table_name}_pairwise_tests.csv'), index=False)
+    return statistics, pairwise
+
+
+if __name__ == '__main__':
+    generate_error_statistics_tables()
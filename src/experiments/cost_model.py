@@ -0,0 +1,413 @@
+'''
+This script predicts the runtime of the experiments from their past execution times and plans runs within a time budget.
+
+The past runtimes come from the run records of 'utils/instrumentation.py' and from the execution time files written
+by the R and Python experiments in 'results/fixed_horizon_execution_times'. Each run is matched to its job in the
+catalogue of all experiments (the R calls of 'fixed_horizon.R' and the deep learning grid of 'sweep.py'), which gives
+its dataset features: number of series, total number of points, forecast horizon, method and lag.
+
+The cost model is a log-linear regression fitted by least squares:
+log(seconds) = b0 + b1 log(series) + b2 log(points) + b3 log(horizon) + b4 log(1 + lag) + one coefficient per method.
+A small ridge penalty keeps the coefficients of methods with few (or no) runs close to zero, and the predictions
+are corrected by the mean of the exponentiated residuals (smearing), since exp(E[log t]) underestimates E[t].
+
+'schedule_within_budget' picks the jobs to run on a number of cores within a wall-clock budget: the shortest jobs first,
+which completes the most jobs, and the selected jobs are then placed on the cores from the longest to the shortest
+(longest processing time first), dropping the longest ones until the predicted end fits the budget.
+'warn_if_over_budget' checks the CHOSEN_MODELS and CHOSEN_DATASETS of 'dodo.py' before running them.
+'''
+import heapq
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from src.experiments import sweep
+    from src.utils import instrumentation
+    from src.streaming_statistics import read_tsf_header
+except ImportError:
+    from experiments import sweep
+    from utils import instrumentation
+    from streaming_statistics import read_tsf_header
+
+BASE_DIR = sweep.BASE_DIR
+DATA_DIR = sweep.DATA_DIR
+
+'''Folder of the execution time files of the experiments'''
+EXECUTION_TIMES_DIR = BASE_DIR / 'results' / 'fixed_horizon_execution_times'
+
+'''Folder of the run records of the experiments'''
+RUN_RECORDS_DIR = BASE_DIR / instrumentation.RUN_RECORDS_DIR
+
+'''Script with the calls of the R experiments'''
+FIXED_HORIZON_SCRIPT = BASE_DIR / 'src' / 'experiments' / 'fixed_horizon.R'
+
+'''Ridge penalty of the coefficients of the cost model (not of the intercept)'''
+RIDGE_PENALTY = 1e-3
+
+'''Numeric features of the cost model, used in logs'''
+NUMERIC_FEATURES = ['n_series', 'n_points', 'horizon', 'lag']
+
+'''Units of the execution times written by R'''
+R_TIME_UNITS = {'secs': 1, 'mins': 60, 'hours': 3600, 'days': 86400}
+
+
+def parse_r_value(value):
+    """
+    Converts an argument of an R call to Python: strings, NULL, TRUE/FALSE and numbers.
+    """
+    value = value.strip()
+    if value.startswith('"') or value.startswith("'"):
+        return value[1:-1]
+    if value in ['NULL', 'TRUE', 'FALSE']:
+        return {'NULL': None, 'TRUE': True, 'FALSE': False}[value]
+    return float(value) if '.' in value else int(value)
+
+
+def r_experiment_jobs(script_path=FIXED_HORIZON_SCRIPT):
+    """
+    Reads the jobs of the R experiments from the calls of 'fixed_horizon.R'.
+
+    Returns:
+    - A list of jobs (dict) with the name of the job (as in the result files), the model and dataset keys used by
+      CHOSEN_MODELS and CHOSEN_DATASETS, the type of the call ('local' or 'global') and its arguments.
+    """
+    jobs = []
+    model, dataset_key = None, None
+    with open(script_path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#'):
+                continue
+            model_match = re.match(r"if \('(\w+)' %in% chosen_models", line)
+            dataset_match = re.match(r"if \('(\w+)' %in% chosen_datasets", line)
+            call_match = re.match(r'do_fixed_horizon_(local|global)_forecasting\((.*)\)', line)
+            if model_match:
+                model = model_match.group(1)
+            elif dataset_match:
+                dataset_key = dataset_match.group(1)
+            elif call_match:
+                args = [parse_r_value(arg) for arg in call_match.group(2).split(',')]
+                if call_match.group(1) == 'local':
+                    args = args + [None] * (7 - len(args))
+                    dataset_name, method, input_file_name, key, index, external_forecast_horizon, integer_conversion = args[:7]
+                    lag, name = None, f'{dataset_name}_{method}'
+                else:
+                    args = args + [None] * (8 - len(args))
+                    dataset_name, lag, input_file_name, method, key, index, external_forecast_horizon, integer_conversion = args[:8]
+                    name = f'{dataset_name}_{method}_lag_{lag}'
+                jobs.append({
+                    'name': name,
+                    'model': model,
+                    'dataset_key': dataset_key,
+                    'dataset_name': dataset_name,
+                    'method': method,
+                    'lag': lag,
+                    'input_file_name': input_file_name,
+                    'call': call_match.group(1),
+                    'key': key,
+                    'index': index,
+                    'external_forecast_horizon': external_forecast_horizon,
+                    'integer_conversion': bool(integer_conversion),
+                })
+    return jobs
+
+
+def experiment_jobs(script_path=FIXED_HORIZON_SCRIPT, data_dir=DATA_DIR):
+    """
+    Builds the catalogue of all the experiments: the R jobs and the deep learning grid of 'sweep.py'.
+    """
+    deep_learning_jobs = [
+        {**job, 'model': job['method'], 'dataset_key': Path(job['input_file_name']).stem}
+        for job in sweep.build_sweep_jobs(data_dir=data_dir)
+    ]
+    return r_experiment_jobs(script_path) + deep_learning_jobs
+
+
+@lru_cache(maxsize=None)
+def read_dataset_features(input_path, file_size, file_mtime):
+    """
+    Counts the series and points of a .tsf file in one pass over its lines, without parsing the values.
+    The size and modification time of the file are part of the cache key, so a changed file is read again.
+    """
+    header = read_tsf_header(input_path)
+    n_series, n_points = 0, 0
+    with open(input_path, 'rb') as f:
+        for line in f:
+            if line.strip().lower().startswith(b'@data'):
+                break
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith(b'#'):
+                continue
+            n_series += 1
+            n_points += line.rsplit(b':', 1)[-1].count(b',') + 1
+    return {'n_series': n_series, 'n_points': n_points, 'forecast_horizon': header['forecast_horizon']}
+
+
+def dataset_features(job, data_dir=DATA_DIR):
+    """
+    Returns the features of the dataset of a job: number of series, total number of points and forecast horizon.
+    """
+    input_path = Path(data_dir) / job['input_file_name']
+    if not input_path.exists():
+        raise Exception(f"Dataset {job['input_file_name']} not found in {data_dir}: download it to predict its runtime.")
+    stat = input_path.stat()
+    features = read_dataset_features(str(input_path), stat.st_size, stat.st_mtime)
+    horizon = job.get('external_forecast_horizon') or features['forecast_horizon'] or 1
+    return {'n_series': features['n_series'], 'n_points': features['n_points'], 'horizon': horizon}
+
+
+def parse_execution_time(text):
+    """
+    Converts an execution time file to seconds: '12.5 secs' (R) or '0:01:02.5' (Python timedelta).
+    """
+    text = text.strip()
+    if ':' in text:
+        days = 0
+        if 'day' in text:
+            days_text, text = text.split(',')
+            days = int(days_text.split()[0])
+        hours, minutes, seconds = text.strip().split(':')
+        return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    value, unit = text.split()
+    return float(value) * R_TIME_UNITS[unit]
+
+
+def load_run_times(execution_times_dir=EXECUTION_TIMES_DIR, records_dir=RUN_RECORDS_DIR):
+    """
+    Reads the past runtimes of the experiments. A run with a run record uses the total wall time of its stages,
+    which replaces the time of its execution time file.
+
+    Returns:
+    - A DataFrame with the name of each run and its runtime in seconds.
+    """
+    run_times = {}
+    if os.path.exists(execution_times_dir):
+        for file_name in sorted(os.listdir(execution_times_dir)):
+            name, extension = os.path.splitext(file_name)
+            if extension != '.txt':
+                continue
+            with open(os.path.join(execution_times_dir, file_name)) as f:
+                run_times[name] = parse_execution_time(f.read())
+    records = instrumentation.load_run_records(records_dir)
+    if not records.empty:
+        records = records.loc[lambda df: df.entry_point == 'get_deep_nn_forecasts']
+        latest_runs = (
+            records
+            .groupby(['run_name', 'started_at'])['wall_seconds'].sum()
+            .reset_index()
+            .sort_values('started_at')
+            .drop_duplicates('run_name', keep='last')
+        )
+        run_times.update(zip(latest_runs.run_name, latest_runs.wall_seconds))
+    return pd.DataFrame({'name': list(run_times), 'seconds': list(run_times.values())})
+
+
+def job_features(jobs, data_dir=DATA_DIR):
+    """
+    Builds the table of features of the jobs, one row per job.
+    """
+    return pd.DataFrame([
+        {'name': job['name'], 'method': job['method'], 'lag': job['lag'] or 0, **dataset_features(job, data_dir)}
+        for job in jobs
+    ])
+
+
+def design_matrix(features, methods):
+    """
+    Builds the matrix of the regression: intercept, logs of the numeric features and one indicator per method.
+    """
+    numeric = np.log1p(features[NUMERIC_FEATURES].to_numpy(dtype=float))
+    method_indicators = (features['method'].to_numpy()[:, None] == np.array(methods)[None, :]).astype(float)
+    return np.column_stack([np.ones(len(features)), numeric, method_indicators])
+
+
+def fit_cost_model(run_features, ridge_penalty=RIDGE_PENALTY):
+    """
+    Fits the log-linear cost model on past runs.
+
+    Parameters:
+    - run_features (DataFrame): The features of the runs (from 'job_features') with their runtime in 'seconds'.
+    - ridge_penalty (float): Penalty of the coefficients, which keeps the model defined with few runs.
+
+    Returns:
+    - The cost model (dict): the methods, coefficients, smearing factor and number of runs.
+    """
+    run_features = run_features.loc[lambda df: df.seconds > 0]
+    if run_features.empty:
+        raise Exception('No past runs to fit the cost model: run some experiments first.')
+    methods = sorted(run_features['method'].unique())
+    design = design_matrix(run_features, methods)
+    log_seconds = np.log(run_features['seconds'].to_numpy(dtype=float))
+    # Ridge regression as least squares on rows appended to the design, without penalizing the intercept
+    penalty = np.sqrt(ridge_penalty) * np.eye(design.shape[1])[1:]
+    coefficients = np.linalg.lstsq(
+        np.vstack([design, penalty]), np.concatenate([log_seconds, np.zeros(len(penalty))]), rcond=None
+    )[0]
+    residuals = log_seconds - design @ coefficients
+    return {
+        'methods': methods,
+        'coefficients': coefficients,
+        'smearing': float(np.mean(np.exp(residuals))),
+        'n_runs': len(run_features),
+    }
+
+
+def predict_runtime(cost_model, features):
+    """
+    Predicts the runtime in seconds of jobs from their features. Methods without past runs get the average method.
+    """
+    return np.exp(design_matrix(features, cost_model['methods']) @ cost_model['coefficients']) * cost_model['smearing']
+
+
+def train_cost_model(data_dir=DATA_DIR, execution_times_dir=EXECUTION_TIMES_DIR, records_dir=RUN_RECORDS_DIR, jobs=None):
+    """
+    Fits the cost model on all the past runs whose job is in the catalogue and whose dataset is downloaded.
+    """
+    jobs = experiment_jobs(data_dir=data_dir) if jobs is None else jobs
+    run_times = load_run_times(execution_times_dir, records_dir)
+    jobs_by_name = {job['name']: job for job in jobs}
+    run_jobs = [
+        jobs_by_name[name] for name in run_times.name
+        if name in jobs_by_name and (Path(data_dir) / jobs_by_name[name]['input_file_name']).exists()
+    ]
+    if not run_jobs:
+        raise Exception('No past runs to fit the cost model: run some experiments first.')
+    run_features = job_features(run_jobs, data_dir).merge(run_times, on='name')
+    return fit_cost_model(run_features)
+
+
+def schedule_within_budget(jobs, budget_seconds, cores, cost_model, data_dir=DATA_DIR):
+    """
+    Picks the jobs that fit in a wall-clock budget on a number of cores, and orders them.
+
+    Parameters:
+    - jobs (list): The candidate jobs.
+    - budget_seconds (float): The wall-clock budget.
+    - cores (int): Number of jobs running at the same time.
+    - cost_model (dict): The model from 'fit_cost_model' or 'train_cost_model'.
+    - data_dir (Path): Folder of the .tsf files.
+
+    Returns:
+    - A tuple (scheduled_jobs, skipped_jobs, makespan): the selected jobs, in the order to start them, each with its
+      'predicted_seconds', 'core' and 'predicted_start'; the jobs left out; and the predicted end of the last job.
+    """
+    if not jobs:
+        return [], [], 0.0
+    predicted_seconds = predict_runtime(cost_model, job_features(jobs, data_dir))
+    jobs = [{**job, 'predicted_seconds': float(seconds)} for job, seconds in zip(jobs, predicted_seconds)]
+
+    # Shortest jobs first complete the most jobs within the total capacity of the cores
+    selected, total_seconds = [], 0.0
+    for job in sorted(jobs, key=lambda job: job['predicted_seconds']):
+        if job['predicted_seconds'] <= budget_seconds and total_seconds + job['predicted_seconds'] <= budget_seconds * cores:
+            selected.append(job)
+            total_seconds += job['predicted_seconds']
+
+    # Longest processing time first on the cores, dropping the longest jobs until the makespan fits the budget
+    selected = sorted(selected, key=lambda job: -job['predicted_seconds'])
+    while True:
+        scheduled, makespan = assign_to_cores(selected, cores)
+        if makespan <= budget_seconds or not selected:
+            break
+        selected = selected[1:]
+    scheduled_names = {job['name'] for job in scheduled}
+    skipped = [job for job in jobs if job['name'] not in scheduled_names]
+    return scheduled, skipped, makespan
+
+
+def assign_to_cores(jobs, cores):
+    """
+    Places jobs, in the given order, each on the core that becomes free first.
+
+    Returns:
+    - A tuple (jobs, makespan), with the 'core' and 'predicted_start' of each job, and the end of the last one.
+    """
+    free_cores = [(0.0, core) for core in range(cores)]
+    scheduled = []
+    for job in jobs:
+        start, core = heapq.heappop(free_cores)
+        scheduled.append({**job, 'core': core, 'predicted_start': start})
+        heapq.heappush(free_cores, (start + job['predicted_seconds'], core))
+    return scheduled, max(end for end, _ in free_cores)
+
+
+def chosen_jobs(chosen_models, chosen_datasets, jobs=None):
+    """
+    Returns the R jobs run by 'fixed_horizon.R' for the CHOSEN_MODELS and CHOSEN_DATASETS of 'dodo.py'.
+    """
+    jobs = r_experiment_jobs() if jobs is None else jobs
+    models = [model for model, value in chosen_models.items() if value]
+    return [
+        job for job in jobs
+        if ('all' in models or job['model'] in models) and ('all' in chosen_datasets or job['dataset_key'] in chosen_datasets)
+    ]
+
+
+def warn_if_over_budget(
+        chosen_models,
+        chosen_datasets,
+        budget_hours,
+        cores=1,
+        data_dir=DATA_DIR,
+        cost_model=None,
+        script_path=FIXED_HORIZON_SCRIPT
+):
+    """
+    Prints a warning when the chosen models and datasets are predicted not to fit in the budget.
+
+    Parameters:
+    - chosen_models (dict): CHOSEN_MODELS of 'dodo.py'.
+    - chosen_datasets (list): CHOSEN_DATASETS of 'dodo.py'.
+    - budget_hours (float): The wall-clock budget. If None, nothing is checked.
+    - cores (int): Number of jobs running at the same time.
+    - data_dir (Path): Folder of the .tsf files.
+    - cost_model (dict, optional): A fitted cost model. Defaults to one trained on the past runs.
+    - script_path (Path): Script with the calls of the R experiments.
+
+    Returns:
+    - The predicted runtime in hours of the chosen jobs, or None if it could not be predicted.
+    """
+    if budget_hours is None:
+        return None
+    jobs = chosen_jobs(chosen_models, chosen_datasets, r_experiment_jobs(script_path))
+    if not jobs:
+        return None
+    missing_datasets = sorted({job['input_file_name'] for job in jobs if not (Path(data_dir) / job['input_file_name']).exists()})
+    try:
+        cost_model = train_cost_model(data_dir) if cost_model is None else cost_model
+    except Exception as e:
+        print(f'Runtime of the chosen models not checked: {e}')
+        return None
+    jobs = [job for job in jobs if job['input_file_name'] not in missing_datasets]
+    if not jobs:
+        return None
+    predicted_seconds = predict_runtime(cost_model, job_features(jobs, data_dir))
+    _, makespan = assign_to_cores(
+        sorted([{**job, 'predicted_seconds': s} for job, s in zip(jobs, predicted_seconds)], key=lambda job: -job['predicted_seconds']),
+        cores
+    )
+    predicted_hours = makespan / 3600
+    if predicted_hours > budget_hours:
+        longest = sorted(zip(predicted_seconds, [job['name'] for job in jobs]), reverse=True)[:5]
+        print(
+            f'WARNING: the {len(jobs)} chosen jobs are predicted to take {predicted_hours:.1f} hours on {cores} core(s), '
+            f'over the budget of {budget_hours} hours. Longest jobs: '
+            + ', '.join(f'{name} ({seconds / 3600:.1f} h)' for seconds, name in longest)
+        )
+    if missing_datasets:
+        print(f'Runtime not predicted for the datasets not downloaded yet: {missing_datasets}')
+    return predicted_hours
+
+
+if __name__ == '__main__':
+    cost_model = train_cost_model()
+    jobs = [job for job in experiment_jobs() if (DATA_DIR / job['input_file_name']).exists()]
+    scheduled, skipped, makespan = schedule_within_budget(jobs, 24 * 3600, os.cpu_count(), cost_model)
+    print(f'Cost model fitted on {cost_model["n_runs"]} runs')
+    print(f'{len(scheduled)} of {len(jobs)} jobs fit in 24 hours on {os.cpu_count()} cores, ending after {makespan / 3600:.1f} hours')
@@ -4,20 +4,33 @@ from gluonts.mx.model.deepar import DeepAREstimator
 # from gluonts.model.transformer import TransformerEstimator
 # from gluonts.model.wavenet import WaveNetEstimator
 # from gluonts.dataset.common import ListDataset
-# from gluonts.dataset.field_names import FieldName
+from gluonts.dataset.field_names import FieldName
+from gluonts import __version__ as GLUONTS_VERSION
 # from gluonts.evaluation.backtest import make_evaluation_predictions
 from datetime import datetime
-import csv
 import os
-import subprocess
 import numpy as np
 import pandas as pd
 import utils.data_loader as loader
+import utils.series_buffer as series_buffer
+import utils.error_calculator as error_calculator
+import utils.error_store as error_store
+import utils.predictor_cache as predictor_cache
+import utils.quantile_forecasts as quantile_forecasts
+import utils.forecast_store as forecast_store
+import utils.instrumentation as instrumentation
+import utils.scale_cache as scale_cache
 import config
 from pathlib import Path
 
 BASE_DIR = Path(config.BASE_DIR)
 
+# Folder of the trained predictors, reused when a run is repeated with the same data, method and hyperparameters
+PREDICTOR_CACHE_DIR = BASE_DIR / predictor_cache.PREDICTOR_CACHE_DIR
+
+# Folder of the error scales of each dataset, shared by all the models and lags evaluated on it
+SCALE_CACHE_DIR = BASE_DIR / scale_cache.SCALE_CACHE_DIR
+
 # The name of the column containing time series values after loading data from the .tsf file into a dataframe
 VALUE_COL_NAME = "series_value"
 
@@ -58,16 +71,20 @@ FREQUENCY_MAP = {
 # method - name of the forecasting method that you want to evaluate
 # external_forecast_horizon - the required forecast horizon, if it is not available in the .tsf file
 # integer_conversion - whether the forecasts should be rounded or not
-def get_deep_nn_forecasts(dataset_name, lag, input_file_name, method, external_forecast_horizon = None, integer_conversion = False):
+# use_predictor_cache - whether to reuse a predictor trained with the same dataset, method and hyperparameters, and to cache the trained one
+# num_samples - the number of sample paths drawn per series to calculate the median forecasts
+# prediction_batch_size - the number of series whose sample paths are held in memory at once
+# export_csv_forecasts - whether to also write the forecasts as text, one row per series, next to the binary file
+def get_deep_nn_forecasts(dataset_name, lag, input_file_name, method, external_forecast_horizon = None, integer_conversion = False, use_predictor_cache = True,
+                          num_samples = quantile_forecasts.NUM_SAMPLES, prediction_batch_size = quantile_forecasts.PREDICTION_BATCH_SIZE, export_csv_forecasts = False):
     print("Started loading " + dataset_name)
 
-    df, frequency, forecast_horizon, contain_missing_values, contain_equal_length = loader.convert_tsf_to_dataframe(BASE_DIR + "/data/" + input_file_name, 'NaN', VALUE_COL_NAME)
+    # Wall time, CPU time and peak RSS of each stage are saved as a run record in "results/run_records"
+    file_name = dataset_name + "_" + method + "_lag_" + str(lag)
+    run_record = instrumentation.start_run_record("get_deep_nn_forecasts", file_name, dataset=dataset_name, method=method, lag=lag)
 
-    train_series_list = []
-    test_series_list = []
-    train_series_full_list = []
-    test_series_full_list = []
-    final_forecasts = []
+    with instrumentation.record_stage(run_record, "load"):
+        df, frequency, forecast_horizon, contain_missing_values, contain_equal_length = loader.convert_tsf_to_dataframe(BASE_DIR / "data" / input_file_name, 'NaN', VALUE_COL_NAME)
 
     if frequency is not None:
         freq = FREQUENCY_MAP[frequency]
@@ -88,79 +105,89 @@ def get_deep_nn_forecasts(dataset_name, lag, input_file_name, method, external_f
 
     start_exec_time = datetime.now()
 
-    for index, row in df.iterrows():
+    with instrumentation.record_stage(run_record, "split"):
         if TIME_COL_NAME in df.columns:
-            train_start_time = row[TIME_COL_NAME]
+            start_timestamps = df[TIME_COL_NAME]
         else:
-            train_start_time = datetime.strptime('1900-01-01 00-00-00', '%Y-%m-%d %H-%M-%S') # Adding a dummy timestamp, if the timestamps are not available in the dataset or consider_time is False
-
-        series_data = row[VALUE_COL_NAME]
+            start_timestamps = [datetime.strptime('1900-01-01 00-00-00', '%Y-%m-%d %H-%M-%S')] * len(df.index) # Adding a dummy timestamp, if the timestamps are not available in the dataset or consider_time is False
 
-        # Creating training and test series. Test series will be only used during evaluation
-        train_series_data = series_data[:len(series_data) - forecast_horizon]
-        test_series_data = series_data[(len(series_data) - forecast_horizon) : len(series_data)]
-
-        train_series_list.append(train_series_data)
-        test_series_list.append(test_series_data)
+        # The values are copied once into a contiguous buffer: training and test series are views of it, not per-row copies
+        # Test series will be only used during evaluation
+        values, offsets = series_buffer.build_series_buffer(df[VALUE_COL_NAME])
+        train_series_list, test_series_list, _ = series_buffer.split_series_views(values, offsets, forecast_horizon)
 
         # We use full length training series to train the model as we do not tune hyperparameters
-        train_series_full_list.append({
-            FieldName.TARGET: train_series_data,
-            FieldName.START: pd.Timestamp(train_start_time, freq=freq)
-        })
-
-        test_series_full_list.append({
-            FieldName.TARGET: series_data,
-            FieldName.START: pd.Timestamp(train_start_time, freq=freq)
-        })
-
-    train_ds = ListDataset(train_series_full_list, freq=freq)
-    test_ds = ListDataset(test_series_full_list, freq=freq)
-
-    if (method == "feed_forward"):
-        estimator = SimpleFeedForwardEstimator(freq=freq,
-                                               context_length=lag,
-                                               prediction_length=forecast_horizon)
-    elif(method == "deepar"):
-        estimator = DeepAREstimator(freq=freq,
-                                    context_length=lag,
-                                    prediction_length=forecast_horizon)
-    elif(method =="nbeats"):
-        estimator = NBEATSEstimator(freq=freq,
-                                    context_length=lag,
-                                    prediction_length=forecast_horizon)
-    elif (method == "wavenet"):
-        estimator = WaveNetEstimator(freq=freq,
-                                     prediction_length=forecast_horizon)
-    elif (method == "transformer"):
-        estimator = TransformerEstimator(freq=freq,
-                                     context_length=lag,
-                                     prediction_length=forecast_horizon)
-
-    predictor = estimator.train(training_data=train_ds)
-
-    forecast_it, ts_it = make_evaluation_predictions(dataset=test_ds, predictor=predictor, num_samples=100)
-
-    # Time series predictions
-    forecasts = list(forecast_it)
-
-    # Get median (0.5 quantile) of the 100 sample forecasts as final point forecasts
-    for f in forecasts:
-        final_forecasts.append(f.median)
+        # The entries are passed directly to GluonTS, with float32 targets that it does not copy again
+        starts = series_buffer.bulk_start_periods(start_timestamps, freq)
+        train_ds, _ = series_buffer.build_gluonts_entries(
+            values, offsets, starts, forecast_horizon, FieldName.TARGET, FieldName.START
+        )
+
+    # The key covers everything that changes the trained model, so a hit can skip the training
+    hyperparameters = {
+        "freq": freq,
+        "context_length": None if method == "wavenet" else lag,
+        "prediction_length": forecast_horizon,
+        "gluonts_version": GLUONTS_VERSION
+    }
+    dataset_hash = predictor_cache.file_sha256(BASE_DIR / "data" / input_file_name)
+    cache_key = predictor_cache.predictor_cache_key(dataset_hash, method, lag, forecast_horizon, hyperparameters)
+    with instrumentation.record_stage(run_record, "cache_load"):
+        predictor = predictor_cache.load_cached_predictor(cache_key, PREDICTOR_CACHE_DIR) if use_predictor_cache else None
+
+    if predictor is not None:
+        print("Using cached predictor " + cache_key)
+    else:
+        if (method == "feed_forward"):
+            estimator = SimpleFeedForwardEstimator(freq=freq,
+                                                   context_length=lag,
+                                                   prediction_length=forecast_horizon)
+        elif(method == "deepar"):
+            estimator = DeepAREstimator(freq=freq,
+                                        context_length=lag,
+                                        prediction_length=forecast_horizon)
+        elif(method =="nbeats"):
+            estimator = NBEATSEstimator(freq=freq,
+                                        context_length=lag,
+                                        prediction_length=forecast_horizon)
+        elif (method == "wavenet"):
+            estimator = WaveNetEstimator(freq=freq,
+                                         prediction_length=forecast_horizon)
+        elif (method == "transformer"):
+            estimator = TransformerEstimator(freq=freq,
+                                         context_length=lag,
+                                         prediction_length=forecast_horizon)
+
+        with instrumentation.record_stage(run_record, "train"):
+            predictor = estimator.train(training_data=train_ds)
+
+        if use_predictor_cache:
+            with instrumentation.record_stage(run_record, "cache_save"):
+                metadata = {"dataset_name": dataset_name, "input_file_name": input_file_name, "method": method, "lag": lag, **hyperparameters}
+                predictor_cache.save_predictor(predictor, cache_key, metadata, PREDICTOR_CACHE_DIR)
+                predictor_cache.evict_predictor_cache(PREDICTOR_CACHE_DIR)
+
+    # Get median (0.5 quantile) of the sample forecasts as final point forecasts
+    # The forecasts are streamed and reduced batch by batch, instead of keeping all the sample paths in memory
+    with instrumentation.record_stage(run_record, "predict"):
+        final_forecasts = quantile_forecasts.predict_quantiles(
+            predictor, train_ds, forecast_horizon, [0.5], num_samples, prediction_batch_size
+        )[0]
 
     if integer_conversion:
         final_forecasts = np.round(final_forecasts)
 
-    if not os.path.exists(BASE_DIR + "/results/fixed_horizon_forecasts/"):
-        os.makedirs(BASE_DIR + "/results/fixed_horizon_forecasts/")
-
-    # write the forecasting results to a file
-    file_name = dataset_name + "_" + method + "_lag_" + str(lag)
-    forecast_file_path = BASE_DIR + "/results/fixed_horizon_forecasts/" + file_name + ".txt"
-
-    with open(forecast_file_path, "w") as output:
-        writer = csv.writer(output, lineterminator='\n')
-        writer.writerows(final_forecasts)
+    # write the forecasting results to a binary file, with the series names and the run description
+    with instrumentation.record_stage(run_record, "write"):
+        forecast_store.save_forecasts(
+            final_forecasts,
+            file_name,
+            series_names=df["series_name"] if "series_name" in df.columns else None,
+            metadata={"dataset_name": dataset_name, "input_file_name": input_file_name, "method": method, "lag": lag,
+                      "forecast_horizon": forecast_horizon, "num_samples": num_samples, "integer_conversion": integer_conversion},
+            forecasts_dir=BASE_DIR / "results" / "fixed_horizon_forecasts",
+            export_csv=export_csv_forecasts
+        )
 
     finish_exec_time = datetime.now()
 
@@ -168,33 +195,39 @@ def get_deep_nn_forecasts(dataset_name, lag, input_file_name, method, external_f
     exec_time = finish_exec_time - start_exec_time
     print(exec_time)
 
-    if not os.path.exists(BASE_DIR + "/results/fixed_horizon_execution_times/"):
-        os.makedirs(BASE_DIR + "/results/fixed_horizon_execution_times/")
+    if not os.path.exists(BASE_DIR / "results" / "fixed_horizon_execution_times"):
+        os.makedirs(BASE_DIR / "results" / "fixed_horizon_execution_times")
 
-    with open(BASE_DIR + "/results/fixed_horizon_execution_times/" + file_name + ".txt", "w") as output_time:
+    with open(BASE_DIR / "results" / "fixed_horizon_execution_times" / (file_name + ".txt"), "w") as output_time:
         output_time.write(str(exec_time))
 
-    # Write training dataset and the actual results into separate files, which are then used for error calculations
+    # The errors are calculated in process on the training and test views, in the format of 'error_calculator.R'
     # We do not use the built-in evaluation method in GluonTS as some of the error measures we use are not implemented in that
-    temp_dataset_path =  BASE_DIR + "/results/fixed_horizon_forecasts/" + dataset_name + "_dataset.txt"
-    temp_results_path = BASE_DIR + "/results/fixed_horizon_forecasts/" + dataset_name + "_results.txt"
-
-    with open(temp_dataset_path, "w") as output_dataset:
-        writer = csv.writer(output_dataset, lineterminator='\n')
-        writer.writerows(train_series_list)
-
-    with open(temp_results_path, "w") as output_results:
-        writer = csv.writer(output_results, lineterminator='\n')
-        writer.writerows(test_series_list)
-
-    if not os.path.exists(BASE_DIR + "/results/fixed_horizon_errors/"):
-        os.makedirs(BASE_DIR + "/results/fixed_horizon_errors/")
-
-    subprocess.call(["Rscript", "--vanilla", BASE_DIR + "/utils/error_calc_helper.R", BASE_DIR, forecast_file_path, temp_results_path, temp_dataset_path, str(seasonality), file_name ])
-
-    # Remove intermediate files
-    os.system("rm " + temp_dataset_path)
-    os.system("rm " + temp_results_path)
+    with instrumentation.record_stage(run_record, "metrics"):
+        # The MASE scales and mSMAPE denominators are calculated once per dataset and shared by all the models and lags
+        test_set = np.stack(test_series_list)
+        error_scales = scale_cache.get_error_scales(
+            train_series_list, test_set, seasonality,
+            scale_cache.scale_cache_key(dataset_hash, seasonality, forecast_horizon=forecast_horizon),
+            SCALE_CACHE_DIR
+        )
+        error_calculator.calculate_errors(
+            final_forecasts,
+            test_set,
+            train_series_list,
+            seasonality,
+            str(BASE_DIR / "results" / "fixed_horizon_errors" / file_name),
+            error_scales
+        )
+
+        # The error of each series at each step of the horizon is kept for significance tests and drill-down
+        error_store.save_error_matrix(
+            error_calculator.calculate_step_errors(final_forecasts, test_set, train_series_list, seasonality, error_scales),
+            file_name,
+            BASE_DIR / "results" / "fixed_horizon_error_matrices"
+        )
+
+    instrumentation.save_run_record(run_record, BASE_DIR / "results" / "run_records")
 
 
 # Experiments
@@ -0,0 +1,146 @@
+'''
+This script runs the pooled regression experiments in Python, with 'models/global_models.py', instead of
+'do_fixed_horizon_global_forecasting' of 'fixed_horizon_functions.R', which builds the full embedded matrix of the
+dataset in R and fits it with 'glm'.
+
+'get_global_model_forecasts' splits the last 'forecast_horizon' values of each series as the test set, fits one model
+on the training parts of all series and writes the same results as the R function and as 'local_model_experiments.py':
+the summary error file '{dataset}_{method}_lag_{lag}.txt' and the per-series error files in 'results/fixed_horizon_errors',
+read by 'tables_create.py' for Table 2, the execution time, the forecasts and the per-step error matrix.
+The normalized training buffer of large datasets is memory-mapped once in the cache of 'utils/lag_embedding.py',
+keyed by the content of the dataset file, and shared by all the lags of a sweep.
+'''
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# The experiments import 'config', 'models' and 'utils' from the src folder
+SRC_DIR = Path(__file__).resolve().parent.parent
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(1, str(SRC_DIR))
+
+import config
+import utils.data_loader as loader
+import utils.series_buffer as series_buffer
+import utils.error_calculator as error_calculator
+import utils.error_store as error_store
+import utils.forecast_store as forecast_store
+import utils.instrumentation as instrumentation
+import utils.lag_embedding as lag_embedding
+import utils.scale_cache as scale_cache
+from utils.predictor_cache import file_sha256
+from models.global_models import get_global_forecasts
+from experiments.local_model_experiments import SEASONALITY_MAP
+
+BASE_DIR = Path(config.BASE_DIR)
+
+VALUE_COL_NAME = 'series_value'
+
+
+def get_global_model_forecasts(
+        dataset_name,
+        lag,
+        input_file_name,
+        method='pooled_regression',
+        external_forecast_horizon=None,
+        integer_conversion=False,
+        results_dir=BASE_DIR / 'results',
+        chunk_rows=lag_embedding.CHUNK_ROWS
+):
+    """
+    Forecasts every series of a dataset with a global model and writes the errors in the format of the R experiments.
+
+    Parameters:
+    - dataset_name (str): Name of the dataset, e.g. 'm1_yearly'.
+    - lag (int): The number of past values used as predictors.
+    - input_file_name (str): Name of the .tsf file in the data folder.
+    - method (str): The global model, 'pooled_regression'.
+    - external_forecast_horizon (int, optional): The forecast horizon, if it is not in the .tsf file.
+    - integer_conversion (bool): Whether the forecasts should be rounded.
+    - results_dir (Path): Folder of the results, with the 'fixed_horizon_*' folders.
+    - chunk_rows (int): The number of windows copied at a time when fitting the model.
+
+    Returns:
+    - The dictionary of the errors of each series, from 'calculate_errors'.
+    """
+    print(f'Started loading {dataset_name}')
+    results_dir = Path(results_dir)
+    file_name = f'{dataset_name}_{method}_lag_{lag}'
+    run_record = instrumentation.start_run_record(
+        'get_global_model_forecasts', file_name, dataset=dataset_name, method=method, lag=lag
+    )
+
+    input_path = Path(config.DATA_DIR) / input_file_name
+    with instrumentation.record_stage(run_record, 'load'):
+        df, frequency, forecast_horizon, _, _ = loader.convert_tsf_to_dataframe(input_path, 'NaN', VALUE_COL_NAME)
+    seasonality = SEASONALITY_MAP[frequency] if frequency is not None else 1
+    if forecast_horizon is None:
+        if external_forecast_horizon is None:
+            raise Exception('Please provide the required forecast horizon')
+        forecast_horizon = external_forecast_horizon
+
+    start_exec_time = datetime.now()
+    with instrumentation.record_stage(run_record, 'split'):
+        values, offsets = series_buffer.build_series_buffer(df[VALUE_COL_NAME])
+        train_values, train_offsets, test_matrix = series_buffer.split_series_buffer(values, offsets, forecast_horizon)
+        del values
+    # Only the buffers worth memory-mapping are looked up in the cache
+    dataset_hash = file_sha256(input_path)
+    key = None
+    if train_values.nbytes > lag_embedding.MEMMAP_THRESHOLD_MB * 2 ** 20:
+        key = lag_embedding.lag_embedding_key(dataset_hash, forecast_horizon)
+
+    with instrumentation.record_stage(run_record, 'train'):
+        forecasts = get_global_forecasts(
+            (train_values, train_offsets), lag, forecast_horizon, method, key,
+            results_dir / Path(lag_embedding.LAG_EMBEDDING_DIR).name, lag_embedding.MEMMAP_THRESHOLD_MB, chunk_rows
+        )
+    # As in R, missing forecasts become 0
+    forecasts = np.nan_to_num(forecasts, nan=0.0)
+    if integer_conversion:
+        forecasts = np.round(forecasts)
+
+    with instrumentation.record_stage(run_record, 'write'):
+        forecast_store.save_forecasts(
+            forecasts,
+            file_name,
+            series_names=df['series_name'] if 'series_name' in df.columns else None,
+            metadata={'dataset_name': dataset_name, 'input_file_name': input_file_name, 'method': method, 'lag': lag,
+                      'forecast_horizon': forecast_horizon, 'integer_conversion': integer_conversion, 'engine': 'python'},
+            forecasts_dir=results_dir / 'fixed_horizon_forecasts'
+        )
+    exec_time = datetime.now() - start_exec_time
+    print(exec_time)
+    os.makedirs(results_dir / 'fixed_horizon_execution_times', exist_ok=True)
+    with open(results_dir / 'fixed_horizon_execution_times' / f'{file_name}.txt', 'w') as output_time:
+        output_time.write(str(exec_time))
+
+    with instrumentation.record_stage(run_record, 'metrics'):
+        training_set = (train_values, train_offsets)
+        # The scales of the errors are shared by all the models and lags evaluated on the dataset
+        error_scales = scale_cache.get_error_scales(
+            training_set, test_matrix, seasonality,
+            scale_cache.scale_cache_key(dataset_hash, seasonality, forecast_horizon=forecast_horizon),
+            results_dir / Path(scale_cache.SCALE_CACHE_DIR).name
+        )
+        errors = error_calculator.calculate_errors(
+            forecasts, test_matrix, training_set, seasonality, str(results_dir / 'fixed_horizon_errors' / file_name),
+            error_scales
+        )
+        error_store.save_error_matrix(
+            error_calculator.calculate_step_errors(forecasts, test_matrix, training_set, seasonality, error_scales),
+            file_name,
+            results_dir / 'fixed_horizon_error_matrices'
+        )
+    instrumentation.save_run_record(run_record, results_dir / 'run_records')
+    return errors
+
+
+if __name__ == '__main__':
+    # e.g. python src/experiments/global_model_experiments.py kaggle_daily 10 kaggle_web_traffic_dataset_without_missing_values.tsf 59
+    get_global_model_forecasts(
+        sys.argv[1], int(sys.argv[2]), sys.argv[3], external_forecast_horizon=int(sys.argv[4]) if len(sys.argv) > 4 else None
+    )
@@ -0,0 +1,214 @@
+'''
+This script runs the SES and Theta experiments in Python, with the batched engine of 'models/local_univariate_models.py',
+instead of fitting each series separately in R with 'do_fixed_horizon_local_forecasting' of 'fixed_horizon_functions.R'.
+
+'get_local_model_forecasts' splits the last 'forecast_horizon' values of each series as the test set, as the R function
+does, forecasts all the series, and writes the same results: the summary error file '{dataset}_{method}.txt' and the
+per-series error files in 'results/fixed_horizon_errors', read by 'tables_create.py' for Table 2, the execution time,
+the forecasts (in the binary format of 'forecast_store.py') and the per-step error matrix.
+
+'benchmark_against_r' runs the Python engine on the SES and Theta experiments of 'fixed_horizon.R' whose dataset is
+downloaded, in a separate results folder, and compares its errors and runtime with the results of the R path.
+'''
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# The experiments import 'config', 'models' and 'utils' from the src folder
+SRC_DIR = Path(__file__).resolve().parent.parent
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(1, str(SRC_DIR))
+
+import config
+import utils.data_loader as loader
+import utils.series_buffer as series_buffer
+import utils.error_calculator as error_calculator
+import utils.error_store as error_store
+import utils.forecast_store as forecast_store
+import utils.instrumentation as instrumentation
+import utils.scale_cache as scale_cache
+from utils.predictor_cache import file_sha256
+from models.local_univariate_models import get_local_forecasts, SERIES_BLOCK_SIZE
+
+BASE_DIR = Path(config.BASE_DIR)
+
+'''Folder of the results of the Python engine when compared with the R results'''
+BENCHMARK_RESULTS_DIR = BASE_DIR / 'results' / 'local_model_benchmark'
+
+VALUE_COL_NAME = 'series_value'
+
+'''Seasonality values corresponding with the frequencies, as in 'fixed_horizon_functions.R' '''
+SEASONALITY_MAP = {
+    '4_seconds': [21600, 151200, 7889400],
+    'minutely': [1440, 10080, 525960],
+    '10_minutes': [144, 1008, 52596],
+    '15_minutes': [96, 672, 35064],
+    'half_hourly': [48, 336, 17532],
+    'hourly': [24, 168, 8766],
+    'daily': 7,
+    'weekly': 365.25 / 7,
+    'monthly': 12,
+    'quarterly': 4,
+    'yearly': 1,
+}
+
+
+def get_local_model_forecasts(
+        dataset_name,
+        input_file_name,
+        method,
+        external_forecast_horizon=None,
+        integer_conversion=False,
+        results_dir=BASE_DIR / 'results',
+        block_size=SERIES_BLOCK_SIZE
+):
+    """
+    Forecasts every series of a dataset with SES or Theta and writes the errors in the format of the R experiments.
+
+    Parameters:
+    - dataset_name (str): Name of the dataset, e.g. 'm1_yearly'.
+    - input_file_name (str): Name of the .tsf file in the data folder.
+    - method (str): 'ses' or 'theta'.
+    - external_forecast_horizon (int, optional): The forecast horizon, if it is not in the .tsf file.
+    - integer_conversion (bool): Whether the forecasts should be rounded.
+    - results_dir (Path): Folder of the results, with the 'fixed_horizon_*' folders.
+    - block_size (int): Number of series fitted together.
+
+    Returns:
+    - The dictionary of the errors of each series, from 'calculate_errors'.
+    """
+    print(f'Started loading {dataset_name}')
+    results_dir = Path(results_dir)
+    file_name = f'{dataset_name}_{method}'
+    run_record = instrumentation.start_run_record('get_local_model_forecasts', file_name, dataset=dataset_name, method=method)
+
+    with instrumentation.record_stage(run_record, 'load'):
+        df, frequency, forecast_horizon, _, _ = loader.convert_tsf_to_dataframe(
+            Path(config.DATA_DIR) / input_file_name, 'NaN', VALUE_COL_NAME
+        )
+    seasonality = SEASONALITY_MAP[frequency] if frequency is not None else 1
+    if forecast_horizon is None:
+        if external_forecast_horizon is None:
+            raise Exception('Please provide the required forecast horizon')
+        forecast_horizon = external_forecast_horizon
+
+    start_exec_time = datetime.now()
+    with instrumentation.record_stage(run_record, 'split'):
+        values, offsets = series_buffer.build_series_buffer(df[VALUE_COL_NAME])
+        train_series_list, test_series_list, _ = series_buffer.split_series_views(values, offsets, forecast_horizon)
+
+    with instrumentation.record_stage(run_record, 'train'):
+        forecasts = get_local_forecasts(train_series_list, forecast_horizon, method, seasonality, block_size)
+    # As in R, missing forecasts become 0
+    forecasts = np.nan_to_num(forecasts, nan=0.0)
+    if integer_conversion:
+        forecasts = np.round(forecasts)
+
+    with instrumentation.record_stage(run_record, 'write'):
+        forecast_store.save_forecasts(
+            forecasts,
+            file_name,
+            series_names=df['series_name'] if 'series_name' in df.columns else None,
+            metadata={'dataset_name': dataset_name, 'input_file_name': input_file_name, 'method': method,
+                      'forecast_horizon': forecast_horizon, 'integer_conversion': integer_conversion, 'engine': 'python'},
+            forecasts_dir=results_dir / 'fixed_horizon_forecasts'
+        )
+    exec_time = datetime.now() - start_exec_time
+    print(exec_time)
+    os.makedirs(results_dir / 'fixed_horizon_execution_times', exist_ok=True)
+    with open(results_dir / 'fixed_horizon_execution_times' / f'{file_name}.txt', 'w') as output_time:
+        output_time.write(str(exec_time))
+
+    with instrumentation.record_stage(run_record, 'metrics'):
+        # The scales of the errors are shared by all the models evaluated on the dataset
+        test_set = np.stack(test_series_list)
+        error_scales = scale_cache.get_error_scales(
+            train_series_list, test_set, seasonality,
+            scale_cache.scale_cache_key(file_sha256(Path(config.DATA_DIR) / input_file_name), seasonality, forecast_horizon=forecast_horizon),
+            results_dir / Path(scale_cache.SCALE_CACHE_DIR).name
+        )
+        errors = error_calculator.calculate_errors(
+            forecasts, test_set, train_series_list, seasonality,
+            str(results_dir / 'fixed_horizon_errors' / file_name), error_scales
+        )
+        error_store.save_error_matrix(
+            error_calculator.calculate_step_errors(forecasts, test_set, train_series_list, seasonality, error_scales),
+            file_name,
+            results_dir / 'fixed_horizon_error_matrices'
+        )
+    instrumentation.save_run_record(run_record, results_dir / 'run_records')
+    return errors
+
+
+def read_error_summary(summary_path):
+    """
+    Reads a summary error file into a dictionary, e.g. {'Mean MASE': 1.2, ...}.
+    """
+    with open(summary_path) as f:
+        lines = f.readlines()
+    return {
+        key.strip(): None if value.strip().lower().startswith('na') else float(value)
+        for key, value in (line.split(':') for line in lines if ':' in line)
+    }
+
+
+def benchmark_against_r(methods=('ses', 'theta'), datasets=None, results_dir=BENCHMARK_RESULTS_DIR, r_results_dir=BASE_DIR / 'results'):
+    """
+    Runs the Python engine on the SES and Theta experiments of 'fixed_horizon.R' and compares it with the R results.
+
+    Parameters:
+    - methods (tuple): The methods to compare.
+    - datasets (list, optional): Names of the datasets, e.g. ['m1_yearly']. Defaults to all those downloaded.
+    - results_dir (Path): Folder of the results of the Python engine, kept apart from the R results.
+    - r_results_dir (Path): Folder of the results of the R experiments.
+
+    Returns:
+    - A DataFrame with one row per experiment: the mean and median MASE and sMAPE of both engines, the runtime of the
+      Python engine and, when its execution time file exists, of the R one. It is also saved as 'benchmark.csv'.
+    """
+    try:
+        from src.experiments.cost_model import r_experiment_jobs, parse_execution_time
+    except ImportError:
+        from experiments.cost_model import r_experiment_jobs, parse_execution_time
+    jobs = [
+        job for job in r_experiment_jobs()
+        if job['method'] in methods
+        and (datasets is None or job['dataset_name'] in datasets)
+        and (Path(config.DATA_DIR) / job['input_file_name']).exists()
+    ]
+    rows = []
+    for job in jobs:
+        start_time = time.perf_counter()
+        get_local_model_forecasts(
+            job['dataset_name'], job['input_file_name'], job['method'], job['external_forecast_horizon'],
+            job['integer_conversion'], results_dir
+        )
+        row = {'experiment': job['name'], 'python_seconds': time.perf_counter() - start_time}
+        r_time_path = Path(r_results_dir) / 'fixed_horizon_execution_times' / f"{job['name']}.txt"
+        row['r_seconds'] = parse_execution_time(r_time_path.read_text()) if r_time_path.exists() else np.nan
+        python_errors = read_error_summary(Path(results_dir) / 'fixed_horizon_errors' / f"{job['name']}.txt")
+        r_summary_path = Path(r_results_dir) / 'fixed_horizon_errors' / f"{job['name']}.txt"
+        r_errors = read_error_summary(r_summary_path) if r_summary_path.exists() else {}
+        for measure in ['Mean MASE', 'Median MASE', 'Mean SMAPE', 'Median SMAPE']:
+            row[f'python {measure}'] = python_errors.get(measure)
+            row[f'r {measure}'] = r_errors.get(measure)
+        rows.append(row)
+    benchmark = pd.DataFrame(rows)
+    if not benchmark.empty:
+        benchmark['speedup'] = benchmark['r_seconds'] / benchmark['python_seconds']
+        benchmark['mean_mase_relative_difference'] = (
+            (benchmark['python Mean MASE'] - benchmark['r Mean MASE']) / benchmark['r Mean MASE']
+        )
+    os.makedirs(results_dir, exist_ok=True)
+    benchmark.to_csv(Path(results_dir) / 'benchmark.csv', index=False)
+    return benchmark
+
+
+if __name__ == '__main__':
+    pd.set_option('display.width', 200)
+    print(benchmark_against_r(datasets=sys.argv[1:] or None))
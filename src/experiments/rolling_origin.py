@@ -0,0 +1,243 @@
+'''
+This script runs the rolling origin evaluation of 'rolling_origin.R' in Python, with the batched SES and Theta engine of
+'models/local_univariate_models.py'.
+
+As in R, the first TRAIN_SPLIT of each series is used for training (1 value for series of 2 values), and every later
+value is forecast one step ahead from all the values before it. The origins are never materialized as sub-series: the
+values of the dataset stay in the contiguous buffer of 'series_buffer.py', and an origin is only the position of the
+value it forecasts, the training part being the view from the start of its series up to that position. The origins of
+all series are processed in batches ordered by their rank within the series (the first origin of every series, then
+the second one...), and the models of a whole batch are fitted together with 'get_local_forecasts'.
+
+The errors are accumulated online, per series, as sums and counts of each measure, so no matrix of forecasts and actual
+values is needed to calculate them. The forecasts are kept in an array aligned with the buffer. The results are written
+as in R: the forecasts in 'results/rolling_origin_forecasts', the error files of 'calculate_errors' in
+'results/rolling_origin_errors' and the execution time in 'results/rolling_origin_execution_times'.
+'''
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# The experiments import 'config', 'models' and 'utils' from the src folder
+SRC_DIR = Path(__file__).resolve().parent.parent
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(1, str(SRC_DIR))
+
+import config
+import utils.data_loader as loader
+import utils.series_buffer as series_buffer
+import utils.error_calculator as error_calculator
+import utils.instrumentation as instrumentation
+import utils.scale_cache as scale_cache
+from utils.predictor_cache import file_sha256
+from models.local_univariate_models import get_local_forecasts
+from experiments.local_model_experiments import SEASONALITY_MAP
+
+BASE_DIR = Path(config.BASE_DIR)
+
+VALUE_COL_NAME = 'series_value'
+
+'''Share of each series used for training before the first origin, as in 'rolling_origin.R' '''
+TRAIN_SPLIT = 0.8
+
+'''Number of steps forecast from each origin'''
+ROLLING_ORIGIN_FORECAST_HORIZON = 1
+
+'''Number of origins fitted together'''
+ORIGIN_BATCH_SIZE = 8192
+
+'''Errors accumulated for every forecast, from which the error measures of each series are calculated'''
+ONLINE_ERROR_MEASURES = ['smape', 'msmape', 'absolute_error', 'squared_error']
+
+
+def rolling_origin_splits(offsets, train_split=TRAIN_SPLIT, max_origins=None):
+    """
+    Calculates the number of training values of each series before its first origin.
+
+    Parameters:
+    - offsets (ndarray): The offsets of the series inside the buffer, from 'build_series_buffer'.
+    - train_split (float): The share of each series used for training, rounded as in R.
+    - max_origins (int, optional): The maximum number of origins of each series, the last ones being kept.
+
+    Returns:
+    - An int64 array with the length of the training part of each series.
+    """
+    lengths = np.diff(offsets)
+    # 'np.round' rounds halves to even, as 'round' in R
+    splits = np.where(lengths == 2, 1, np.round(lengths * train_split)).astype(np.int64)
+    if max_origins is not None:
+        splits = np.maximum(splits, lengths - max_origins)
+    return np.clip(splits, np.minimum(lengths, 1), lengths)
+
+
+def origin_positions(offsets, splits):
+    """
+    Lists the origins of all series, as the positions in the buffer of the values they forecast.
+
+    Parameters:
+    - offsets (ndarray): The offsets of the series inside the buffer.
+    - splits (ndarray): The length of the training part of each series, from 'rolling_origin_splits'.
+
+    Returns:
+    - A tuple (series_index, positions) of int64 arrays, ordered by the rank of the origin within its series and then
+      by series. The training values of an origin are values[offsets[series_index]:positions].
+    """
+    counts = np.diff(offsets) - splits
+    series_index = np.repeat(np.arange(len(counts)), counts)
+    ranks = np.arange(counts.sum(), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+    positions = offsets[:-1][series_index] + splits[series_index] + ranks
+    order = np.argsort(ranks, kind='stable')
+    return series_index[order], positions[order]
+
+
+def start_error_sums(n_series):
+    """
+    Creates the online accumulators of the errors: the sum and the number of observed values of each measure per series.
+    """
+    return {measure: (np.zeros(n_series), np.zeros(n_series, dtype=np.int64)) for measure in ONLINE_ERROR_MEASURES}
+
+
+def accumulate_errors(error_sums, series_index, forecasts, actuals):
+    """
+    Adds the errors of a batch of forecasts to the sums of their series, ignoring missing values as R does.
+
+    Parameters:
+    - error_sums (dict): The accumulators, from 'start_error_sums'.
+    - series_index (ndarray): The series of each forecast.
+    - forecasts (ndarray): The forecasts of the batch.
+    - actuals (ndarray): The actual values of the batch.
+    """
+    absolute_errors = np.abs(forecasts - actuals)
+    batch_errors = {
+        'smape': error_calculator.smape_steps(forecasts, actuals),
+        'msmape': error_calculator.msmape_steps(forecasts, actuals),
+        'absolute_error': absolute_errors,
+        'squared_error': absolute_errors ** 2,
+    }
+    for measure, errors in batch_errors.items():
+        sums, counts = error_sums[measure]
+        observed = ~np.isnan(errors)
+        n_series = len(sums)
+        sums += np.bincount(series_index[observed], weights=errors[observed], minlength=n_series)
+        counts += np.bincount(series_index[observed], minlength=n_series)
+
+
+def finalize_errors(error_sums, scales):
+    """
+    Calculates the error measures of each series from the accumulated errors, as 'calculate_errors' does on the
+    matrices of forecasts and actual values.
+
+    Parameters:
+    - error_sums (dict): The accumulators, from 'start_error_sums'.
+    - scales (ndarray): The MASE scale of each series, from 'calculate_series_scales'.
+
+    Returns:
+    - A dictionary with the errors of each series, keyed by the names in ERROR_MEASURES.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = {measure: sums / counts for measure, (sums, counts) in error_sums.items()}
+        mase = means['absolute_error'] / scales
+    return {
+        'smape': means['smape'],
+        'msmape': means['msmape'],
+        'mase': mase[np.isfinite(mase)],
+        'mae': means['absolute_error'],
+        'rmse': np.sqrt(means['squared_error']),
+    }
+
+
+def get_rolling_origin_forecasts(
+        dataset_name,
+        method,
+        input_file_name,
+        integer_conversion=False,
+        results_dir=BASE_DIR / 'results',
+        max_origins=None,
+        batch_size=ORIGIN_BATCH_SIZE
+):
+    """
+    Runs the rolling origin evaluation of a dataset with SES or Theta and writes the results in the format of 'rolling_origin.R'.
+
+    Parameters:
+    - dataset_name (str): Name of the dataset, e.g. 'm4_monthly'.
+    - method (str): 'ses' or 'theta'.
+    - input_file_name (str): Name of the .tsf file in the data folder.
+    - integer_conversion (bool): Whether the forecasts should be rounded.
+    - results_dir (Path): Folder of the results, with the 'rolling_origin_*' folders.
+    - max_origins (int, optional): The maximum number of origins of each series, the last ones being kept.
+      By default, every value after the training part is an origin, as in R.
+    - batch_size (int): Number of origins fitted together.
+
+    Returns:
+    - The dictionary of the errors of each series, from 'finalize_errors'.
+    """
+    print(f'Started {dataset_name}')
+    results_dir = Path(results_dir)
+    file_name = f'{dataset_name}_{method}'
+    run_record = instrumentation.start_run_record('get_rolling_origin_forecasts', file_name, dataset=dataset_name, method=method)
+
+    with instrumentation.record_stage(run_record, 'load'):
+        df, frequency, _, _, _ = loader.convert_tsf_to_dataframe(Path(config.DATA_DIR) / input_file_name, 'NaN', VALUE_COL_NAME)
+    seasonality = SEASONALITY_MAP[frequency] if frequency is not None else 1
+    values, offsets = series_buffer.build_series_buffer(df[VALUE_COL_NAME])
+    n_series = len(offsets) - 1
+
+    start_exec_time = datetime.now()
+    print('started Rolling Origin')
+    splits = rolling_origin_splits(offsets, max_origins=max_origins)
+    series_index, positions = origin_positions(offsets, splits)
+    starts = offsets[:-1]
+    forecast_buffer = np.full(len(values), np.nan)
+    error_sums = start_error_sums(n_series)
+    with instrumentation.record_stage(run_record, 'train'):
+        for batch_start in range(0, len(positions), batch_size):
+            batch_series = series_index[batch_start:batch_start + batch_size]
+            batch_positions = positions[batch_start:batch_start + batch_size]
+            train_series_list = [values[starts[s]:position] for s, position in zip(batch_series, batch_positions)]
+            forecasts = get_local_forecasts(train_series_list, ROLLING_ORIGIN_FORECAST_HORIZON, method, seasonality)[:, 0]
+            if integer_conversion:
+                forecasts = np.round(forecasts)
+            forecast_buffer[batch_positions] = forecasts
+            accumulate_errors(error_sums, batch_series, forecasts, values[batch_positions])
+    print('Finished rolling origin')
+    exec_time = datetime.now() - start_exec_time
+    print(exec_time)
+
+    with instrumentation.record_stage(run_record, 'write'):
+        series_names = df['series_name'] if 'series_name' in df.columns else range(1, n_series + 1)
+        os.makedirs(results_dir / 'rolling_origin_forecasts', exist_ok=True)
+        with open(results_dir / 'rolling_origin_forecasts' / f'{file_name}.txt', 'w') as f:
+            for name, start, end in zip(series_names, starts + splits, offsets[1:]):
+                f.write(','.join([str(name)] + [error_calculator.format_error_value(v) for v in forecast_buffer[start:end]]) + '\n')
+        os.makedirs(results_dir / 'rolling_origin_execution_times', exist_ok=True)
+        with open(results_dir / 'rolling_origin_execution_times' / f'{file_name}.txt', 'w') as output_time:
+            output_time.write(str(exec_time))
+
+    with instrumentation.record_stage(run_record, 'metrics'):
+        # As in R, the MASE is scaled on the training part before the first origin of each series
+        test_mask = np.zeros(len(values), dtype=bool)
+        test_mask[positions] = True
+        training_set = (values[~test_mask], offsets - np.concatenate([[0], np.cumsum(np.diff(offsets) - splits)]))
+        error_scales = scale_cache.get_error_scales(
+            training_set, None, seasonality,
+            scale_cache.scale_cache_key(
+                file_sha256(Path(config.DATA_DIR) / input_file_name), seasonality,
+                evaluation='rolling_origin', train_split=TRAIN_SPLIT, max_origins=max_origins
+            ),
+            results_dir / Path(scale_cache.SCALE_CACHE_DIR).name
+        )
+        scales = error_calculator.calculate_series_scales(training_set, seasonality, error_scales)
+        errors = finalize_errors(error_sums, scales)
+        error_calculator.write_error_files(errors, str(results_dir / 'rolling_origin_errors' / file_name))
+    instrumentation.save_run_record(run_record, results_dir / 'run_records')
+    return errors
+
+
+if __name__ == '__main__':
+    # e.g. python src/experiments/rolling_origin.py m4_monthly theta m4_monthly_dataset.tsf 24
+    get_rolling_origin_forecasts(
+        sys.argv[1], sys.argv[2], sys.argv[3], max_origins=int(sys.argv[4]) if len(sys.argv) > 4 else None
+    )
@@ -0,0 +1,303 @@
+'''
+This script runs the deep learning experiments as a sweep over a grid of datasets, methods and lags.
+
+Each job of the grid is one call of 'get_deep_nn_forecasts'. The jobs run on a bounded pool of worker processes,
+started with 'spawn' so no worker inherits the state (or the threads) of the parent, and each worker caps the threads
+of the numerical libraries at 'threads_per_job', so the pool does not oversubscribe the CPUs.
+
+Jobs whose results already exist (the summary error file and the forecasts) are skipped, so an interrupted sweep
+continues where it stopped. Failed jobs, including those whose worker died, are retried up to 'max_retries' times.
+The jobs are started from the largest dataset to the smallest: the longest jobs do not end up running alone at the end,
+which shortens the total time of the sweep. The status, attempts and time of each job are saved in SWEEP_LOGS_DIR.
+With a budget in hours, only the jobs predicted by 'cost_model.py' to fit in it are run, longest predicted first.
+'''
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+
+# The experiments import 'config' and 'utils' from the src folder
+SRC_DIR = Path(__file__).resolve().parent.parent
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(1, str(SRC_DIR))
+
+import config
+
+BASE_DIR = Path(config.BASE_DIR)
+DATA_DIR = Path(config.DATA_DIR)
+
+'''Folder of the logs of the sweeps'''
+SWEEP_LOGS_DIR = BASE_DIR / 'results' / 'sweep_logs'
+
+'''Number of times a failed job is run again'''
+MAX_RETRIES = 2
+
+'''Deep learning methods of 'get_deep_nn_forecasts' '''
+METHODS = ['feed_forward', 'deepar', 'nbeats', 'wavenet', 'transformer']
+
+'''
+Datasets of the deep learning experiments, as in 'deep_learning_experiments.py':
+input file, lag, external forecast horizon (None if given in the .tsf file) and integer conversion of the forecasts
+'''
+DEEP_LEARNING_DATASETS = {
+    "cif_2016_6": ("cif_6_dataset.tsf", 15, 6, False),
+    "cif_2016_12": ("cif_12_dataset.tsf", 15, 12, False),
+    "nn5_daily": ("nn5_daily_dataset_without_missing_values.tsf", 9, None, False),
+    "tourism_yearly": ("tourism_yearly_dataset.tsf", 2, None, False),
+    "tourism_quarterly": ("tourism_quarterly_dataset.tsf", 5, None, False),
+    "tourism_monthly": ("tourism_monthly_dataset.tsf", 15, None, False),
+    "m1_yearly": ("m1_yearly_dataset.tsf", 2, None, False),
+    "m1_quarterly": ("m1_quarterly_dataset.tsf", 5, None, False),
+    "m1_monthly": ("m1_monthly_dataset.tsf", 15, None, False),
+    "m3_yearly": ("m3_yearly_dataset.tsf", 2, None, False),
+    "m3_quarterly": ("m3_quarterly_dataset.tsf", 5, None, False),
+    "m3_monthly": ("m3_monthly_dataset.tsf", 15, None, False),
+    "m3_other": ("m3_other_dataset.tsf", 2, None, False),
+    "m4_quarterly": ("m4_quarterly_dataset.tsf", 5, None, False),
+    "m4_monthly": ("m4_monthly_dataset.tsf", 15, None, False),
+    "m4_weekly": ("m4_weekly_dataset.tsf", 65, None, False),
+    "m4_daily": ("m4_daily_dataset.tsf", 9, None, False),
+    "m4_hourly": ("m4_hourly_dataset.tsf", 210, None, False),
+    "car_parts": ("car_parts_dataset_without_missing_values.tsf", 15, 12, True),
+    "hospital": ("hospital_dataset.tsf", 15, 12, True),
+    "fred_md": ("fred_md_dataset.tsf", 15, 12, False),
+    "nn5_weekly": ("nn5_weekly_dataset.tsf", 65, 8, False),
+    "traffic_weekly": ("traffic_weekly_dataset.tsf", 65, 8, False),
+    "electricity_weekly": ("electricity_weekly_dataset.tsf", 65, 8, True),
+    "solar_weekly": ("solar_weekly_dataset.tsf", 6, 5, False),
+    "kaggle_web_traffic_weekly": ("kaggle_web_traffic_weekly_dataset.tsf", 10, 8, True),
+    "dominick": ("dominick_dataset.tsf", 10, 8, False),
+    "us_births": ("us_births_dataset.tsf", 9, 30, True),
+    "saugeen_river_flow": ("saugeenday_dataset.tsf", 9, 30, False),
+    "sunspot": ("sunspot_dataset_without_missing_values.tsf", 9, 30, True),
+    "covid_deaths": ("covid_deaths_dataset.tsf", 9, 30, True),
+    "weather": ("weather_dataset.tsf", 9, 30, False),
+    "traffic_hourly": ("traffic_hourly_dataset.tsf", 30, 168, False),
+    "electricity_hourly": ("electricity_hourly_dataset.tsf", 30, 168, True),
+    "solar_10_minutes": ("solar_10_minutes_dataset.tsf", 50, 1008, False),
+    "kdd_cup": ("kdd_cup_2018_dataset_without_missing_values.tsf", 210, 168, False),
+    "melbourne_pedestrian_counts": ("pedestrian_counts_dataset.tsf", 210, 24, True),
+    "bitcoin": ("bitcoin_dataset_without_missing_values.tsf", 9, 30, False),
+    "vehicle_trips": ("vehicle_trips_dataset_without_missing_values.tsf", 9, 30, True),
+    "aus_elecdemand": ("australian_electricity_demand_dataset.tsf", 420, 336, False),
+    "rideshare": ("rideshare_dataset_without_missing_values.tsf", 210, 168, False),
+    "temperature_rain": ("temperature_rain_dataset_without_missing_values.tsf", 9, 30, False),
+}
+
+'''Environment variables limiting the threads of the numerical libraries (BLAS, OpenMP, MXNet)'''
+THREAD_LIMIT_VARIABLES = [
+    'OMP_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'MXNET_CPU_WORKER_NTHREADS',
+]
+
+
+def job_name(dataset_name, method, lag):
+    """
+    Returns the name of a job, which is also the name of its result files, e.g. 'm1_yearly_deepar_lag_2'.
+    """
+    return f'{dataset_name}_{method}_lag_{lag}'
+
+
+def build_sweep_jobs(datasets=None, methods=METHODS, lags=None, data_dir=DATA_DIR):
+    """
+    Builds the jobs of a grid of datasets, methods and lags.
+
+    Parameters:
+    - datasets (list, optional): Names of the datasets, keys of DEEP_LEARNING_DATASETS. Defaults to all of them.
+    - methods (list): The deep learning methods.
+    - lags (list, optional): The lags to run. Defaults to the lag of each dataset in DEEP_LEARNING_DATASETS.
+    - data_dir (Path): Folder of the .tsf files, used to measure the size of each dataset.
+
+    Returns:
+    - A list of jobs (dict) with the arguments of 'get_deep_nn_forecasts', the name of the job and the size of its dataset.
+    """
+    datasets = list(DEEP_LEARNING_DATASETS) if datasets is None else datasets
+    unknown_datasets = [d for d in datasets if d not in DEEP_LEARNING_DATASETS]
+    if unknown_datasets:
+        raise Exception(f'Unknown datasets: {unknown_datasets}. Add them to DEEP_LEARNING_DATASETS.')
+    jobs = []
+    for dataset_name in datasets:
+        input_file_name, default_lag, external_forecast_horizon, integer_conversion = DEEP_LEARNING_DATASETS[dataset_name]
+        input_path = Path(data_dir) / input_file_name
+        size_bytes = input_path.stat().st_size if input_path.exists() else 0
+        for method in methods:
+            for lag in ([default_lag] if lags is None else lags):
+                jobs.append({
+                    'name': job_name(dataset_name, method, lag),
+                    'dataset_name': dataset_name,
+                    'lag': lag,
+                    'input_file_name': input_file_name,
+                    'method': method,
+                    'external_forecast_horizon': external_forecast_horizon,
+                    'integer_conversion': integer_conversion,
+                    'size_bytes': size_bytes,
+                })
+    return jobs
+
+
+def is_job_completed(job, results_dir=BASE_DIR / 'results'):
+    """
+    Checks whether the results of a job exist: the summary error file and the forecasts, both written at its end.
+    """
+    results_dir = Path(results_dir)
+    return (
+        (results_dir / 'fixed_horizon_errors' / f"{job['name']}.txt").exists()
+        and (results_dir / 'fixed_horizon_forecasts' / f"{job['name']}.json").exists()
+    )
+
+
+def order_jobs(jobs):
+    """
+    Orders the jobs from the largest dataset to the smallest (longest processing time first).
+    """
+    return sorted(jobs, key=lambda job: (-job['size_bytes'], job['name']))
+
+
+def limit_threads(threads_per_job):
+    """
+    Initializer of the workers: caps the threads of the numerical libraries before any of them is imported.
+    """
+    for variable in THREAD_LIMIT_VARIABLES:
+        os.environ[variable] = str(threads_per_job)
+
+
+def run_deep_learning_job(job):
+    """
+    Runs one job with 'get_deep_nn_forecasts'. GluonTS is imported here, in the worker, and not by the parent process.
+    """
+    try:
+        from src.experiments.deep_learning_experiments import get_deep_nn_forecasts
+    except ImportError:
+        from experiments.deep_learning_experiments import get_deep_nn_forecasts
+    get_deep_nn_forecasts(
+        job['dataset_name'],
+        job['lag'],
+        job['input_file_name'],
+        job['method'],
+        job['external_forecast_horizon'],
+        job['integer_conversion']
+    )
+    return job['name']
+
+
+def save_sweep_log(job_statuses, log_dir=SWEEP_LOGS_DIR):
+    """
+    Writes the status of the jobs of a sweep as JSON and returns its path.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = Path(log_dir) / f'sweep_{datetime.now():%Y%m%d_%H%M%S_%f}.json'
+    with open(log_path, 'w') as f:
+        json.dump(job_statuses, f, indent=2)
+    return log_path
+
+
+def run_sweep(
+        jobs,
+        job_function=run_deep_learning_job,
+        max_workers=config.SWEEP_MAX_WORKERS,
+        threads_per_job=config.SWEEP_THREADS_PER_JOB,
+        max_retries=MAX_RETRIES,
+        skip_completed=True,
+        completed_function=is_job_completed,
+        log_dir=SWEEP_LOGS_DIR,
+        budget_hours=None,
+        runtime_model=None
+):
+    """
+    Runs the jobs on a pool of worker processes, largest datasets first.
+
+    Parameters:
+    - jobs (list): The jobs from 'build_sweep_jobs'.
+    - job_function (function): Runs one job in a worker. Must be importable by the workers (defined at module level).
+    - max_workers (int): Number of jobs running at the same time.
+    - threads_per_job (int): Number of threads each job may use in the numerical libraries.
+    - max_retries (int): Number of times a failed job is run again.
+    - skip_completed (bool): Whether to skip the jobs for which 'completed_function' returns True.
+    - completed_function (function): Checks whether the results of a job already exist.
+    - log_dir (Path): Folder of the log of the sweep.
+    - budget_hours (float, optional): Wall-clock budget of the sweep. If given, the jobs predicted not to fit are not run.
+    - runtime_model (dict, optional): The cost model predicting the runtimes. Defaults to one trained on the past runs.
+
+    Returns:
+    - A dict with the status ('completed', 'skipped', 'over_budget' or 'failed'), attempts, seconds and last error of each job.
+    """
+    job_statuses = {}
+    queue = []
+    for job in order_jobs(jobs):
+        if skip_completed and completed_function(job):
+            job_statuses[job['name']] = {'status': 'skipped', 'attempts': 0}
+        else:
+            queue.append(job)
+    print(f'Sweep of {len(jobs)} jobs: {len(queue)} to run, {len(jobs) - len(queue)} already completed')
+    if budget_hours is not None:
+        try:
+            from src.experiments import cost_model
+        except ImportError:
+            from experiments import cost_model
+        runtime_model = cost_model.train_cost_model() if runtime_model is None else runtime_model
+        queue, over_budget, makespan = cost_model.schedule_within_budget(queue, budget_hours * 3600, max_workers, runtime_model)
+        for job in over_budget:
+            job_statuses[job['name']] = {'status': 'over_budget', 'attempts': 0, 'predicted_seconds': job['predicted_seconds']}
+        print(f'{len(queue)} jobs fit in {budget_hours} hours, predicted to end after {makespan / 3600:.1f} hours')
+
+    context = get_context('spawn')
+    executor = None
+    running = {}
+    attempts = {}
+    try:
+        while queue or running:
+            if executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers, mp_context=context, initializer=limit_threads, initargs=(threads_per_job,)
+                )
+            # Only 'max_workers' jobs are submitted at a time, so the queue order (and the retries) decide what runs next
+            while queue and len(running) < max_workers:
+                job = queue.pop(0)
+                attempts[job['name']] = attempts.get(job['name'], 0) + 1
+                running[executor.submit(job_function, job)] = (job, time.perf_counter())
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            pool_broken = False
+            for future in done:
+                job, start_time = running.pop(future)
+                error = future.exception()
+                job_statuses[job['name']] = {
+                    'status': 'completed' if error is None else 'failed',
+                    'attempts': attempts[job['name']],
+                    'seconds': time.perf_counter() - start_time,
+                    'error': None if error is None else ''.join(traceback.format_exception_only(type(error), error)).strip(),
+                }
+                if error is None:
+                    print(f"Completed {job['name']}")
+                    continue
+                pool_broken = pool_broken or isinstance(error, BrokenProcessPool)
+                if attempts[job['name']] <= max_retries:
+                    print(f"Retrying {job['name']} after error: {job_statuses[job['name']]['error']}")
+                    queue.append(job)
+                else:
+                    print(f"Failed {job['name']} after {attempts[job['name']]} attempts")
+            # A worker that died (out of memory, for example) breaks the whole pool: the other running jobs fail too
+            if pool_broken:
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = None
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        log_path = save_sweep_log(job_statuses, log_dir)
+        print(f'Sweep log saved in {log_path}')
+    return job_statuses
+
+
+if __name__ == '__main__':
+    # Optionally restrict the sweep to some datasets: python src/experiments/sweep.py m1_yearly m1_quarterly
+    run_sweep(build_sweep_jobs(datasets=sys.argv[1:] or None))
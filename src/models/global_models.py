@@ -0,0 +1,117 @@
+'''
+This script fits the pooled regression of 'global_models.R' in Python: one linear model, without intercept, predicting
+the next normalized value of every series from its 'lag' previous values.
+
+The design matrix is never built. The windows of the lag are taken from the store of 'utils/lag_embedding.py' a chunk
+at a time, and only the normal equations X'X (lag x lag) and X'y (lag) are accumulated, so the memory needed does not
+depend on the number of series. Windows with missing values are left out, as 'glm' does. The equations are solved once
+and the forecasts of all series are computed together, step by step as in 'forec_recursive': each step is a single
+matrix product between the last 'lag' values of every series and the coefficients, and the forecast becomes the most
+recent lag of the next step. The forecasts are multiplied back by the mean of each series.
+'''
+import numpy as np
+
+try:
+    from src.utils.lag_embedding import build_lag_embedding, iter_lag_chunks, final_lags, CHUNK_ROWS, LAG_EMBEDDING_DIR
+    from src.utils.series_buffer import build_series_buffer
+except ImportError:
+    from utils.lag_embedding import build_lag_embedding, iter_lag_chunks, final_lags, CHUNK_ROWS, LAG_EMBEDDING_DIR
+    from utils.series_buffer import build_series_buffer
+
+'''Global models available in Python. CatBoost is still trained in R by 'global_models.R' '''
+GLOBAL_METHODS = ['pooled_regression']
+
+
+def accumulate_normal_equations(store, lag, chunk_rows=CHUNK_ROWS):
+    """
+    Accumulates the normal equations of the regression of each window target on its past values.
+
+    Parameters:
+    - store (dict): The normalized buffer, from 'build_lag_embedding'.
+    - lag (int): The number of past values used as predictors.
+    - chunk_rows (int): The number of windows copied at a time.
+
+    Returns:
+    - A tuple (xtx, xty, n_rows): the (lag, lag) matrix X'X, the vector X'y and the number of windows used.
+    """
+    xtx = np.zeros((lag, lag))
+    xty = np.zeros(lag)
+    n_rows = 0
+    for X, y in iter_lag_chunks(store, lag, chunk_rows):
+        complete = np.isfinite(X).all(axis=1) & np.isfinite(y)
+        if not complete.all():
+            X, y = X[complete], y[complete]
+        xtx += X.T @ X
+        xty += X.T @ y
+        n_rows += len(y)
+    return xtx, xty, n_rows
+
+
+def fit_pooled_regression(store, lag, chunk_rows=CHUNK_ROWS):
+    """
+    Fits the pooled regression on the windows of a lag.
+
+    Returns:
+    - The coefficients of the past values (ndarray of length lag), from the oldest to the most recent.
+    """
+    xtx, xty, n_rows = accumulate_normal_equations(store, lag, chunk_rows)
+    if n_rows == 0:
+        raise Exception(f'No series has more than {lag} values without missing values to fit the pooled regression.')
+    # 'lstsq' gives the minimum norm solution when X'X is singular, e.g. for constant series
+    return np.linalg.lstsq(xtx, xty, rcond=None)[0]
+
+
+def forecast_recursive(coefficients, last_values, forecast_horizon):
+    """
+    Forecasts all series recursively, each forecast becoming the most recent past value of the next step.
+
+    Parameters:
+    - coefficients (ndarray): The coefficients of the past values, from the oldest to the most recent.
+    - last_values (ndarray): The (n_series, lag) last values of each series, from the oldest to the most recent.
+    - forecast_horizon (int): The number of steps to forecast.
+
+    Returns:
+    - The (n_series, forecast_horizon) forecasts.
+    """
+    lag = len(coefficients)
+    values = np.empty((len(last_values), lag + forecast_horizon))
+    values[:, :lag] = last_values
+    for step in range(forecast_horizon):
+        values[:, lag + step] = values[:, step:lag + step] @ coefficients
+    return values[:, lag:]
+
+
+def get_global_forecasts(
+        series_list,
+        lag,
+        forecast_horizon,
+        method='pooled_regression',
+        key=None,
+        cache_dir=LAG_EMBEDDING_DIR,
+        memmap_threshold_mb=None,
+        chunk_rows=CHUNK_ROWS
+):
+    """
+    Fits a global model on the training series of a dataset and forecasts all of them.
+
+    Parameters:
+    - series_list (list or tuple): The training values of each series, or a tuple (values, offsets) from 'build_series_buffer'.
+    - lag (int): The number of past values used as predictors.
+    - forecast_horizon (int): The number of steps to forecast.
+    - method (str): The global model, one of GLOBAL_METHODS.
+    - key (str, optional): The key of the normalized buffer in the cache of 'lag_embedding.py', so the lags of a sweep
+      share a single memory-mapped buffer.
+    - cache_dir (str): Folder of the memory-mapped buffers.
+    - memmap_threshold_mb (float, optional): Buffers larger than this are memory-mapped, see 'build_lag_embedding'.
+    - chunk_rows (int): The number of windows copied at a time.
+
+    Returns:
+    - The (n_series, forecast_horizon) forecasts, in the scale of the series.
+    """
+    if method not in GLOBAL_METHODS:
+        raise Exception(f'Global method {method} is not available in Python. Options are {GLOBAL_METHODS}.')
+    values, offsets = series_list if isinstance(series_list, tuple) else build_series_buffer(series_list)
+    store = build_lag_embedding(values, offsets, key=key, cache_dir=cache_dir, memmap_threshold_mb=memmap_threshold_mb)
+    coefficients = fit_pooled_regression(store, lag, chunk_rows)
+    forecasts = forecast_recursive(coefficients, final_lags(store, lag), forecast_horizon)
+    return forecasts * store['means'][:, None]
@@ -0,0 +1,249 @@
+'''
+This script fits simple exponential smoothing (SES) and the Theta method on blocks of series at once,
+mirroring 'get_ses_forecasts' and 'get_theta_forecasts' of 'local_univariate_models.R'.
+
+The series of a block are right-aligned in a 2-D (series x time) array, padded at the start and masked, so every series
+ends in the last column and the recursions run over the time axis for all series (and all candidate smoothing
+constants) together. Series are sorted by length before being cut into blocks, which keeps the padding small.
+
+SES is fitted as 'ses' in R, an ETS(A,N,N) model whose smoothing constant alpha and initial level l0 minimize the sum of
+squared one-step errors. For a given alpha, the one-step forecasts are linear in l0, so the best l0 has a closed form:
+a single pass over the time axis gives the sum of squared errors of every candidate alpha with its best l0.
+Alpha is searched on a grid over [0.0001, 0.9999], refined around the best value in a few stages.
+
+Theta follows 'thetaf' in R: series with a significant seasonal autocorrelation (90% one-sided test) are seasonally
+adjusted with a classical multiplicative decomposition, SES is fitted on the adjusted series, the forecasts are shifted
+by half the slope of the linear trend, and the seasonal indices are applied back.
+Series with missing values get seasonal naive forecasts, as the R functions do when the model fails.
+'''
+import numpy as np
+
+'''Bounds of the smoothing constant, as in 'ets' in R'''
+ALPHA_BOUNDS = (1e-4, 0.9999)
+
+'''Number of smoothing constants evaluated per stage of the search, and number of stages'''
+ALPHA_GRID_SIZE = 21
+ALPHA_SEARCH_STAGES = 3
+
+'''Number of series fitted together'''
+SERIES_BLOCK_SIZE = 1024
+
+'''Critical value of the seasonality test of 'thetaf', qnorm(0.95)'''
+SEASONALITY_TEST_CRITICAL_VALUE = 1.6448536269514722
+
+
+def pad_series(series_list):
+    """
+    Right-aligns series of different lengths in a 2-D array.
+
+    Parameters:
+    - series_list (list): The values of each series.
+
+    Returns:
+    - A tuple (values, mask, lengths): the (n_series, max_length) array padded with zeros at the start,
+      the boolean mask of the actual values and the length of each series.
+    """
+    lengths = np.array([len(series) for series in series_list], dtype=np.int64)
+    n_periods = int(lengths.max()) if len(lengths) else 0
+    values = np.zeros((len(series_list), n_periods))
+    mask = np.arange(n_periods)[None, :] >= (n_periods - lengths)[:, None]
+    values[mask] = np.concatenate([np.asarray(series, dtype=float) for series in series_list]) if len(series_list) else []
+    return values, mask, lengths
+
+
+def ses_sse(values, mask, alphas):
+    """
+    Runs the SES recursion for several smoothing constants per series, with the best initial level of each.
+
+    The one-step forecast of period t is c_t + (1 - alpha)^t * l0, where c_t is the forecast obtained with l0 = 0, so the
+    sum of squared errors is quadratic in l0 and minimized by l0 = sum(w_t e_t) / sum(w_t^2), with w_t = (1 - alpha)^t
+    and e_t the errors of the forecasts with l0 = 0.
+
+    Parameters:
+    - values (ndarray): The (n_series, n_periods) right-aligned values, from 'pad_series'.
+    - mask (ndarray): The mask of the actual values.
+    - alphas (ndarray): The (n_series, n_alphas) smoothing constants to evaluate.
+
+    Returns:
+    - A tuple (sse, level) of (n_series, n_alphas) arrays: the sum of squared one-step errors and the final level.
+    """
+    forecasts = np.zeros(alphas.shape)
+    weights = np.ones(alphas.shape)
+    sum_squared_errors = np.zeros(alphas.shape)
+    sum_weighted_errors = np.zeros(alphas.shape)
+    sum_squared_weights = np.zeros(alphas.shape)
+    decays = 1 - alphas
+    for t in range(values.shape[1]):
+        errors = values[:, t, None] - forecasts
+        if mask[:, t].all():
+            sum_squared_errors += errors * errors
+            sum_weighted_errors += weights * errors
+            sum_squared_weights += weights * weights
+            forecasts += alphas * errors
+            weights *= decays
+        else:
+            valid = mask[:, t, None]
+            sum_squared_errors += np.where(valid, errors * errors, 0)
+            sum_weighted_errors += np.where(valid, weights * errors, 0)
+            sum_squared_weights += np.where(valid, weights * weights, 0)
+            forecasts = np.where(valid, forecasts + alphas * errors, forecasts)
+            weights = np.where(valid, weights * decays, weights)
+    initial_level = sum_weighted_errors / sum_squared_weights
+    sse = sum_squared_errors - sum_weighted_errors * initial_level
+    return sse, forecasts + weights * initial_level
+
+
+def fit_ses(values, mask):
+    """
+    Fits SES on padded series, searching the smoothing constant on a grid refined around the best value.
+
+    Returns:
+    - A tuple (alpha, level, sse) with one value per series.
+    """
+    n_series = len(values)
+    lower = np.full(n_series, ALPHA_BOUNDS[0])
+    upper = np.full(n_series, ALPHA_BOUNDS[1])
+    grid = np.linspace(0, 1, ALPHA_GRID_SIZE)
+    rows = np.arange(n_series)
+    for _ in range(ALPHA_SEARCH_STAGES):
+        alphas = lower[:, None] + (upper - lower)[:, None] * grid[None, :]
+        sse, level = ses_sse(values, mask, alphas)
+        best = np.argmin(np.where(np.isnan(sse), np.inf, sse), axis=1)
+        alpha, best_level, best_sse = alphas[rows, best], level[rows, best], sse[rows, best]
+        step = (upper - lower) / (ALPHA_GRID_SIZE - 1)
+        lower = np.maximum(ALPHA_BOUNDS[0], alpha - step)
+        upper = np.minimum(ALPHA_BOUNDS[1], alpha + step)
+    return alpha, best_level, best_sse
+
+
+def seasonality_test(values, mask, lengths, m):
+    """
+    Tests the seasonality of each series as 'thetaf' does: the autocorrelation at lag m must be significant
+    at 90%, for series longer than two seasons that are not constant.
+    """
+    if m <= 1:
+        return np.zeros(len(values), dtype=bool)
+    means = np.where(mask, values, 0).sum(axis=1) / lengths
+    deviations = np.where(mask, values - means[:, None], 0)
+    denominator = (deviations * deviations).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Padded positions are zero, so they add nothing to the products of the autocorrelations
+        autocorrelations = np.column_stack([
+            (deviations[:, k:] * deviations[:, :-k]).sum(axis=1) / denominator for k in range(1, m + 1)
+        ])
+        statistic = np.sqrt((1 + 2 * (autocorrelations[:, :-1] ** 2).sum(axis=1)) / lengths)
+        seasonal = np.abs(autocorrelations[:, -1]) / statistic > SEASONALITY_TEST_CRITICAL_VALUE
+    return seasonal & (lengths > 2 * m) & (denominator > 0)
+
+
+def seasonal_phases(mask, lengths, m):
+    """
+    Returns the position of each period in the season, counted from the first value of each series.
+    """
+    n_periods = mask.shape[1]
+    return (np.arange(n_periods)[None, :] - (n_periods - lengths)[:, None]) % m
+
+
+def multiplicative_seasonal_indices(values, mask, lengths, m):
+    """
+    Calculates the seasonal indices of a classical multiplicative decomposition, as 'decompose' in R:
+    the ratio of the values to a centered moving average of order m, averaged per position in the season
+    and normalized to a mean of 1.
+
+    Returns:
+    - An (n_series, m) array of indices, by position in the season counted from the first value of each series.
+    """
+    n_series, n_periods = values.shape
+    half = m // 2
+    cumulative = np.zeros((n_series, n_periods + 1))
+    np.cumsum(values, axis=1, out=cumulative[:, 1:])
+    centers = np.arange(half, n_periods - half)
+    trend = cumulative[:, centers + half + 1] - cumulative[:, centers - half]
+    if m % 2 == 0:
+        # Centered moving average of an even order: half weights at both ends of the window
+        trend -= 0.5 * (values[:, centers - half] + values[:, centers + half])
+    trend /= m
+    valid = mask[:, centers - half]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratios = values[:, centers] / trend
+    phases = seasonal_phases(mask, lengths, m)[:, centers]
+    index = (np.arange(n_series)[:, None] * m + phases)[valid]
+    sums = np.bincount(index, weights=ratios[valid], minlength=n_series * m).reshape(n_series, m)
+    counts = np.bincount(index, minlength=n_series * m).reshape(n_series, m)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        figure = sums / counts
+        return figure / figure.mean(axis=1, keepdims=True)
+
+
+def snaive_forecasts(series, forecast_horizon, m):
+    """
+    Seasonal naive forecasts of one series: the last season repeated, or the last value if the series is shorter.
+    """
+    series = np.asarray(series, dtype=float)
+    last_season = series[-m:] if m > 1 and len(series) >= m else series[-1:]
+    return np.resize(last_season, forecast_horizon)
+
+
+def forecast_block(series_list, forecast_horizon, method, m):
+    """
+    Forecasts a block of series without missing values with SES or Theta.
+    """
+    values, mask, lengths = pad_series(series_list)
+    seasonal = seasonality_test(values, mask, lengths, m) if method == 'theta' else np.zeros(len(values), dtype=bool)
+    if seasonal.any():
+        figure = multiplicative_seasonal_indices(values[seasonal], mask[seasonal], lengths[seasonal], m)
+        # As in 'thetaf', indices close to zero fall back to the non-seasonal method
+        usable = (np.abs(figure) >= 1e-4).all(axis=1) & np.isfinite(figure).all(axis=1)
+        seasonal[np.flatnonzero(seasonal)[~usable]] = False
+        figure = figure[usable]
+        indices = np.take_along_axis(figure, seasonal_phases(mask[seasonal], lengths[seasonal], m), axis=1)
+        values[seasonal] = np.where(mask[seasonal], values[seasonal] / indices, 0)
+
+    alpha, level, _ = fit_ses(values, mask)
+    forecasts = np.repeat(level[:, None], forecast_horizon, axis=1)
+    if method == 'theta':
+        # Half the slope of the linear trend of each series, fitted on 0, ..., n - 1
+        positions = np.where(mask, np.arange(values.shape[1])[None, :] - (values.shape[1] - lengths)[:, None], 0)
+        mean_positions = (lengths - 1) / 2
+        means = values.sum(axis=1) / lengths
+        centered_positions = np.where(mask, positions - mean_positions[:, None], 0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = (centered_positions * (values - means[:, None])).sum(axis=1) / (centered_positions ** 2).sum(axis=1)
+        slope = np.nan_to_num(slope)
+        alpha = np.maximum(1e-10, alpha)
+        drift = np.arange(forecast_horizon)[None, :] + ((1 - (1 - alpha) ** lengths) / alpha)[:, None]
+        forecasts += slope[:, None] / 2 * drift
+        if seasonal.any():
+            future_phases = (lengths[seasonal, None] + np.arange(forecast_horizon)[None, :]) % m
+            forecasts[seasonal] *= np.take_along_axis(figure, future_phases, axis=1)
+    return forecasts
+
+
+def get_local_forecasts(series_list, forecast_horizon, method, seasonality=1, block_size=SERIES_BLOCK_SIZE):
+    """
+    Forecasts many series with SES or Theta, fitting blocks of series of similar lengths together.
+
+    Parameters:
+    - series_list (list): The training values of each series.
+    - forecast_horizon (int): Number of periods to forecast.
+    - method (str): 'ses' or 'theta'.
+    - seasonality (int, float or list): The seasonality of the dataset. As the frequency of 'msts' in R,
+      the largest seasonal period, rounded down, is used.
+    - block_size (int): Number of series fitted together.
+
+    Returns:
+    - An (n_series, forecast_horizon) array of forecasts.
+    """
+    if method not in ['ses', 'theta']:
+        raise Exception(f"Unknown method {method}: use 'ses' or 'theta'.")
+    m = int(np.max(seasonality))
+    forecasts = np.empty((len(series_list), forecast_horizon))
+    missing = np.array([len(series) == 0 or np.isnan(series).any() for series in series_list], dtype=bool)
+    for i in np.flatnonzero(missing):
+        forecasts[i] = snaive_forecasts(series_list[i], forecast_horizon, m) if len(series_list[i]) else np.nan
+
+    order = np.flatnonzero(~missing)[np.argsort([len(series_list[i]) for i in np.flatnonzero(~missing)], kind='stable')]
+    for start in range(0, len(order), block_size):
+        block = order[start:start + block_size]
+        forecasts[block] = forecast_block([series_list[i] for i in block], forecast_horizon, method, m)
+    return forecasts
@@ -0,0 +1,357 @@
+'''
+This script provides single-pass, mergeable statistics for series that are too long to be held in memory at once,
+such as the 4 seconds solar and wind datasets or London smart meters.
+
+The moments (count, mean, standard deviation and skewness) are accumulated block by block with the parallel
+formulas of Chan et al. / Pebay, which extend Welford's update to whole blocks. The results are exact up to floating point
+rounding and equal to the pandas 'mean', 'std' and 'skew' of the full series.
+
+The median and quartiles come from a KLL quantile sketch: values are kept in levels of compactors, where an item
+at level h stands for 2**h original values, and a full level is sorted and half of its items (every other one,
+starting at a random offset) are promoted to the next level. With the default k=200 the sketch keeps at most about 3k = 600
+values whatever the length of the series, and the rank of a returned quantile is within about 1.5% of the number
+of values of its exact rank with high probability. The error shrinks roughly as 1/k.
+
+Both states are plain dictionaries of numbers and NumPy arrays, so they can be updated per block, merged across chunks
+and sent between worker processes.
+
+The 'iter_tsf_value_blocks' function reads a .tsf file in blocks of characters, so even a series longer than the
+available memory can be summarized in one pass over the file.
+'''
+from datetime import datetime
+
+import numpy as np
+
+'''Default size of the quantile sketches: larger values reduce the rank error and use more memory'''
+SKETCH_K = 200
+
+'''Number of characters read from the .tsf file at a time when streaming its values'''
+BLOCK_CHARS = 2 ** 24
+
+SKETCH_RNG = np.random.default_rng(0)
+
+
+def init_moments():
+    """
+    Creates an empty moments state.
+
+    Returns:
+    - A dictionary with the count ('n'), the mean and the second and third central moment sums ('m2', 'm3').
+    """
+    return {'n': 0, 'mean': 0.0, 'm2': 0.0, 'm3': 0.0}
+
+
+def merge_moments(moments_a, moments_b):
+    """
+    Merges two moments states, as if all their values had been accumulated in a single state.
+
+    Parameters:
+    - moments_a (dict): A moments state.
+    - moments_b (dict): Another moments state.
+
+    Returns:
+    - The merged moments state (dict).
+    """
+    n_a, n_b = moments_a['n'], moments_b['n']
+    if n_a == 0:
+        return dict(moments_b)
+    if n_b == 0:
+        return dict(moments_a)
+    n = n_a + n_b
+    delta = moments_b['mean'] - moments_a['mean']
+    mean = moments_a['mean'] + delta * n_b / n
+    m2 = moments_a['m2'] + moments_b['m2'] + delta ** 2 * n_a * n_b / n
+    m3 = (
+        moments_a['m3'] + moments_b['m3']
+        + delta ** 3 * n_a * n_b * (n_a - n_b) / n ** 2
+        + 3 * delta * (n_a * moments_b['m2'] - n_b * moments_a['m2']) / n
+    )
+    return {'n': n, 'mean': mean, 'm2': m2, 'm3': m3}
+
+
+def update_moments(moments, values):
+    """
+    Adds a block of values to a moments state. Missing values are ignored.
+
+    Parameters:
+    - moments (dict): A moments state.
+    - values (array-like): The block of values.
+
+    Returns:
+    - The updated moments state (dict).
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return moments
+    block_mean = values.mean()
+    deviations = values - block_mean
+    block_moments = {
+        'n': len(values),
+        'mean': block_mean,
+        'm2': float(np.dot(deviations, deviations)),
+        'm3': float(np.sum(deviations ** 3)),
+    }
+    return merge_moments(moments, block_moments)
+
+
+def moments_to_statistics(moments):
+    """
+    Converts a moments state into the statistics reported by pandas.
+
+    Parameters:
+    - moments (dict): A moments state.
+
+    Returns:
+    - A dictionary with the 'mean', the sample 'std' (ddof=1) and the adjusted Fisher-Pearson 'skew', as in pandas.
+    """
+    n = moments['n']
+    mean = moments['mean'] if n > 0 else np.nan
+    std = np.sqrt(moments['m2'] / (n - 1)) if n > 1 else np.nan
+    if n < 3:
+        skew = np.nan
+    elif moments['m2'] == 0:
+        skew = 0.0
+    else:
+        m2 = moments['m2'] / n
+        m3 = moments['m3'] / n
+        skew = (n * (n - 1)) ** 0.5 / (n - 2) * m3 / m2 ** 1.5
+    return {'mean': mean, 'std': std, 'skew': skew}
+
+
+def init_sketch(k=SKETCH_K):
+    """
+    Creates an empty quantile sketch.
+
+    Parameters:
+    - k (int): Size of the top level compactor, which controls the accuracy of the sketch.
+
+    Returns:
+    - A dictionary with 'k', the count of values ('n') and the list of compactor 'levels'.
+    """
+    return {'k': k, 'n': 0, 'levels': [np.empty(0)]}
+
+
+def sketch_level_capacity(k, level, n_levels):
+    """
+    Returns the number of items a level can hold before being compacted: k at the top level, decreasing by 2/3 per level below.
+    """
+    return max(2, int(np.ceil(k * (2 / 3) ** (n_levels - 1 - level))))
+
+
+def compress_sketch(sketch):
+    """
+    Compacts every level of the sketch that holds more items than its capacity, promoting half of its items.
+
+    Parameters:
+    - sketch (dict): A quantile sketch, updated in place.
+
+    Returns:
+    - The compressed sketch (dict).
+    """
+    levels = sketch['levels']
+    compacted = True
+    while compacted:
+        compacted = False
+        for level in range(len(levels)):
+            if len(levels[level]) <= sketch_level_capacity(sketch['k'], level, len(levels)):
+                continue
+            if level + 1 == len(levels):
+                levels.append(np.empty(0))
+            items = np.sort(levels[level])
+            n_compacted = len(items) - len(items) % 2
+            offset = SKETCH_RNG.integers(2)
+            levels[level + 1] = np.concatenate([levels[level + 1], items[offset:n_compacted:2]])
+            levels[level] = items[n_compacted:]
+            compacted = True
+    return sketch
+
+
+def update_sketch(sketch, values):
+    """
+    Adds a block of values to a quantile sketch. Missing values are ignored.
+
+    Parameters:
+    - sketch (dict): A quantile sketch, updated in place.
+    - values (array-like): The block of values.
+
+    Returns:
+    - The updated sketch (dict).
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    sketch['levels'][0] = np.concatenate([sketch['levels'][0], values])
+    sketch['n'] += len(values)
+    return compress_sketch(sketch)
+
+
+def merge_sketches(sketch_a, sketch_b):
+    """
+    Merges two quantile sketches, as if all their values had been added to a single sketch.
+
+    Parameters:
+    - sketch_a (dict): A quantile sketch.
+    - sketch_b (dict): Another quantile sketch.
+
+    Returns:
+    - The merged sketch (dict). The inputs are not modified.
+    """
+    n_levels = max(len(sketch_a['levels']), len(sketch_b['levels']))
+    empty = np.empty(0)
+    levels = [
+        np.concatenate([
+            sketch_a['levels'][level] if level < len(sketch_a['levels']) else empty,
+            sketch_b['levels'][level] if level < len(sketch_b['levels']) else empty,
+        ])
+        for level in range(n_levels)
+    ]
+    merged = {'k': min(sketch_a['k'], sketch_b['k']), 'n': sketch_a['n'] + sketch_b['n'], 'levels': levels}
+    return compress_sketch(merged)
+
+
+def sketch_quantiles(sketch, quantiles):
+    """
+    Estimates quantiles from a sketch.
+
+    Parameters:
+    - sketch (dict): A quantile sketch.
+    - quantiles (list): The quantiles to estimate, between 0 and 1.
+
+    Returns:
+    - An array with the estimated quantiles, NaN if the sketch is empty.
+    """
+    quantiles = np.asarray(quantiles, dtype=float)
+    if sketch['n'] == 0:
+        return np.full(len(quantiles), np.nan)
+    items = np.concatenate(sketch['levels'])
+    weights = np.concatenate([np.full(len(items_level), 2.0 ** level) for level, items_level in enumerate(sketch['levels'])])
+    order = np.argsort(items, kind='stable')
+    items, cumulative_weights = items[order], np.cumsum(weights[order])
+    positions = np.searchsorted(cumulative_weights, quantiles * cumulative_weights[-1], side='left')
+    return items[np.minimum(positions, len(items) - 1)]
+
+
+def parse_tsf_attribute(value, col_type):
+    """
+    Converts an attribute of a .tsf series to its type, as in 'convert_tsf_to_dataframe'.
+    """
+    if col_type == 'numeric':
+        return int(value)
+    elif col_type == 'string':
+        return str(value)
+    elif col_type == 'date':
+        return datetime.strptime(value, '%Y-%m-%d %H-%M-%S')
+    raise Exception('Invalid attribute type.')
+
+
+def parse_tsf_values(tokens):
+    """
+    Converts the comma separated tokens of a .tsf series into floats, with missing values ('?') as NaN.
+    """
+    return np.array(['nan' if token == '?' else token for token in tokens], dtype=float)
+
+
+def read_tsf_header(full_file_path_and_name):
+    """
+    Reads the meta-data section of a .tsf file, stopping at the @data tag.
+
+    Parameters:
+    - full_file_path_and_name (str): The complete path of the .tsf file.
+
+    Returns:
+    - A dictionary with the attribute names ('col_names') and types ('col_types'), the 'frequency' and the 'forecast_horizon'.
+    """
+    header = {'col_names': [], 'col_types': [], 'frequency': None, 'forecast_horizon': None}
+    with open(full_file_path_and_name, 'r', encoding='cp1252') as file:
+        for line in file:
+            line = line.strip()
+            line_content = line.split(' ')
+            if line.startswith('@attribute'):
+                header['col_names'].append(line_content[1])
+                header['col_types'].append(line_content[2])
+            elif line.startswith('@frequency'):
+                header['frequency'] = line_content[1]
+            elif line.startswith('@horizon'):
+                header['forecast_horizon'] = int(line_content[1])
+            elif line.startswith('@data'):
+                break
+    if len(header['col_names']) == 0:
+        raise Exception('Missing attribute section. Attribute section must come before data.')
+    return header
+
+
+def iter_tsf_value_blocks(full_file_path_and_name, block_chars=BLOCK_CHARS):
+    """
+    Reads a .tsf file in a single pass, yielding the values of each series in blocks.
+    Only one block of characters is in memory at a time, so a series can be longer than the available memory.
+
+    Parameters:
+    - full_file_path_and_name (str): The complete path of the .tsf file.
+    - block_chars (int): Number of characters read from the file at a time.
+
+    Yields:
+    - Tuples (attributes, values, series_end): the dictionary of attributes of the current series, an array with the
+      next block of its values and whether the block is the last one of the series.
+    """
+    header = read_tsf_header(full_file_path_and_name)
+    col_names, col_types = header['col_names'], header['col_types']
+    with open(full_file_path_and_name, 'r', encoding='cp1252') as file:
+        for line in file:
+            if line.strip().startswith('@data'):
+                break
+
+        pending = ''
+        attributes = None
+        end_of_file = False
+        while not end_of_file:
+            block = file.read(block_chars)
+            end_of_file = block == ''
+            # Only the unfinished tail of the previous block is carried over, and the block is read through a cursor,
+            # so each character is copied a bounded number of times however many series the block holds
+            text = pending + (block if not end_of_file else '\n')
+            pos = 0
+            while pos < len(text):
+                if attributes is None:
+                    while pos < len(text) and text[pos].isspace():
+                        pos += 1
+                    if pos == len(text):
+                        break
+                    if text[pos] == '#':
+                        line_end = text.find('\n', pos)
+                        if line_end == -1:
+                            break
+                        pos = line_end + 1
+                        continue
+                    header, start = [], pos
+                    for _ in col_names:
+                        colon = text.find(':', start)
+                        if colon == -1:
+                            break
+                        header.append(text[start:colon])
+                        start = colon + 1
+                    if len(header) < len(col_names):
+                        break
+                    attributes = {
+                        col_name: parse_tsf_attribute(value, col_type)
+                        for col_name, col_type, value in zip(col_names, col_types, header)
+                    }
+                    pos = start
+                    continue
+                line_end = text.find('\n', pos)
+                series_end = line_end != -1
+                if series_end:
+                    values_text, next_pos = text[pos:line_end], line_end + 1
+                else:
+                    # The last token may continue in the next block
+                    last_comma = text.rfind(',', pos)
+                    if last_comma == -1:
+                        break
+                    values_text, next_pos = text[pos:last_comma], last_comma + 1
+                pos = next_pos
+                tokens = values_text.strip().split(',')
+                values = parse_tsf_values([token for token in tokens if token != ''])
+                if len(values) or series_end:
+                    yield attributes, values, series_end
+                if series_end:
+                    attributes = None
+            pending = text[pos:]
@@ -9,15 +9,16 @@ For Table 2, the script processes the error metric results for different forecas
 It reads result files, converts them into a structured format, and then pivots the data for easier comparison
 and visualization.
 The resulting DataFrame is also saved in CSV and Excel formats.
+
+pandas is imported inside the functions that build the tables, so 'dodo.py' can read DATASETS_TO_INFO without loading it.
 '''
 from datetime import datetime
-from distutils.util import strtobool
 
-import pandas as pd
 import os
 import config
 import re
 from pathlib import Path
+from utils import instrumentation
 
 BASE_DIR = Path(config.BASE_DIR)
 OUTPUT_DIR = Path(config.OUTPUT_DIR)
@@ -39,6 +40,9 @@ def convert_tsf_to_dataframe(
     Returns:
     - tuple: A tuple containing the loaded DataFrame, frequency of the dataset, forecast horizon, flags indicating if the dataset contains missing values, if all series are of equal length, and if the dataset is for a competition.
     """    
+    import pandas as pd
+    from distutils.util import strtobool
+
     col_names = []
     col_types = []
     all_data = {}
@@ -480,12 +484,16 @@ def generate_table1_dataframe(print_dataset_name=False):
     - bool: True if the function executes successfully, indicating the DataFrame has been generated
       and saved.
     """
+    import pandas as pd
+
+    run_record = instrumentation.start_run_record('generate_table1_dataframe', 'table1')
     datasets_statistics = {}
     for dataset_name, dataset_info in DATASETS_TO_INFO.items():
         if print_dataset_name:
             print(dataset_name)
         try:
-            datasets_statistics[dataset_name] = generate_single_dataset_info(dataset_name, dataset_info)
+            with instrumentation.record_stage(run_record, 'load'):
+                datasets_statistics[dataset_name] = generate_single_dataset_info(dataset_name, dataset_info)
         except Exception as e:
             e = str(e) if len(str(e)) < 100 else str(e)[:50] + "... [truncated]"
             print(f'Error in {dataset_name}: {e}')
@@ -502,8 +510,10 @@ def generate_table1_dataframe(print_dataset_name=False):
     if not os.path.exists(results_folder):
         os.makedirs(results_folder)
     df_table1.reset_index(drop=True, inplace=True)
-    df_table1.to_csv(csv_file_path, index=False)
-    df_table1.to_excel(csv_file_path.replace('.csv', '.xlsx'), index=False)
+    with instrumentation.record_stage(run_record, 'write'):
+        df_table1.to_csv(csv_file_path, index=False)
+        df_table1.to_excel(csv_file_path.replace('.csv', '.xlsx'), index=False)
+    instrumentation.save_run_record(run_record)
     return True
 
 
@@ -562,6 +572,11 @@ MODEL_PATTERN_TO_NAME = {
     '_ses[.]': 'SES',
     '_dhr_arima': '(DHR-) ARIMA',
     '_arima[.]': 'ARIMA',
+    '_feed_forward': 'FFNN',
+    '_deepar': 'Deep AR',
+    '_nbeats': 'N-BEATS',
+    '_wavenet': 'Wave Net',
+    '_transformer': 'Transformer',
 }
 
 
@@ -646,16 +661,20 @@ def generate_table2_dataframe(selected_error_measure='Mean MASE', table_name='ta
     Returns:
         DataFrame: Pivoted results for the selected error measure.
     """    
+    import pandas as pd
+
+    run_record = instrumentation.start_run_record('generate_table2_dataframe', table_name, error_measure=selected_error_measure)
     fixed_horizon_errors = os.listdir('results/fixed_horizon_errors')
     fixed_horizon_errors = [
         f for f in fixed_horizon_errors
         if not bool(re.search('smape[.]txt|mae[.]txt|mase[.]txt|msmape[.]txt|rmse[.]txt', f))
     ]
     fixed_horizon_error_results = {}
-    for error_analysis in fixed_horizon_errors:
-        with open(f'results/fixed_horizon_errors/{error_analysis}', 'r') as f:
-            results = f.readlines()
-        fixed_horizon_error_results[error_analysis] = results
+    with instrumentation.record_stage(run_record, 'load'):
+        for error_analysis in fixed_horizon_errors:
+            with open(f'results/fixed_horizon_errors/{error_analysis}', 'r') as f:
+                results = f.readlines()
+            fixed_horizon_error_results[error_analysis] = results
     fixed_horizon_error_results = {
         f: transform_string_results_to_dict(r) for f, r in fixed_horizon_error_results.items()
     }
@@ -676,8 +695,10 @@ def generate_table2_dataframe(selected_error_measure='Mean MASE', table_name='ta
     if not os.path.exists(results_folder):
         os.makedirs(results_folder)
     pivoted_results = pivoted_results.reset_index().rename({'database': 'Dataset'}, axis=1)
-    pivoted_results.to_csv(csv_file_path, index=False)
-    pivoted_results.to_excel(csv_file_path.replace('.csv', '.xlsx'), index=False)
+    with instrumentation.record_stage(run_record, 'write'):
+        pivoted_results.to_csv(csv_file_path, index=False)
+        pivoted_results.to_excel(csv_file_path.replace('.csv', '.xlsx'), index=False)
+    instrumentation.save_run_record(run_record)
         
 
 if __name__== '__main__':
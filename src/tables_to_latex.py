@@ -15,10 +15,6 @@ The script is straightforward to use, as demonstrated in the '__main__' section,
 and saves example tables with minimum values highlighted.
 '''
 
-import pandas as pd
-import numpy as np
-np.random.seed(100)
-
 import config
 from pathlib import Path
 DATA_DIR = Path(config.DATA_DIR)
@@ -98,6 +94,8 @@ def upload_table_download_latex(
         output_path (Path): Path to save the output LaTeX file.
         pct_columns (list): Columns considered as percentage values.
     """    
+    import pandas as pd
+
     df = pd.read_csv(input_path)
     latex_table_string = convert_table_to_latex(df, float_format_func, ptc_format_func, highlight_min_row, pct_columns, specific_columns_func)
     path = output_path / f'{table_name}.tex'
@@ -0,0 +1,163 @@
+'''
+This script contains tests for the chunked statistics pipeline of 'analysis_general.py'.
+
+- `test_process_dataset_writes_parts_and_checkpoint` checks that every chunk is written as a parquet part and that all
+series end up recorded in the checkpoint and in the optional Excel export.
+- `test_process_dataset_resumes_from_checkpoint` simulates a crash after the first chunk and checks that the rerun only
+calculates the missing series.
+- `test_plan_chunks` checks that chunks respect the points budget and that long series are split into sub-chunks.
+- `test_sub_chunked_series_statistics` checks that series split into sub-chunks get the same statistics as whole series.
+- `test_lazy_summary_statistics` checks that the summary statistics of chunks transformed without timestamps are the same,
+and that a summary-only run skips the advanced statistics.
+- `test_streaming_summary_statistics` compares the single-pass streaming mode with the exact statistics.
+
+The tests build a small .tsf file in a temporary folder, so they do not depend on the downloaded datasets,
+and the run records of the runs are written there too.
+'''
+import os
+import json
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    import src.analysis_general as analysis_general
+except:
+    import analysis_general
+
+
+@pytest.fixture(autouse=True)
+def run_records_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(analysis_general.instrumentation, 'RUN_RECORDS_DIR', str(tmp_path / 'run_records'))
+    return tmp_path / 'run_records'
+
+
+def write_sample_tsf(folder, n_series=5, length=40):
+    '''Write a small monthly .tsf file with random walks and return its file name'''
+    rng = np.random.default_rng(0)
+    lines = [
+        '# Sample dataset used in the tests',
+        '@relation sample',
+        '@attribute series_name string',
+        '@attribute start_timestamp date',
+        '@frequency monthly',
+        '@horizon 6',
+        '@missing false',
+        '@equallength true',
+        '@data',
+    ]
+    for i in range(n_series):
+        values = np.cumsum(rng.normal(size=length)) + 50
+        lines.append(f'T{i + 1}:1990-01-01 00-00-00:' + ','.join(f'{v:.4f}' for v in values))
+    with open(os.path.join(folder, 'sample_dataset.tsf'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return 'sample_dataset.tsf'
+
+
+def test_process_dataset_writes_parts_and_checkpoint(tmp_path):
+    '''Each chunk is written as a part and the Excel export contains every series'''
+    tsf_file = write_sample_tsf(tmp_path)
+    parts_dir = analysis_general.process_dataset(tsf_file, data_dir=tmp_path, statistics_dir=tmp_path / 'statistics')
+    with open(os.path.join(parts_dir, 'checkpoint.json')) as f:
+        checkpoint = json.load(f)
+    assert sorted(checkpoint['completed_series']) == ['T1', 'T2', 'T3', 'T4', 'T5']
+    assert all(os.path.exists(os.path.join(parts_dir, part)) for part in checkpoint['parts'])
+    statistics = pd.read_excel(tmp_path / 'statistics' / 'sample_dataset.xlsx')
+    assert sorted(statistics['series_name']) == ['T1', 'T2', 'T3', 'T4', 'T5']
+    assert (statistics['n_obs'] == 40).all()
+
+
+def test_process_dataset_resumes_from_checkpoint(tmp_path, monkeypatch):
+    '''A rerun after a crash only calculates the series missing from the checkpoint'''
+    tsf_file = write_sample_tsf(tmp_path)
+    statistics_dir = tmp_path / 'statistics'
+    original_transform_dataset = analysis_general.transform_dataset
+
+    def transform_dataset_in_small_chunks(dataset_raw, frequency, memory_budget_mb, columns=None):
+        for i in range(0, len(dataset_raw.index), 2):
+            for chunk in original_transform_dataset(dataset_raw.iloc[i:i + 2], frequency, memory_budget_mb, columns):
+                # process_dataset only asks for the columns of its statistics, so no timestamps are built
+                assert 'timestamp' not in chunk.columns
+                yield chunk
+
+    def crash_after_first_chunk(dataset_raw, frequency, memory_budget_mb, columns=None):
+        chunks = transform_dataset_in_small_chunks(dataset_raw, frequency, memory_budget_mb, columns)
+        yield next(chunks)
+        raise RuntimeError('Simulated crash')
+
+    monkeypatch.setattr(analysis_general, 'transform_dataset', crash_after_first_chunk)
+    with pytest.raises(RuntimeError):
+        analysis_general.process_dataset(tsf_file, data_dir=tmp_path, statistics_dir=statistics_dir)
+
+    processed_series = []
+
+    def record_processed_series(dataset_raw, frequency, memory_budget_mb, columns=None):
+        processed_series.extend(dataset_raw.series_name.tolist())
+        yield from transform_dataset_in_small_chunks(dataset_raw, frequency, memory_budget_mb, columns)
+
+    monkeypatch.setattr(analysis_general, 'transform_dataset', record_processed_series)
+    analysis_general.process_dataset(tsf_file, data_dir=tmp_path, statistics_dir=statistics_dir)
+    assert processed_series == ['T3', 'T4', 'T5']
+    statistics = pd.read_excel(statistics_dir / 'sample_dataset.xlsx')
+    assert sorted(statistics['series_name']) == ['T1', 'T2', 'T3', 'T4', 'T5']
+
+
+def test_plan_chunks():
+    '''Chunks hold at most the budgeted points and long series are split into sub-chunks'''
+    chunks = analysis_general.plan_chunks([3, 4, 2, 12, 1], max_points_per_chunk=5)
+    assert chunks == [
+        [(0, 0, 3)],
+        [(1, 0, 4)],
+        [(2, 0, 2)],
+        [(3, 0, 5)], [(3, 5, 10)], [(3, 10, 12)],
+        [(4, 0, 1)],
+    ]
+    assert analysis_general.plan_chunks([1, 1, 1], max_points_per_chunk=10) == [[(0, 0, 1), (1, 0, 1), (2, 0, 1)]]
+
+
+def test_sub_chunked_series_statistics(tmp_path):
+    '''Splitting series into sub-chunks does not change their statistics'''
+    tsf_file = write_sample_tsf(tmp_path, n_series=2)
+    whole_dir = analysis_general.process_dataset(tsf_file, data_dir=tmp_path, statistics_dir=tmp_path / 'whole')
+    # 0.002 MB hold 8 points, so each series of 40 points is split into 5 sub-chunks
+    split_dir = analysis_general.process_dataset(
+        tsf_file, data_dir=tmp_path, statistics_dir=tmp_path / 'split', memory_budget_mb=0.002
+    )
+    with open(os.path.join(split_dir, 'checkpoint.json')) as f:
+        assert len(json.load(f)['parts']) == 2
+    whole = pd.read_excel(tmp_path / 'whole' / 'sample_dataset.xlsx').set_index('series_name')
+    split = pd.read_excel(tmp_path / 'split' / 'sample_dataset.xlsx').set_index('series_name')
+    pd.testing.assert_frame_equal(whole, split[whole.columns], check_exact=False)
+
+
+def test_streaming_summary_statistics(tmp_path):
+    '''The streaming mode gives the exact moments and timestamps, and sketch quantiles close to the exact ones'''
+    tsf_file = write_sample_tsf(tmp_path)
+    analysis_general.process_dataset(tsf_file, data_dir=tmp_path, statistics_dir=tmp_path / 'exact')
+    analysis_general.process_dataset_streaming(tsf_file, data_dir=tmp_path, statistics_dir=tmp_path / 'streaming', series_per_part=2)
+    exact = pd.read_excel(tmp_path / 'exact' / 'sample_dataset.xlsx').set_index('series_name')
+    streaming = pd.read_excel(tmp_path / 'streaming' / 'sample_dataset.xlsx').set_index('series_name')
+    exact_columns = ['timestamp_min', 'timestamp_max', 'n_obs', 'mean', 'std', 'skew', 'lenght_days', 'coef_variation']
+    pd.testing.assert_frame_equal(exact[exact_columns], streaming[exact_columns], check_exact=False)
+    # Series of 40 values fit in the sketch, so its quantiles are values of the series next to the exact ones
+    assert ((streaming[['q1', 'median', 'q3']] - exact[['q1', 'median', 'q3']]).abs() < exact[['std']].values).all().all()
+
+
+def test_lazy_summary_statistics(tmp_path):
+    '''Series bounds replace the exploded timestamps, and summary-only runs skip the advanced statistics'''
+    tsf_file = write_sample_tsf(tmp_path)
+    dataset_raw, frequency = analysis_general.convert_tsf_to_dataframe(os.path.join(tmp_path, tsf_file))[:2]
+    full = pd.concat(
+        analysis_general.calc_summary_statistics(part) for part in analysis_general.transform_dataset(dataset_raw, frequency)
+    )
+    lean_parts = list(analysis_general.transform_dataset(dataset_raw, frequency, columns=['series_value']))
+    assert 'timestamp' not in lean_parts[0].columns
+    series_bounds = analysis_general.calc_series_bounds(dataset_raw, frequency)
+    lean = pd.concat(analysis_general.calc_summary_statistics(part, series_bounds) for part in lean_parts)
+    full = full.astype({'timestamp_min': 'datetime64[ns]', 'timestamp_max': 'datetime64[ns]'})
+    pd.testing.assert_frame_equal(full, lean[full.columns], check_dtype=False)
+
+    analysis_general.process_dataset(tsf_file, data_dir=tmp_path, statistics_dir=tmp_path / 'summary', statistics=['summary'])
+    summary = pd.read_excel(tmp_path / 'summary' / 'sample_dataset.xlsx')
+    assert 'adf_pvalue' not in summary.columns
+    assert (summary['n_obs'] == 40).all()
@@ -0,0 +1,53 @@
+'''
+This script contains tests for 'benchmark_hot_paths.py', the benchmarks of the hot paths of the pipeline.
+
+- `test_run_benchmarks` runs some benchmarks on small generated files, and checks the saved results, the baseline and
+that the tables of the repository are left untouched.
+- `test_compare_with_baseline` checks which slowdowns and memory increases are regressions.
+'''
+import json
+
+import pytest
+
+try:
+    import src.benchmark_hot_paths as benchmark_hot_paths
+except:
+    import benchmark_hot_paths
+
+SIZES = {'small': (5, 30), 'medium': (10, 60), 'huge': (20, 120)}
+
+
+def test_run_benchmarks(tmp_path):
+    '''The results are saved as JSON, and the first run with --update-baseline becomes the baseline'''
+    table1_path = benchmark_hot_paths.BASE_DIR / 'output' / 'tables' / 'table1.csv'
+    table1_content = table1_path.read_text() if table1_path.exists() else None
+
+    names = ['parse_small', 'parse_huge', 'table1', 'summary_statistics']
+    results = benchmark_hot_paths.run_benchmarks(names, tmp_path, update_baseline=True, tsf_sizes=SIZES, repeats=1)
+    assert sorted(results['benchmarks']) == sorted(names)
+    assert all(result['seconds'] > 0 and result['peak_memory_mb'] > 0 for result in results['benchmarks'].values())
+    baseline = json.loads((tmp_path / 'baseline.json').read_text())
+    assert baseline['benchmarks'] == results['benchmarks']
+    assert len(list(tmp_path.glob('benchmark_*.json'))) == 1
+    assert (table1_path.read_text() if table1_path.exists() else None) == table1_content
+
+    with pytest.raises(Exception, match='Unknown benchmarks'):
+        benchmark_hot_paths.run_benchmarks(['parse_gigantic'], tmp_path, tsf_sizes=SIZES, repeats=1)
+
+
+def test_compare_with_baseline():
+    '''Only the increases over the thresholds are regressions, and the fastest benchmarks are not compared on time'''
+    baseline = {
+        'parse': {'seconds': 1.0, 'peak_memory_mb': 100.0},
+        'table': {'seconds': 0.01, 'peak_memory_mb': 10.0},
+    }
+    assert benchmark_hot_paths.compare_with_baseline(
+        {'parse': {'seconds': 1.2, 'peak_memory_mb': 110.0}, 'table': {'seconds': 0.04, 'peak_memory_mb': 10.0}}, baseline
+    ) == []
+    regressions = benchmark_hot_paths.compare_with_baseline(
+        {'parse': {'seconds': 1.5, 'peak_memory_mb': 90.0}, 'table': {'seconds': 0.01, 'peak_memory_mb': 20.0},
+         'new': {'seconds': 5.0, 'peak_memory_mb': 1.0}},
+        baseline
+    )
+    assert len(regressions) == 2
+    assert regressions[0].startswith('parse: 1.500 s') and regressions[1].startswith('table: 20.0 MB')
@@ -0,0 +1,119 @@
+'''
+This script contains tests for 'experiments/cost_model.py', the runtime predictions and the time-budgeted scheduling.
+
+- `test_read_experiment_jobs` reads the jobs of an R script and the features of their datasets, and parses execution times.
+- `test_fit_cost_model` fits the model on runtimes generated by a known log-linear law and checks its predictions.
+- `test_schedule_within_budget` checks that the scheduled jobs fit the budget on the cores, and that the over-budget
+warning of the chosen models is shown.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    import src.experiments.cost_model as cost_model
+except:
+    import experiments.cost_model as cost_model
+
+R_SCRIPT = '''
+if ('ets' %in% chosen_models || 'all' %in% chosen_models){
+    if ('small_dataset' %in% chosen_datasets || 'all' %in% chosen_datasets){
+        do_fixed_horizon_local_forecasting("small", "ets", "small_dataset.tsf", "series_name", "start_timestamp", 4, TRUE)
+    }
+    if ('large_dataset' %in% chosen_datasets || 'all' %in% chosen_datasets){
+        # do_fixed_horizon_local_forecasting("large", "ets", "old_large_dataset.tsf")
+        do_fixed_horizon_local_forecasting("large", "ets", "large_dataset.tsf")
+    }
+}
+if ('pooled_regression' %in% chosen_models || 'all' %in% chosen_models){
+    if ('large_dataset' %in% chosen_datasets || 'all' %in% chosen_datasets){
+        do_fixed_horizon_global_forecasting("large", 15, "large_dataset.tsf", "pooled_regression", NULL, NULL, 12)
+    }
+}
+'''
+
+
+def write_tsf(path, n_series, length, horizon=None):
+    '''Write a .tsf file with n_series series of the given length'''
+    lines = ['@relation sample', '@attribute series_name string', '@frequency monthly']
+    lines += [f'@horizon {horizon}'] if horizon else []
+    lines += ['@data']
+    lines += [f'T{i}:' + ','.join(['1.5'] * length) for i in range(n_series)]
+    path.write_text('\n'.join(lines) + '\n')
+
+
+@pytest.fixture
+def experiment_files(tmp_path):
+    (tmp_path / 'fixed_horizon.R').write_text(R_SCRIPT)
+    write_tsf(tmp_path / 'small_dataset.tsf', 3, 10)
+    write_tsf(tmp_path / 'large_dataset.tsf', 20, 100, horizon=18)
+    return tmp_path
+
+
+def test_read_experiment_jobs(experiment_files):
+    '''The calls of the R script become jobs named as their result files'''
+    jobs = cost_model.r_experiment_jobs(experiment_files / 'fixed_horizon.R')
+    assert [job['name'] for job in jobs] == ['small_ets', 'large_ets', 'large_pooled_regression_lag_15']
+    assert jobs[0]['dataset_key'] == 'small_dataset' and jobs[0]['external_forecast_horizon'] == 4
+    assert jobs[2]['lag'] == 15 and jobs[2]['external_forecast_horizon'] == 12 and jobs[2]['model'] == 'pooled_regression'
+    assert [job['call'] for job in jobs] == ['local', 'local', 'global']
+    assert jobs[0]['key'] == 'series_name' and jobs[0]['index'] == 'start_timestamp' and jobs[2]['key'] is None
+
+    features = cost_model.job_features(jobs, experiment_files)
+    assert features[['n_series', 'n_points', 'horizon', 'lag']].values.tolist() == [
+        [3, 30, 4, 0], [20, 2000, 18, 0], [20, 2000, 12, 15]
+    ]
+    assert cost_model.parse_execution_time('1.5 mins\n') == 90
+    assert cost_model.parse_execution_time('0:00:02.500000') == 2.5
+    assert cost_model.parse_execution_time('1 day, 2:00:00') == 93600
+
+
+def test_fit_cost_model():
+    '''Runtimes following a log-linear law are predicted closely'''
+    rng = np.random.default_rng(0)
+    n_runs = 60
+    run_features = pd.DataFrame({
+        'name': [f'run_{i}' for i in range(n_runs)],
+        'method': rng.choice(['ets', 'deepar'], n_runs),
+        'lag': rng.integers(0, 30, n_runs),
+        'n_series': rng.integers(10, 10000, n_runs),
+        'horizon': rng.integers(4, 60, n_runs),
+    }).assign(n_points=lambda df: df.n_series * rng.integers(20, 500, n_runs))
+    true_seconds = 1e-3 * (1 + run_features.n_points) * np.where(run_features.method == 'deepar', 20, 1)
+    run_features['seconds'] = true_seconds * np.exp(rng.normal(0, 0.05, n_runs))
+
+    model = cost_model.fit_cost_model(run_features)
+    assert model['methods'] == ['deepar', 'ets'] and model['n_runs'] == n_runs
+    predicted = cost_model.predict_runtime(model, run_features)
+    assert np.abs(np.log(predicted / true_seconds)).max() < 0.2
+    with pytest.raises(Exception):
+        cost_model.fit_cost_model(run_features.iloc[:0])
+
+
+def test_schedule_within_budget(experiment_files, capsys):
+    '''The schedule fits the budget, and the chosen models are checked against it'''
+    jobs = cost_model.r_experiment_jobs(experiment_files / 'fixed_horizon.R')
+    # Runtime proportional to the number of points: 3 s for the small dataset and 200 s for the large one
+    model = {
+        'methods': ['ets'],
+        'coefficients': np.array([np.log(0.1), 0, 1, 0, 0, 0]),
+        'smearing': 1.0,
+        'n_runs': 1,
+    }
+    scheduled, skipped, makespan = cost_model.schedule_within_budget(jobs, 250, 2, model, experiment_files)
+    assert [job['name'] for job in scheduled] == ['large_ets', 'large_pooled_regression_lag_15', 'small_ets']
+    assert [job['core'] for job in scheduled] == [0, 1, 0] and skipped == []
+    assert makespan == pytest.approx(scheduled[0]['predicted_seconds'] + scheduled[2]['predicted_seconds'])
+
+    scheduled, skipped, makespan = cost_model.schedule_within_budget(jobs, 250, 1, model, experiment_files)
+    assert [job['name'] for job in scheduled] == ['large_ets', 'small_ets'] and makespan <= 250
+    assert [job['name'] for job in skipped] == ['large_pooled_regression_lag_15']
+
+    chosen_models = {'all': False, 'ets': True, 'pooled_regression': False}
+    assert [job['name'] for job in cost_model.chosen_jobs(chosen_models, ['large_dataset'], jobs)] == ['large_ets']
+    predicted_hours = cost_model.warn_if_over_budget(
+        {'all': True}, ['small_dataset'], 0.0001, data_dir=experiment_files, cost_model=model,
+        script_path=experiment_files / 'fixed_horizon.R'
+    )
+    assert predicted_hours == pytest.approx(3.1 / 3600, rel=0.1)
+    assert 'WARNING' in capsys.readouterr().out
@@ -0,0 +1,83 @@
+'''
+This script contains tests for 'utils/error_calculator.py', the Python version of the error measures of 'error_calculator.R'.
+
+- `test_error_measures` compares the vectorized error measures with a direct calculation for each series, including missing values.
+- `test_mase_scale_fallback` checks that series too short for the seasonal scale use the lag 1 scale, and that infinite values are dropped.
+- `test_calculate_errors_files` checks that the summary file is read by 'tables_create.py' as the R files are.
+- `test_error_store` checks that the step errors saved by 'utils/error_store.py' are memory-mapped and consistent with the per-series measures.
+'''
+import numpy as np
+import pytest
+
+try:
+    import src.utils.error_calculator as error_calculator
+    import src.utils.error_store as error_store
+    from src.tables_create import transform_string_results_to_dict
+except:
+    import utils.error_calculator as error_calculator
+    import utils.error_store as error_store
+    from tables_create import transform_string_results_to_dict
+
+
+FORECASTS = np.array([[1.0, 2.0, 3.0], [10.0, 12.0, np.nan], [0.0, 0.0, 1.0]])
+TEST_SET = np.array([[1.5, 2.0, 2.0], [11.0, 10.0, 9.0], [0.0, 1.0, 1.0]])
+TRAINING_SET = [
+    np.array([1.0, 3.0, 2.0, 4.0, 3.0]),
+    np.array([8.0, np.nan, 9.0, 12.0, 10.0, 11.0]),
+    np.array([0.0, 1.0, 0.0, 2.0]),
+]
+
+
+def test_error_measures():
+    '''The vectorized measures match a calculation series by series'''
+    for k in range(len(FORECASTS)):
+        f, a = FORECASTS[k], TEST_SET[k]
+        observed = ~np.isnan(f - a)
+        f, a = f[observed], a[observed]
+        # 0 / 0 is missing and ignored, as with na.rm = TRUE
+        smape = np.mean([2 * abs(x - y) / (abs(x) + abs(y)) for x, y in zip(f, a) if abs(x) + abs(y) > 0])
+        msmape = np.mean(2 * np.abs(f - a) / np.maximum(0.6, np.abs(f) + np.abs(a) + 0.1))
+        tr = TRAINING_SET[k][~np.isnan(TRAINING_SET[k])]
+        mase = np.mean(np.abs(f - a)) / np.mean(np.abs(tr[2:] - tr[:-2]))
+        assert error_calculator.calculate_smape(FORECASTS, TEST_SET)[k] == pytest.approx(smape)
+        assert error_calculator.calculate_msmape(FORECASTS, TEST_SET)[k] == pytest.approx(msmape)
+        assert error_calculator.calculate_mase(FORECASTS, TEST_SET, TRAINING_SET, 2)[k] == pytest.approx(mase)
+        assert error_calculator.calculate_mae(FORECASTS, TEST_SET)[k] == pytest.approx(np.mean(np.abs(f - a)))
+        assert error_calculator.calculate_rmse(FORECASTS, TEST_SET)[k] == pytest.approx(np.sqrt(np.mean((f - a) ** 2)))
+
+
+def test_mase_scale_fallback():
+    '''Series shorter than the seasonality use the lag 1 scale, and series with a zero scale are dropped'''
+    training_set = [np.array([1.0, 2.0, 4.0]), np.array([5.0, 5.0, 5.0, 5.0, 5.0])]
+    forecasts, test_set = np.array([[3.0], [4.0]]), np.array([[5.0], [5.0]])
+    mase = error_calculator.calculate_mase(forecasts, test_set, training_set, [4, 12])
+    assert mase.tolist() == [pytest.approx(2 / 1.5)]
+
+
+def test_calculate_errors_files(tmp_path):
+    '''The files have the layout of the R files and the summary is parsed by tables_create'''
+    output_file_name = str(tmp_path / 'errors' / 'sample_deepar_lag_2')
+    errors = error_calculator.calculate_errors(FORECASTS, TEST_SET, TRAINING_SET, 2, output_file_name)
+    with open(output_file_name + '.txt') as f:
+        summary = transform_string_results_to_dict(f.readlines())
+    assert list(summary) == [
+        'Mean SMAPE', 'Median SMAPE', 'Mean mSMAPE', 'Median mSMAPE', 'Mean MASE',
+        'Median MASE', 'Mean MAE', 'Median MAE', 'Mean RMSE', 'Median RMSE'
+    ]
+    assert summary['Mean MAE'] == pytest.approx(np.mean(errors['mae']))
+    assert np.loadtxt(output_file_name + '_rmse.txt') == pytest.approx(errors['rmse'])
+
+
+def test_error_store(tmp_path):
+    '''The step errors are saved as float32 and their row means give back the per-series measures'''
+    step_errors = error_calculator.calculate_step_errors(FORECASTS, TEST_SET, TRAINING_SET, 2)
+    error_store.save_error_matrix(step_errors, 'sample_deepar_lag_2', tmp_path)
+    assert error_store.list_error_runs(tmp_path) == ['sample_deepar_lag_2']
+    mase = error_store.load_error_matrix('sample_deepar_lag_2', 'mase', slice(0, 2), tmp_path)
+    assert isinstance(mase, np.memmap) and mase.dtype == np.float32 and mase.shape == (2, 3)
+    assert error_store.load_series_errors('sample_deepar_lag_2', 'mase', matrices_dir=tmp_path) == pytest.approx(
+        error_calculator.calculate_mase(FORECASTS, TEST_SET, TRAINING_SET, 2), rel=1e-6
+    )
+    assert error_store.load_series_errors('sample_deepar_lag_2', 'squared_error', matrices_dir=tmp_path) == pytest.approx(
+        error_calculator.calculate_rmse(FORECASTS, TEST_SET), rel=1e-6
+    )
@@ -0,0 +1,65 @@
+'''
+This script contains tests for 'error_statistics.py', the confidence intervals and model comparisons added to Table 2.
+
+- `test_bootstrap_confidence_intervals` checks that the intervals contain the estimates and shrink with more series.
+- `test_pairwise_tests_and_ranks` checks the pairwise tests against a paired t statistic and the ranks of a clearly better model.
+- `test_generate_error_statistics_tables` builds the tables from per-series files in a temporary folder.
+'''
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    import src.error_statistics as error_statistics
+except:
+    import error_statistics
+
+
+def test_bootstrap_confidence_intervals():
+    '''The intervals contain the point estimates and are narrower with more series'''
+    rng = np.random.default_rng(1)
+    small = error_statistics.bootstrap_confidence_intervals(rng.gamma(2, size=100), n_resamples=500)
+    large = error_statistics.bootstrap_confidence_intervals(rng.gamma(2, size=10000), n_resamples=500)
+    for intervals in [small, large]:
+        assert intervals['mean_low'] < intervals['mean'] < intervals['mean_high']
+        assert intervals['median_low'] <= intervals['median'] <= intervals['median_high']
+    assert large['mean_high'] - large['mean_low'] < small['mean_high'] - small['mean_low']
+    assert np.isnan(error_statistics.bootstrap_confidence_intervals([np.inf, np.nan])['mean'])
+
+
+def test_pairwise_tests_and_ranks():
+    '''The test statistic is the paired t statistic and the better model has the lowest rank'''
+    rng = np.random.default_rng(2)
+    base = rng.gamma(2, size=200)
+    error_matrix = np.column_stack([base, base + 0.5 + rng.normal(scale=0.1, size=200), base + rng.normal(scale=1, size=200)])
+    pairwise = error_statistics.pairwise_tests(['A', 'B', 'C'], error_matrix)
+    differences = error_matrix[:, 0] - error_matrix[:, 1]
+    t_statistic = differences.mean() / (differences.std(ddof=1) / np.sqrt(len(differences)))
+    assert pairwise.loc[0, 'dm_statistic'] == pytest.approx(t_statistic)
+    assert pairwise.loc[0, 'dm_pvalue'] < 1e-6
+    average_ranks, friedman_pvalue, critical_difference = error_statistics.friedman_nemenyi(error_matrix)
+    assert average_ranks.sum() == pytest.approx(6)
+    assert average_ranks[1] > average_ranks[0] + critical_difference
+    assert friedman_pvalue < 1e-6
+
+
+def test_generate_error_statistics_tables(tmp_path):
+    '''The tables have one row per model and pair of models, from the per-series error files'''
+    errors_dir = tmp_path / 'errors'
+    errors_dir.mkdir()
+    rng = np.random.default_rng(3)
+    for model in ['ets', 'theta', 'ses']:
+        (errors_dir / f'm1_yearly_{model}.txt').write_text('Mean MASE: 1\n')
+        for measure in ['mase', 'smape']:
+            np.savetxt(errors_dir / f'm1_yearly_{model}_{measure}.txt', rng.gamma(2, size=50))
+    statistics, pairwise = error_statistics.generate_error_statistics_tables(
+        errors_dir=errors_dir, matrices_dir=tmp_path / 'matrices', n_resamples=200, output_dir=tmp_path / 'tables'
+    )
+    assert statistics.Model.tolist() == ['SES', 'Theta', 'ETS'] * 2
+    assert set(statistics.Measure) == {'mase', 'smape'}
+    # The R MASE files may drop series, so the MASE models are only compared on sMAPE
+    assert statistics.loc[lambda df: df.Measure == 'mase', 'average_rank'].isna().all()
+    assert statistics.loc[lambda df: df.Measure == 'smape', 'average_rank'].notna().all()
+    assert len(pairwise) == 3
+    saved = pd.read_csv(tmp_path / 'tables' / 'table2_statistics.csv')
+    assert list(saved.columns[:3]) == ['Dataset', 'Measure', 'Model']
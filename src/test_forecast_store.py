@@ -0,0 +1,44 @@
+'''
+This script contains tests for 'utils/forecast_store.py', the binary format of the forecasts.
+
+- `test_save_and_load_forecasts` checks the round trip of the forecasts, series names and metadata, memory-mapped or compressed.
+- `test_convert_text_forecasts` converts a text forecasts file, with a missing value, and checks the CSV export gives it back.
+'''
+import numpy as np
+import pytest
+
+try:
+    import src.utils.forecast_store as forecast_store
+except:
+    import utils.forecast_store as forecast_store
+
+
+def test_save_and_load_forecasts(tmp_path):
+    '''Forecasts are read back exactly, memory-mapped when uncompressed'''
+    forecasts = np.random.default_rng(0).normal(size=(5, 3))
+    forecast_store.save_forecasts(forecasts, 'sample_deepar_lag_2', ['T1', 'T2', 'T3', 'T4', 'T5'], {'lag': 2}, tmp_path)
+    loaded, series_names, metadata = forecast_store.load_forecasts('sample_deepar_lag_2', tmp_path)
+    assert isinstance(loaded, np.memmap)
+    assert np.array_equal(loaded, forecasts)
+    assert series_names == ['T1', 'T2', 'T3', 'T4', 'T5'] and metadata == {'lag': 2}
+    rows, row_names, _ = forecast_store.load_forecasts('sample_deepar_lag_2', tmp_path, series=slice(1, 3))
+    assert np.array_equal(rows, forecasts[1:3]) and row_names == ['T2', 'T3']
+
+    forecast_store.save_forecasts(forecasts, 'sample_deepar_lag_2', forecasts_dir=tmp_path, dtype=np.float32, compress=True)
+    loaded, series_names, _ = forecast_store.load_forecasts('sample_deepar_lag_2', tmp_path)
+    assert not (tmp_path / 'sample_deepar_lag_2.npy').exists()
+    assert loaded.dtype == np.float32 and loaded == pytest.approx(forecasts, rel=1e-6)
+    assert series_names == ['0', '1', '2', '3', '4']
+
+
+def test_convert_text_forecasts(tmp_path):
+    '''Text forecasts are converted with their missing values, and exported back as the same text'''
+    text = '1.5,2.25,3\n4,NA,6.125\n'
+    (tmp_path / 'sample_ets.txt').write_text(text)
+    assert forecast_store.convert_forecasts_dir(tmp_path) == ['sample_ets']
+    assert forecast_store.convert_forecasts_dir(tmp_path) == []
+    forecasts, _, metadata = forecast_store.load_forecasts('sample_ets', tmp_path)
+    assert np.isnan(forecasts[1, 1]) and forecasts[1, 2] == 6.125
+    assert metadata['converted_from'] == 'sample_ets.txt'
+    forecast_store.export_forecasts_csv(np.array([[1.5, 2.25, 3.0]]), tmp_path / 'export.txt')
+    assert (tmp_path / 'export.txt').read_text() == '1.5,2.25,3.0\n'
@@ -0,0 +1,78 @@
+'''
+This script contains tests for 'models/global_models.py', the pooled regression fitted from the normal equations,
+and for 'experiments/global_model_experiments.py', which writes its results in the format of the R experiments.
+
+- `test_pooled_regression` compares the chunked fit with a least-squares fit on the full embedded matrix built as in
+'create_input_matrix', and the batched recursive forecasts with a loop over the series and steps.
+- `test_get_global_model_forecasts` runs an experiment on a small .tsf file and checks the error files it writes.
+'''
+import numpy as np
+import pytest
+
+try:
+    import src.models.global_models as global_models
+    import src.experiments.global_model_experiments as global_model_experiments
+    from src.experiments.local_model_experiments import read_error_summary
+    from src.utils.lag_embedding import build_lag_embedding
+except:
+    import models.global_models as global_models
+    import experiments.global_model_experiments as global_model_experiments
+    from experiments.local_model_experiments import read_error_summary
+    from utils.lag_embedding import build_lag_embedding
+
+
+def embedded_matrix(series_list, lag):
+    '''The embedded matrix, final lags and means of 'create_input_matrix', with the lags from the oldest to the most recent'''
+    rows, last_values, means = [], [], []
+    for series in series_list:
+        mean = np.mean(series) or 1
+        normalized = series / mean
+        rows += [normalized[t:t + lag + 1] for t in range(len(series) - lag)]
+        last_values.append(normalized[-lag:])
+        means.append(mean)
+    return np.array(rows), np.array(last_values), np.array(means)
+
+
+def test_pooled_regression():
+    '''The chunked fit and the batched forecasts are the same as fitting the full matrix and forecasting each series'''
+    rng = np.random.default_rng(0)
+    series_list = [np.cumsum(rng.normal(1, 1, n)) + 20 for n in [30, 45, 12, 60]] + [np.zeros(10)]
+    lag, horizon = 4, 6
+    rows, last_values, means = embedded_matrix(series_list, lag)
+
+    store = build_lag_embedding(*global_models.build_series_buffer(series_list))
+    coefficients = global_models.fit_pooled_regression(store, lag, chunk_rows=7)
+    assert coefficients == pytest.approx(np.linalg.lstsq(rows[:, :lag], rows[:, lag], rcond=None)[0])
+
+    forecasts = global_models.get_global_forecasts(series_list, lag, horizon, chunk_rows=7)
+    for i, mean in enumerate(means):
+        window = list(last_values[i])
+        for _ in range(horizon):
+            window.append(np.dot(window[-lag:], coefficients))
+        assert forecasts[i] == pytest.approx(np.array(window[lag:]) * mean)
+
+    # As in R, a series with missing values has no mean, so all its windows are left out of the fit
+    with_missing = series_list[:4] + [np.array([1.0, np.nan, 3.0, 4.0, 5.0, 6.0, 7.0])]
+    store = build_lag_embedding(*global_models.build_series_buffer(with_missing))
+    xtx, xty, n_rows = global_models.accumulate_normal_equations(store, lag)
+    assert n_rows == len(rows) - 6
+    with pytest.raises(Exception):
+        global_models.get_global_forecasts(series_list, lag, horizon, method='catboost')
+
+
+def test_get_global_model_forecasts(tmp_path, monkeypatch):
+    '''The errors are written in the files read by Table 2'''
+    rng = np.random.default_rng(0)
+    lines = ['@relation sample', '@attribute series_name string', '@frequency monthly', '@horizon 6', '@data']
+    lines += [f'T{i}:' + ','.join(f'{v:.4f}' for v in np.cumsum(rng.normal(1, 1, 40 + 5 * i)) + 50) for i in range(4)]
+    (tmp_path / 'sample_dataset.tsf').write_text('\n'.join(lines) + '\n')
+    monkeypatch.setattr(global_model_experiments.config, 'DATA_DIR', tmp_path)
+    # Memory-map the training buffer even though it is small
+    monkeypatch.setattr(global_model_experiments.lag_embedding, 'MEMMAP_THRESHOLD_MB', 0)
+
+    errors = global_model_experiments.get_global_model_forecasts('sample', 3, 'sample_dataset.tsf', results_dir=tmp_path)
+    summary = read_error_summary(tmp_path / 'fixed_horizon_errors' / 'sample_pooled_regression_lag_3.txt')
+    assert summary['Mean MASE'] == pytest.approx(np.mean(errors['mase']))
+    assert (tmp_path / 'fixed_horizon_errors' / 'sample_pooled_regression_lag_3_smape.txt').read_text().count('\n') == 4
+    assert (tmp_path / 'fixed_horizon_execution_times' / 'sample_pooled_regression_lag_3.txt').exists()
+    assert len(list((tmp_path / 'lag_embedding_cache').iterdir())) == 1
@@ -0,0 +1,54 @@
+'''
+This script contains tests for the import time of the pipeline: the heavy dependencies are only imported by the functions
+that need them, so listing the tasks of 'dodo.py' and running the light tasks start quickly.
+
+- `test_dodo_import_time` imports 'dodo.py' in a new interpreter and checks that it loads none of HEAVY_MODULES. The
+import time itself depends on the load of the machine, so it is only checked against IMPORT_TIME_BUDGET_SECONDS when the
+environment variable CHECK_IMPORT_TIME is set.
+- `test_lazy_modules` checks the modules imported by the pipeline one by one.
+
+Each import runs in a new interpreter, since the modules of the tests are already loaded in the pytest process.
+'''
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+'''Dependencies that take most of the import time and are only needed inside some functions'''
+HEAVY_MODULES = ['pandas', 'numpy', 'scipy', 'requests', 'openpyxl', 'matplotlib', 'seaborn', 'arch', 'statsmodels', 'pytest']
+
+'''Import time of 'dodo.py' allowed, in seconds, checked only when CHECK_IMPORT_TIME is set'''
+IMPORT_TIME_BUDGET_SECONDS = 2.0
+
+
+def import_in_new_interpreter(module_name):
+    '''Imports a module as 'dodo.py' does, and returns its import time and the heavy modules it loaded'''
+    code = f'''
+import json, sys, time
+sys.path.insert(1, './src/')
+start = time.perf_counter()
+import {module_name}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))
+'''
+    output = subprocess.run([sys.executable, '-c', code], cwd=BASE_DIR, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def test_dodo_import_time():
+    '''Loading the tasks does not import the heavy dependencies'''
+    result = import_in_new_interpreter('dodo')
+    assert result['loaded'] == []
+    if os.environ.get('CHECK_IMPORT_TIME'):
+        assert result['seconds'] < IMPORT_TIME_BUDGET_SECONDS
+
+
+def test_lazy_modules():
+    '''The modules of the light tasks, and the analysis before its advanced statistics, import only what they use'''
+    for module_name in ['src.data_download', 'src.tables_create', 'src.tables_to_latex', 'src.website_update_results', 'src.warm_worker']:
+        assert import_in_new_interpreter(module_name)['loaded'] == []
+    loaded = import_in_new_interpreter('src.analysis_general')['loaded']
+    assert not set(loaded) & {'statsmodels', 'arch', 'matplotlib', 'seaborn', 'requests'}
@@ -0,0 +1,58 @@
+'''
+This script contains tests for 'utils/instrumentation.py', the stage-level run records.
+
+- `test_record_stage_accumulates` checks that a stage entered several times, directly or through 'record_iteration',
+accumulates its times and calls, and that a stage is recorded even when its block raises.
+- `test_run_records_report` saves records of two runs and checks the table of stages and the aggregated report.
+'''
+import json
+
+import pytest
+
+try:
+    import src.utils.instrumentation as instrumentation
+except:
+    import utils.instrumentation as instrumentation
+
+
+def test_record_stage_accumulates():
+    '''Repeated stages are merged into one entry, in order of first use'''
+    run_record = instrumentation.start_run_record('process_dataset', 'sample', dataset='sample')
+    with instrumentation.record_stage(run_record, 'load'):
+        sum(range(10000))
+    for _ in range(3):
+        with instrumentation.record_stage(run_record, 'statistics'):
+            pass
+    items = list(instrumentation.record_iteration(run_record, 'transform', iter([1, 2])))
+    with pytest.raises(ValueError):
+        with instrumentation.record_stage(run_record, 'write'):
+            raise ValueError
+    stages = {s['stage']: s for s in run_record['stages']}
+    assert items == [1, 2]
+    assert [s['stage'] for s in run_record['stages']] == ['load', 'statistics', 'transform', 'write']
+    assert stages['statistics']['calls'] == 3 and stages['transform']['calls'] == 3
+    assert stages['load']['wall_seconds'] > 0 and stages['load']['cpu_seconds'] >= 0
+    assert stages['write']['calls'] == 1
+
+
+def test_run_records_report(tmp_path):
+    '''Records are saved as JSON and aggregated per entry point and stage, or per metadata column'''
+    for method in ['deepar', 'nbeats']:
+        run_record = instrumentation.start_run_record('get_deep_nn_forecasts', f'sample_{method}_lag_2', method=method)
+        for stage in ['load', 'train']:
+            with instrumentation.record_stage(run_record, stage):
+                pass
+        path = instrumentation.save_run_record(run_record, tmp_path)
+        with open(path) as f:
+            saved = json.load(f)
+        assert saved['metadata'] == {'method': method}
+        assert saved['wall_seconds'] == pytest.approx(sum(s['wall_seconds'] for s in saved['stages']))
+
+    records = instrumentation.load_run_records(tmp_path)
+    assert len(records) == 4 and set(records.method) == {'deepar', 'nbeats'}
+    report = instrumentation.run_records_report(tmp_path)
+    assert set(report.stage) == {'load', 'train'} and (report.runs == 2).all()
+    assert report.wall_share.sum() == pytest.approx(1)
+    by_method = instrumentation.run_records_report(tmp_path, by=('method', 'stage'))
+    assert len(by_method) == 4 and (by_method.runs == 1).all()
+    assert instrumentation.run_records_report(tmp_path / 'missing').empty
@@ -0,0 +1,65 @@
+'''
+This script contains tests for 'utils/lag_embedding.py', which builds the lag-embedded data of the global models.
+
+- `test_lag_windows` checks that the windows of a lag are views of the normalized buffer, that they do not cross the
+boundaries between series, and that they match the embedding of each series in 'create_input_matrix'.
+- `test_memory_mapped_embedding` checks that a large buffer is written once to the cache and shared by later builds.
+'''
+import numpy as np
+import pytest
+
+try:
+    import src.utils.lag_embedding as lag_embedding
+    import src.utils.series_buffer as series_buffer
+except:
+    import utils.lag_embedding as lag_embedding
+    import utils.series_buffer as series_buffer
+
+
+SERIES = [np.arange(1.0, 7.0), np.array([0.0, 0.0, 0.0]), np.array([2.0, 4.0]), np.array([10.0, 20.0, 30.0, 40.0])]
+
+
+def test_lag_windows():
+    '''The windows of each lag are the embedding of each series, taken from a single normalized buffer'''
+    values, offsets = series_buffer.build_series_buffer(SERIES)
+    store = lag_embedding.build_lag_embedding(values, offsets)
+    assert store['means'].tolist() == [3.5, 1.0, 3.0, 25.0]
+    assert store['values'].tolist() == pytest.approx(np.concatenate([s / m for s, m in zip(SERIES, store['means'])]))
+
+    windows, rows = lag_embedding.lag_windows(store, 2)
+    assert np.shares_memory(windows, store['values'])
+    assert rows.tolist() == [0, 1, 2, 3, 6, 11, 12]
+    expected = np.concatenate([
+        lag_embedding.series_windows(store, 2, i) for i in range(len(SERIES))
+    ])
+    assert windows[rows].tolist() == expected.tolist()
+    assert windows[0].tolist() == pytest.approx([1 / 3.5, 2 / 3.5, 3 / 3.5])
+
+    chunks = list(lag_embedding.iter_lag_chunks(store, 2, chunk_rows=3))
+    assert [len(y) for _, y in chunks] == [3, 3, 1]
+    assert np.concatenate([X for X, _ in chunks]).tolist() == expected[:, :2].tolist()
+    assert np.concatenate([y for _, y in chunks]).tolist() == expected[:, 2].tolist()
+
+    assert np.allclose(lag_embedding.final_lags(store, 2)[[0, 3]], [[5 / 3.5, 6 / 3.5], [1.2, 1.6]])
+    with pytest.raises(Exception):
+        lag_embedding.final_lags(store, 3)
+    with pytest.raises(ValueError):
+        store['values'][0] = 0
+
+
+def test_memory_mapped_embedding(tmp_path):
+    '''A buffer above the threshold is memory-mapped from the cache and reused by the next builds'''
+    values, offsets = series_buffer.build_series_buffer(SERIES)
+    key = lag_embedding.lag_embedding_key('dataset_hash', forecast_horizon=2)
+    store = lag_embedding.build_lag_embedding(values, offsets, key=key, cache_dir=tmp_path, memmap_threshold_mb=0)
+    assert isinstance(store['values'], np.memmap) and not store['values'].flags.writeable
+    assert (tmp_path / key / 'values.npy').exists()
+    in_memory = lag_embedding.build_lag_embedding(values, offsets)
+    assert store['values'].tolist() == in_memory['values'].tolist()
+
+    # A second build does not write the buffer again
+    modified_time = (tmp_path / key / 'values.npy').stat().st_mtime_ns
+    store = lag_embedding.build_lag_embedding(values, offsets, key=key, cache_dir=tmp_path, memmap_threshold_mb=0)
+    assert (tmp_path / key / 'values.npy').stat().st_mtime_ns == modified_time
+    windows, rows = lag_embedding.lag_windows(store, 3)
+    assert windows[rows].tolist() == in_memory['values'][np.array([[0, 1, 2, 3], [1, 2, 3, 4], [2, 3, 4, 5], [11, 12, 13, 14]])].tolist()
@@ -0,0 +1,68 @@
+'''
+This script contains tests for 'models/local_univariate_models.py', the batched SES and Theta engine,
+and for 'experiments/local_model_experiments.py', which writes its results in the format of the R experiments.
+
+- `test_ses_forecasts` compares the batched SES of series of different lengths, fitted in several blocks, with the
+ETS(A,N,N) model of statsmodels fitted on each series.
+- `test_theta_forecasts` compares the batched Theta method with the Theta model of statsmodels, on a seasonal and a
+non-seasonal series, and checks the seasonal naive forecasts of series with missing values.
+- `test_get_local_model_forecasts` runs an experiment on a small .tsf file and checks the error files it writes.
+'''
+import numpy as np
+import pytest
+from statsmodels.tsa.exponential_smoothing.ets import ETSModel
+from statsmodels.tsa.forecasting.theta import ThetaModel
+
+try:
+    import src.models.local_univariate_models as local_univariate_models
+    import src.experiments.local_model_experiments as local_model_experiments
+except:
+    import models.local_univariate_models as local_univariate_models
+    import experiments.local_model_experiments as local_model_experiments
+
+
+def seasonal_series(length, rng):
+    '''A monthly series with a trend and a multiplicative seasonality'''
+    t = np.arange(length)
+    return (100 + 0.5 * t) * (1 + 0.3 * np.sin(2 * np.pi * t / 12)) * np.exp(rng.normal(0, 0.02, length))
+
+
+def test_ses_forecasts():
+    '''The smoothing constant and initial level minimize the squared errors as in ETS(A,N,N)'''
+    rng = np.random.default_rng(1)
+    series_list = [np.cumsum(rng.normal(size=n)) + 50 for n in [30, 45, 80, 12, 60]]
+    forecasts = local_univariate_models.get_local_forecasts(series_list, 4, 'ses', block_size=2)
+    for series, series_forecasts in zip(series_list, forecasts):
+        reference = ETSModel(series, error='add', initialization_method='estimated').fit(disp=False)
+        assert series_forecasts == pytest.approx(reference.forecast(4), rel=1e-4)
+    with pytest.raises(Exception):
+        local_univariate_models.get_local_forecasts(series_list, 4, 'ets')
+
+
+def test_theta_forecasts():
+    '''Seasonal series are adjusted and reseasonalized as in 'thetaf', and missing values fall back to seasonal naive'''
+    rng = np.random.default_rng(1)
+    seasonal = seasonal_series(96, rng)
+    trend = 10 + 0.2 * np.arange(50) + rng.normal(size=50)
+    series_list = [seasonal, seasonal[5:], trend, np.array([1.0, np.nan, 3.0, 4.0])]
+    forecasts = local_univariate_models.get_local_forecasts(series_list, 12, 'theta', 12)
+    for series, series_forecasts in zip(series_list[:3], forecasts):
+        reference = ThetaModel(series, period=12).fit().forecast(12)
+        assert series_forecasts == pytest.approx(reference, rel=1e-3)
+    assert forecasts[3].tolist() == [4.0] * 12
+
+
+def test_get_local_model_forecasts(tmp_path, monkeypatch):
+    '''The errors are written in the files read by Table 2'''
+    rng = np.random.default_rng(0)
+    lines = ['@relation sample', '@attribute series_name string', '@frequency monthly', '@horizon 6', '@data']
+    lines += [f'T{i}:' + ','.join(f'{v:.4f}' for v in seasonal_series(60 + 5 * i, rng)) for i in range(4)]
+    (tmp_path / 'sample_dataset.tsf').write_text('\n'.join(lines) + '\n')
+    monkeypatch.setattr(local_model_experiments.config, 'DATA_DIR', tmp_path)
+
+    errors = local_model_experiments.get_local_model_forecasts('sample', 'sample_dataset.tsf', 'theta', results_dir=tmp_path)
+    summary = local_model_experiments.read_error_summary(tmp_path / 'fixed_horizon_errors' / 'sample_theta.txt')
+    assert summary['Mean MASE'] == pytest.approx(np.mean(errors['mase']))
+    assert (tmp_path / 'fixed_horizon_errors' / 'sample_theta_smape.txt').read_text().count('\n') == 4
+    assert (tmp_path / 'fixed_horizon_forecasts' / 'sample_theta.npy').exists()
+    assert (tmp_path / 'fixed_horizon_execution_times' / 'sample_theta.txt').exists()
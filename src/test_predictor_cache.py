@@ -0,0 +1,52 @@
+'''
+This script contains tests for 'utils/predictor_cache.py', the cache of trained GluonTS predictors.
+
+- `test_predictor_cache_key` checks that the key changes with the dataset content and the hyperparameters only.
+- `test_save_and_evict_predictor_cache` saves entries with a stand-in predictor and checks the eviction by age and size.
+
+The predictors are replaced by an object with a 'serialize' method, so the tests do not need GluonTS.
+'''
+import os
+import time
+
+try:
+    import src.utils.predictor_cache as predictor_cache
+except:
+    import utils.predictor_cache as predictor_cache
+
+
+class StandInPredictor:
+    '''Writes a file of a given size, as 'Predictor.serialize' writes the model files'''
+    def __init__(self, size):
+        self.size = size
+
+    def serialize(self, path):
+        with open(os.path.join(path, 'model.bin'), 'wb') as f:
+            f.write(b'0' * self.size)
+
+
+def test_predictor_cache_key(tmp_path):
+    '''The key depends on the content of the dataset and on every hyperparameter'''
+    dataset_a, dataset_b = tmp_path / 'a.tsf', tmp_path / 'b.tsf'
+    dataset_a.write_text('@data\nT1:1,2,3\n')
+    dataset_b.write_text('@data\nT1:1,2,4\n')
+    hyperparameters = {'freq': '1M', 'context_length': 15, 'prediction_length': 12}
+    key = predictor_cache.predictor_cache_key(predictor_cache.file_sha256(dataset_a), 'deepar', 15, 12, hyperparameters)
+    assert key.startswith('deepar_lag_15_horizon_12_')
+    assert key == predictor_cache.predictor_cache_key(predictor_cache.file_sha256(dataset_a), 'deepar', 15, 12, dict(hyperparameters))
+    assert key != predictor_cache.predictor_cache_key(predictor_cache.file_sha256(dataset_b), 'deepar', 15, 12, hyperparameters)
+    assert key != predictor_cache.predictor_cache_key(
+        predictor_cache.file_sha256(dataset_a), 'deepar', 15, 12, {**hyperparameters, 'freq': '1W'}
+    )
+
+
+def test_save_and_evict_predictor_cache(tmp_path):
+    '''Old entries are removed first, then the least recently used ones until the cache fits its size'''
+    for name in ['old', 'first', 'second']:
+        predictor_cache.save_predictor(StandInPredictor(2 ** 19), name, {'method': 'deepar'}, tmp_path)
+    now = time.time()
+    os.utime(tmp_path / 'old' / predictor_cache.METADATA_FILE, (now, now - 40 * 24 * 3600))
+    os.utime(tmp_path / 'first' / predictor_cache.METADATA_FILE, (now, now - 60))
+    assert predictor_cache.evict_predictor_cache(tmp_path, max_age_days=30, max_size_mb=10) == ['old']
+    assert predictor_cache.evict_predictor_cache(tmp_path, max_age_days=30, max_size_mb=0.75) == ['first']
+    assert sorted(os.listdir(tmp_path)) == ['second']
@@ -0,0 +1,44 @@
+'''
+This script contains tests for 'utils/quantile_forecasts.py', the streamed quantile predictions of the deep learning experiments.
+
+- `test_predict_quantiles` checks that streaming in batches gives the same medians as keeping all the forecasts.
+
+The predictor is replaced by a stand-in yielding objects with 'samples', as the GluonTS sample forecasts, so the test does not need GluonTS.
+'''
+import numpy as np
+import pytest
+
+try:
+    import src.utils.quantile_forecasts as quantile_forecasts
+except:
+    import utils.quantile_forecasts as quantile_forecasts
+
+
+class StandInForecast:
+    def __init__(self, samples):
+        self.samples = samples
+
+
+class StandInPredictor:
+    '''Draws sample paths around the last value of each target'''
+    def __init__(self, prediction_length):
+        self.prediction_length = prediction_length
+
+    def predict(self, dataset, num_samples):
+        rng = np.random.default_rng(0)
+        for entry in dataset:
+            yield StandInForecast(entry['target'][-1] + rng.normal(size=(num_samples, self.prediction_length)))
+
+
+def test_predict_quantiles():
+    '''Batches of any size give the medians of the sample paths of every series'''
+    dataset = [{'target': np.arange(10.0) * i} for i in range(7)]
+    predictor = StandInPredictor(prediction_length=3)
+    expected = np.stack([np.median(f.samples, axis=0) for f in predictor.predict(dataset, num_samples=50)])
+    for batch_size in [1, 3, 100]:
+        forecasts = quantile_forecasts.predict_quantiles(
+            predictor, dataset, 3, quantiles=[0.1, 0.5], num_samples=50, batch_size=batch_size
+        )
+        assert forecasts.shape == (2, 7, 3)
+        assert forecasts[1] == pytest.approx(expected)
+        assert (forecasts[0] <= forecasts[1]).all()
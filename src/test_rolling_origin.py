@@ -0,0 +1,64 @@
+'''
+This script contains tests for 'experiments/rolling_origin.py', the rolling origin evaluation in Python.
+
+- `test_origin_positions` checks the training splits of 'rolling_origin.R' and the positions of the origins in the buffer.
+- `test_get_rolling_origin_forecasts` compares the batched evaluation with forecasting each origin separately, and the
+online errors with 'calculate_errors' on the matrices of forecasts and actual values.
+'''
+import numpy as np
+import pytest
+
+try:
+    import src.experiments.rolling_origin as rolling_origin
+    from src.experiments.local_model_experiments import read_error_summary
+    from src.models.local_univariate_models import get_local_forecasts
+    from src.utils import error_calculator, series_buffer
+except:
+    import experiments.rolling_origin as rolling_origin
+    from experiments.local_model_experiments import read_error_summary
+    from models.local_univariate_models import get_local_forecasts
+    from utils import error_calculator, series_buffer
+
+
+def test_origin_positions():
+    '''The origins are the positions of the values after the training part of each series'''
+    offsets = np.array([0, 10, 12, 13, 18])
+    splits = rolling_origin.rolling_origin_splits(offsets)
+    assert splits.tolist() == [8, 1, 1, 4]
+    series_index, positions = rolling_origin.origin_positions(offsets, splits)
+    assert series_index.tolist() == [0, 1, 3, 0]
+    assert positions.tolist() == [8, 11, 17, 9]
+    assert rolling_origin.rolling_origin_splits(np.array([0, 100]), max_origins=5).tolist() == [95]
+
+
+def test_get_rolling_origin_forecasts(tmp_path, monkeypatch):
+    '''The batched origins give the same forecasts and errors as each origin forecast separately'''
+    rng = np.random.default_rng(0)
+    series_list = [np.cumsum(rng.normal(1, 1, n)) + 30 for n in [40, 52, 45]]
+    lines = ['@relation sample', '@attribute series_name string', '@frequency quarterly', '@data']
+    lines += [f'T{i}:' + ','.join(f'{v:.4f}' for v in series) for i, series in enumerate(series_list)]
+    (tmp_path / 'sample_dataset.tsf').write_text('\n'.join(lines) + '\n')
+    monkeypatch.setattr(rolling_origin.config, 'DATA_DIR', tmp_path)
+    series_list = [np.round(series, 4) for series in series_list]
+
+    errors = rolling_origin.get_rolling_origin_forecasts(
+        'sample', 'theta', 'sample_dataset.tsf', results_dir=tmp_path, max_origins=6, batch_size=4
+    )
+    forecast_lines = (tmp_path / 'rolling_origin_forecasts' / 'sample_theta.txt').read_text().splitlines()
+    forecasts = np.array([[float(v) for v in line.split(',')[1:]] for line in forecast_lines])
+    expected = np.array([
+        [get_local_forecasts([series[:t]], 1, 'theta', 4)[0, 0] for t in range(len(series) - 6, len(series))]
+        for series in series_list
+    ])
+    assert forecasts == pytest.approx(expected)
+    assert [line.split(',')[0] for line in forecast_lines] == ['T0', 'T1', 'T2']
+
+    actuals = np.array([series[-6:] for series in series_list])
+    reference = error_calculator.calculate_errors(
+        forecasts, actuals, [series[:-6] for series in series_list], 4, str(tmp_path / 'reference')
+    )
+    for measure, values in reference.items():
+        assert errors[measure] == pytest.approx(values)
+    summary = read_error_summary(tmp_path / 'rolling_origin_errors' / 'sample_theta.txt')
+    assert summary['Mean MASE'] == pytest.approx(np.mean(reference['mase']))
+    assert (tmp_path / 'rolling_origin_execution_times' / 'sample_theta.txt').exists()
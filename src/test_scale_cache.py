@@ -0,0 +1,58 @@
+'''
+This script contains tests for 'utils/scale_cache.py', the error scales shared by all the models evaluated on a dataset.
+
+- `test_error_scales` checks that the errors calculated with the precomputed scales are the same as without them.
+- `test_scale_cache` checks that the scales are saved once per dataset and split, and reused by the next evaluations.
+'''
+import numpy as np
+import pytest
+
+try:
+    import src.utils.scale_cache as scale_cache
+    import src.utils.error_calculator as error_calculator
+except:
+    import utils.scale_cache as scale_cache
+    import utils.error_calculator as error_calculator
+
+
+FORECASTS = np.array([[1.0, 2.0, 3.0], [10.0, 12.0, np.nan], [0.0, 0.0, 1.0], [3.0, 4.0, 5.0]])
+TEST_SET = np.array([[1.5, 2.0, 2.0], [11.0, 10.0, 9.0], [0.0, 1.0, 1.0], [5.0, 5.0, 5.0]])
+TRAINING_SET = [
+    np.array([1.0, 3.0, 2.0, 4.0, 3.0]),
+    np.array([8.0, np.nan, 9.0, 12.0, 10.0, 11.0]),
+    np.array([0.0, 1.0]),
+    np.array([5.0, 5.0, 5.0, 6.0]),
+]
+
+
+def test_error_scales(tmp_path):
+    '''The precomputed scales give the same errors, including the lag 1 fallback of the MASE'''
+    error_scales = error_calculator.calculate_error_scales(TRAINING_SET, TEST_SET, 2)
+    assert np.isnan(error_scales['seasonal_scales'][2]) and error_scales['seasonal_scales'][3] == 0.5
+    assert error_scales['msmape_denominators'] == pytest.approx(np.abs(TEST_SET) + 0.1)
+
+    errors = error_calculator.calculate_errors(FORECASTS, TEST_SET, TRAINING_SET, 2, str(tmp_path / 'without'))
+    cached_errors = error_calculator.calculate_errors(FORECASTS, TEST_SET, TRAINING_SET, 2, str(tmp_path / 'with'), error_scales)
+    for measure in errors:
+        assert cached_errors[measure] == pytest.approx(errors[measure], nan_ok=True)
+    assert (tmp_path / 'with.txt').read_text() == (tmp_path / 'without.txt').read_text()
+    step_errors = error_calculator.calculate_step_errors(FORECASTS, TEST_SET, TRAINING_SET, 2, error_scales)
+    np.testing.assert_array_equal(step_errors, error_calculator.calculate_step_errors(FORECASTS, TEST_SET, TRAINING_SET, 2))
+
+
+def test_scale_cache(tmp_path, monkeypatch):
+    '''The scales are calculated on the first evaluation of a dataset and loaded by the next ones'''
+    key = scale_cache.scale_cache_key('dataset_hash', [24, 168], forecast_horizon=3)
+    assert key == scale_cache.scale_cache_key('dataset_hash', 24, forecast_horizon=3)
+    assert key != scale_cache.scale_cache_key('dataset_hash', 24, forecast_horizon=4)
+
+    error_scales = scale_cache.get_error_scales(TRAINING_SET, TEST_SET, 2, key, tmp_path)
+    assert [path.name for path in tmp_path.iterdir()] == [f'{key}.npz']
+
+    def fail(*args):
+        raise AssertionError('The scales should be loaded from the cache')
+    monkeypatch.setattr(scale_cache, 'calculate_error_scales', fail)
+    cached_scales = scale_cache.get_error_scales(TRAINING_SET, TEST_SET, 2, key, tmp_path)
+    assert sorted(cached_scales) == sorted(error_scales)
+    for name, scales in error_scales.items():
+        np.testing.assert_array_equal(cached_scales[name], scales)
@@ -0,0 +1,59 @@
+'''
+This script contains tests for 'utils/series_buffer.py', which builds the data of the deep learning experiments.
+
+- `test_split_series_views` checks that the train and test series are the same as slicing each series, and that they are views of the buffer.
+- `test_split_series_buffer` checks the train buffer and the test matrix used by the global models.
+- `test_build_gluonts_entries` checks the float32 targets and the start periods of the GluonTS entries.
+'''
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    import src.utils.series_buffer as series_buffer
+except:
+    import utils.series_buffer as series_buffer
+
+
+SERIES = [
+    pd.Series([1.0, 2.0, 3.0, 4.0, 5.0]).array,
+    pd.Series([10.0, 'NaN', 30.0, 40.0]).array,
+]
+
+
+def test_split_series_views():
+    '''Splitting the buffer gives the same series as slicing each row, without copying the values'''
+    values, offsets = series_buffer.build_series_buffer(SERIES)
+    assert offsets.tolist() == [0, 5, 9]
+    train_series, test_series, full_series = series_buffer.split_series_views(values, offsets, forecast_horizon=2)
+    assert train_series[0].tolist() == [1.0, 2.0, 3.0]
+    assert test_series[0].tolist() == [4.0, 5.0]
+    assert np.isnan(train_series[1][1]) and test_series[1].tolist() == [30.0, 40.0]
+    assert len(full_series[1]) == 4
+    assert all(np.shares_memory(series, values) for series in train_series + test_series + full_series)
+    with pytest.raises(Exception):
+        series_buffer.split_series_views(values, offsets, forecast_horizon=5)
+
+
+def test_split_series_buffer():
+    '''The train parts are copied into their own buffer, and the test parts into a matrix'''
+    values, offsets = series_buffer.build_series_buffer(SERIES)
+    train_values, train_offsets, test_matrix = series_buffer.split_series_buffer(values, offsets, forecast_horizon=2)
+    assert train_offsets.tolist() == [0, 3, 5]
+    assert train_values[:4].tolist() == [1.0, 2.0, 3.0, 10.0] and np.isnan(train_values[4])
+    assert test_matrix.tolist() == [[4.0, 5.0], [30.0, 40.0]]
+    with pytest.raises(Exception):
+        series_buffer.split_series_buffer(values, offsets, forecast_horizon=5)
+
+
+def test_build_gluonts_entries():
+    '''The entries have float32 targets sharing one buffer and the start periods of the series'''
+    values, offsets = series_buffer.build_series_buffer(SERIES)
+    starts = series_buffer.bulk_start_periods([datetime(1990, 1, 1), datetime(2000, 6, 1)], '1M')
+    train_entries, test_entries = series_buffer.build_gluonts_entries(values, offsets, starts, forecast_horizon=2)
+    assert train_entries[0]['target'].dtype == np.float32
+    assert train_entries[0]['target'].base is test_entries[1]['target'].base
+    assert len(train_entries[1]['target']) == 2 and len(test_entries[1]['target']) == 4
+    assert test_entries[1]['start'] == pd.Period('2000-06', freq='M')
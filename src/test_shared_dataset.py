@@ -0,0 +1,67 @@
+'''
+This script contains tests for 'utils/shared_dataset.py', the shared memory handoff of datasets to worker processes.
+
+- `test_publish_and_attach` checks that attached arrays are read-only views of the shared memory with the published
+values and metadata, and that the reference counts close and unlink the blocks.
+- `test_attach_in_workers` sends only the handle to spawned workers, which read the series from the shared memory,
+and checks the blocks outlive the workers until the publisher removes them.
+'''
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    import src.utils.shared_dataset as shared_dataset
+except:
+    import utils.shared_dataset as shared_dataset
+
+
+def series_sums(handle):
+    '''Task of the workers: the sum of each series of the shared dataset'''
+    with shared_dataset.attached_dataset(handle) as dataset:
+        values, offsets = dataset['values'], dataset['offsets']
+        sums = [float(values[start:end].sum()) for start, end in zip(offsets[:-1], offsets[1:])]
+        return sums, dataset['metadata']['columns']['series_name']
+
+
+def test_publish_and_attach():
+    '''Attached arrays share the published memory, and the last reference removes the blocks'''
+    dataset = pd.DataFrame({
+        'series_name': ['T1', 'T2', 'T3'],
+        'series_value': [[1.0, 2.0, 3.0], [4.0], [5.0, np.nan]],
+    })
+    handle = shared_dataset.publish_dataframe(dataset, frequency='monthly')
+    shared_dataset.retain_dataset(handle)
+
+    attached = shared_dataset.attach_dataset(handle)
+    assert shared_dataset.attach_dataset(handle) is attached
+    assert np.array_equal(attached['values'], [1, 2, 3, 4, 5, np.nan], equal_nan=True)
+    assert attached['offsets'].tolist() == [0, 3, 4, 6]
+    assert attached['metadata'] == {'columns': {'series_name': ['T1', 'T2', 'T3']}, 'frequency': 'monthly'}
+    assert not attached['values'].flags.writeable and not attached['values'].flags.owndata
+    assert shared_dataset.release_dataset(handle) is False
+    assert shared_dataset.release_dataset(handle) is True
+    with pytest.raises(Exception):
+        shared_dataset.release_dataset(handle)
+
+    assert shared_dataset.unpublish_dataset(handle) is False
+    assert shared_dataset.unpublish_dataset(handle) is True
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle['blocks']['values'])
+
+
+def test_attach_in_workers():
+    '''Workers attach by name, and detaching does not remove the blocks of the publisher'''
+    values = np.arange(10, dtype=float)
+    offsets = np.array([0, 4, 10])
+    with shared_dataset.shared_dataset(values, offsets, {'columns': {'series_name': ['A', 'B']}}) as handle:
+        with ProcessPoolExecutor(2, mp_context=get_context('spawn')) as executor:
+            results = list(executor.map(series_sums, [handle] * 4))
+        assert results == [([6.0, 39.0], ['A', 'B'])] * 4
+        # The blocks survive the exit of the workers
+        assert series_sums(handle) == ([6.0, 39.0], ['A', 'B'])
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle['blocks']['offsets'])
@@ -0,0 +1,90 @@
+'''
+This script contains tests for the mergeable statistics of 'streaming_statistics.py'.
+
+- `test_moments_match_pandas` checks that moments accumulated block by block and merged across states give the same
+mean, std and skew as pandas on the whole series.
+- `test_sketch_quantiles_within_documented_error` checks that the quantiles of merged sketches are within the
+documented rank error.
+- `test_iter_tsf_value_blocks` checks that reading a .tsf file in small blocks gives back every value of every series.
+- `test_iter_tsf_value_blocks_many_short_series` checks that a block holding many short series is read in linear time,
+as fast as the same file read in small blocks.
+'''
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    import src.streaming_statistics as streaming_statistics
+except:
+    import streaming_statistics
+
+
+def test_moments_match_pandas():
+    '''Block updates and merges give the pandas mean, std and skew'''
+    values = np.random.default_rng(0).lognormal(size=100_001)
+    values[::97] = np.nan
+    moments_a, moments_b = streaming_statistics.init_moments(), streaming_statistics.init_moments()
+    for i, block in enumerate(np.array_split(values, 23)):
+        if i % 2:
+            moments_a = streaming_statistics.update_moments(moments_a, block)
+        else:
+            moments_b = streaming_statistics.update_moments(moments_b, block)
+    statistics = streaming_statistics.moments_to_statistics(streaming_statistics.merge_moments(moments_a, moments_b))
+    series = pd.Series(values)
+    assert statistics['mean'] == pytest.approx(series.mean(), rel=1e-10)
+    assert statistics['std'] == pytest.approx(series.std(), rel=1e-10)
+    assert statistics['skew'] == pytest.approx(series.skew(), rel=1e-8)
+
+
+def test_sketch_quantiles_within_documented_error():
+    '''Quantiles of merged sketches are within 1.5% of their exact rank'''
+    values = np.random.default_rng(1).standard_t(3, size=500_000)
+    sketches = [streaming_statistics.init_sketch() for _ in range(3)]
+    for i, block in enumerate(np.array_split(values, 60)):
+        streaming_statistics.update_sketch(sketches[i % 3], block)
+    sketch = streaming_statistics.merge_sketches(streaming_statistics.merge_sketches(sketches[0], sketches[1]), sketches[2])
+    assert sketch['n'] == len(values)
+    assert sum(len(level) for level in sketch['levels']) <= 3 * streaming_statistics.SKETCH_K
+    quantiles = [.25, .5, .75]
+    for quantile, estimate in zip(quantiles, streaming_statistics.sketch_quantiles(sketch, quantiles)):
+        assert abs((values < estimate).mean() - quantile) < 0.015
+
+
+def test_iter_tsf_value_blocks(tmp_path):
+    '''Small blocks split values and attributes across reads without losing any value'''
+    rng = np.random.default_rng(2)
+    series = [np.round(rng.normal(size=length) * 100, 3) for length in [3, 250, 40]]
+    series[1][5] = np.nan
+    lines = ['@relation sample', '@attribute series_name string', '@attribute start_timestamp date', '@frequency daily', '@data']
+    for i, values in enumerate(series):
+        lines.append(f'S{i}:2000-01-01 00-00-00:' + ','.join('?' if np.isnan(v) else str(v) for v in values))
+    tsf_path = tmp_path / 'sample.tsf'
+    tsf_path.write_text('\n'.join(lines) + '\n')
+    for block_chars in [5, 64, 10 ** 6]:
+        read_values = {}
+        for attributes, values, series_end in streaming_statistics.iter_tsf_value_blocks(tsf_path, block_chars):
+            read_values.setdefault(attributes['series_name'], []).append(values)
+        assert list(read_values) == ['S0', 'S1', 'S2']
+        for i, values in enumerate(series):
+            np.testing.assert_array_equal(np.concatenate(read_values[f'S{i}']), values)
+
+
+def test_iter_tsf_value_blocks_many_short_series(tmp_path):
+    '''A single block of 50,000 short series is not slower to read than small blocks of a few series each'''
+    n_series = 50_000
+    lines = ['@relation sample', '@attribute series_name string', '@attribute start_timestamp date', '@frequency daily', '@data']
+    lines += [f'S{i}:2000-01-01 00-00-00:1,2,3,4,{i}' for i in range(n_series)]
+    tsf_path = tmp_path / 'short.tsf'
+    tsf_path.write_text('\n'.join(lines) + '\n')
+    durations = {}
+    for block_chars in [4096, streaming_statistics.BLOCK_CHARS]:
+        start_time = time.perf_counter()
+        blocks = list(streaming_statistics.iter_tsf_value_blocks(tsf_path, block_chars))
+        durations[block_chars] = time.perf_counter() - start_time
+        assert sum(series_end for _, _, series_end in blocks) == n_series
+        assert blocks[-1][0]['series_name'] == f'S{n_series - 1}'
+        assert sum(len(values) for _, values, _ in blocks) == 5 * n_series
+    # Copying the rest of the block for each series makes the single block several times slower
+    assert durations[streaming_statistics.BLOCK_CHARS] < 3 * durations[4096]
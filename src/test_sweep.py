@@ -0,0 +1,68 @@
+'''
+This script contains tests for 'experiments/sweep.py', the process pool running the deep learning experiments.
+
+- `test_build_sweep_jobs` checks the grid of jobs, their names and their ordering from the largest dataset.
+- `test_run_sweep` runs jobs that write marker files on a pool of spawned workers, and checks that completed jobs are
+skipped, failed jobs retried up to the limit, the threads of the workers capped and the log saved.
+
+The jobs of the tests do not train models, so the tests do not need GluonTS.
+'''
+import json
+import os
+from pathlib import Path
+
+try:
+    import src.experiments.sweep as sweep
+except:
+    import experiments.sweep as sweep
+
+
+def write_marker_job(job):
+    '''Job of the tests: fails for the datasets named 'failing', or for the first attempt of 'flaky' ones'''
+    output_dir = Path(job['output_dir'])
+    attempt_path = output_dir / f"{job['name']}.attempts"
+    attempts = int(attempt_path.read_text()) + 1 if attempt_path.exists() else 1
+    attempt_path.write_text(str(attempts))
+    if job['dataset_name'] == 'failing' or (job['dataset_name'] == 'flaky' and attempts == 1):
+        raise ValueError(f"{job['name']} failed")
+    (output_dir / f"{job['name']}.done").write_text(os.environ['OMP_NUM_THREADS'])
+    return job['name']
+
+
+def marker_exists(job):
+    return (Path(job['output_dir']) / f"{job['name']}.done").exists()
+
+
+def test_build_sweep_jobs(tmp_path):
+    '''One job per dataset, method and lag, largest datasets first'''
+    (tmp_path / 'm1_yearly_dataset.tsf').write_text('x' * 10)
+    (tmp_path / 'm1_monthly_dataset.tsf').write_text('x' * 100)
+    jobs = sweep.build_sweep_jobs(['m1_yearly', 'm1_monthly'], ['deepar', 'nbeats'], data_dir=tmp_path)
+    assert len(jobs) == 4
+    assert {job['name'] for job in jobs} == {
+        'm1_yearly_deepar_lag_2', 'm1_yearly_nbeats_lag_2', 'm1_monthly_deepar_lag_15', 'm1_monthly_nbeats_lag_15'
+    }
+    assert [job['dataset_name'] for job in sweep.order_jobs(jobs)] == ['m1_monthly', 'm1_monthly', 'm1_yearly', 'm1_yearly']
+    assert len(sweep.build_sweep_jobs(['m1_yearly'], ['deepar'], lags=[2, 3, 4], data_dir=tmp_path)) == 3
+
+
+def test_run_sweep(tmp_path):
+    '''Completed jobs are skipped, failures retried, and each job runs with the thread cap'''
+    jobs = [
+        {'name': name, 'dataset_name': name, 'size_bytes': size, 'output_dir': str(tmp_path)}
+        for name, size in [('done', 1), ('ok', 2), ('flaky', 3), ('failing', 4)]
+    ]
+    (tmp_path / 'done.done').write_text('')
+    job_statuses = sweep.run_sweep(
+        jobs, write_marker_job, max_workers=2, threads_per_job=3, max_retries=1,
+        completed_function=marker_exists, log_dir=tmp_path / 'logs'
+    )
+    assert job_statuses['done'] == {'status': 'skipped', 'attempts': 0}
+    assert job_statuses['ok']['status'] == 'completed' and job_statuses['ok']['attempts'] == 1
+    assert job_statuses['flaky']['status'] == 'completed' and job_statuses['flaky']['attempts'] == 2
+    assert job_statuses['failing']['status'] == 'failed' and job_statuses['failing']['attempts'] == 2
+    assert 'failing failed' in job_statuses['failing']['error']
+    assert (tmp_path / 'failing.attempts').read_text() == '2'
+    assert (tmp_path / 'ok.done').read_text() == '3'
+    log_files = list((tmp_path / 'logs').iterdir())
+    assert len(log_files) == 1 and json.loads(log_files[0].read_text()) == job_statuses
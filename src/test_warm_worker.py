@@ -0,0 +1,144 @@
+'''
+This script contains tests for 'warm_worker.py', the optional worker keeping the parsed datasets between the tasks.
+
+- `test_dataset_cache` checks that each .tsf file is parsed once, parsed again when it changes, that the least
+recently used datasets are evicted, and that changing the series of a loaded dataset does not change the cached one.
+- `test_run_in_worker` submits functions to a worker running on a temporary socket, and checks the fallback to the
+calling process when no worker is running.
+- `test_reload_changed_module` edits a module run by the worker between two calls and checks that the new code runs.
+- `test_worker_access` checks that the socket and the key of the worker are private to the user, and that a client with
+a wrong key is rejected.
+'''
+import os
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import numpy as np
+import pandas as pd
+import pytest
+
+try:
+    import src.warm_worker as warm_worker
+except:
+    import warm_worker
+
+
+def test_dataset_cache(tmp_path):
+    '''A file is parsed on its first read and after it changes, and the cache stays within its memory'''
+    calls = []
+
+    def loader(path, replace_missing_vals_with='NaN'):
+        calls.append(str(path))
+        return pd.DataFrame({'series_value': [float(len(calls))] * 1000}), 'yearly', 6
+
+    paths = [tmp_path / f'{name}.tsf' for name in ['a', 'b', 'c']]
+    for path in paths:
+        path.write_text('@data\n')
+    dataset_cache = warm_worker.start_dataset_cache(memory_mb=20000 / 2 ** 20)
+    cached_loader = warm_worker.cached_tsf_loader(dataset_cache, loader)
+
+    df, frequency, horizon = cached_loader(paths[0])
+    df.loc[0, 'series_value'] = -1.0
+    assert cached_loader(paths[0])[0]['series_value'].iloc[0] == 1.0 and (frequency, horizon) == ('yearly', 6)
+    assert len(calls) == 1 and dataset_cache['hits'] == 1
+
+    time.sleep(0.01)
+    paths[0].write_text('@data\n\n')
+    assert cached_loader(paths[0])[0]['series_value'].iloc[0] == 2.0
+
+    # Each DataFrame uses about 8 KB, so only two of them fit
+    cached_loader(paths[1])
+    cached_loader(paths[2])
+    assert len(dataset_cache['entries']) == 2 and dataset_cache['n_bytes'] <= dataset_cache['max_bytes']
+    cached_loader(paths[2])
+    assert len(calls) == 4
+    cached_loader(paths[0])
+    assert len(calls) == 5
+
+    # The series are arrays inside an object column, as in 'convert_tsf_to_dataframe'
+    series_loader = warm_worker.cached_tsf_loader(
+        warm_worker.start_dataset_cache(), lambda path: (pd.DataFrame({'series_value': [np.ones(3), np.ones(4)]}), 'yearly')
+    )
+    df, _ = series_loader(paths[1])
+    df['series_value'].iloc[0][0] = -1.0
+    assert series_loader(paths[1])[0]['series_value'].iloc[0][0] == 1.0
+
+
+def start_worker(socket_path):
+    '''Starts a worker in a thread of the tests, and waits for its socket'''
+    worker = threading.Thread(target=warm_worker.serve, args=(socket_path,))
+    worker.start()
+    for _ in range(100):
+        if socket_path.exists():
+            break
+        time.sleep(0.05)
+    return worker
+
+
+def test_run_in_worker(tmp_path, monkeypatch):
+    '''The functions run in the worker when it is running, and in the calling process otherwise'''
+    socket_path = tmp_path / 'worker.sock'
+    monkeypatch.setattr(warm_worker, 'WORKER_FUNCTIONS', warm_worker.WORKER_FUNCTIONS + ['tables_create.get_model_name'])
+    monkeypatch.setattr(warm_worker, 'PRELOADED_MODULES', [])
+    # The worker changes the working directory to the base directory, which is restored at the end of the test
+    monkeypatch.chdir(tmp_path)
+
+    assert warm_worker.worker_status(socket_path) is None
+    local_name = warm_worker.run_in_worker('tables_create.get_model_name', 'm1_yearly_ets.txt', socket_path=socket_path)
+    assert local_name == 'ETS'
+
+    worker = start_worker(socket_path)
+    try:
+        assert warm_worker.run_in_worker('tables_create.get_model_name', 'm1_yearly_ets.txt', socket_path=socket_path) == local_name
+        with pytest.raises(Exception, match='not one of the functions'):
+            warm_worker.run_in_worker('os.remove', 'file', socket_path=socket_path)
+        assert warm_worker.worker_status(socket_path)['datasets'] == 0
+    finally:
+        warm_worker.stop_worker(socket_path)
+        worker.join(10)
+    assert not worker.is_alive() and not socket_path.exists()
+
+
+def test_reload_changed_module(tmp_path, monkeypatch):
+    '''A module edited after it ran in the worker is reloaded before its next call'''
+    socket_path = tmp_path / 'worker.sock'
+    module_path = tmp_path / 'sample_tables.py'
+    module_path.write_text('def generate_table():\n    return 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'sample_tables', raising=False)
+    monkeypatch.setattr(warm_worker, 'WORKER_FUNCTIONS', ['sample_tables.generate_table'])
+    monkeypatch.setattr(warm_worker, 'PRELOADED_MODULES', [])
+    monkeypatch.chdir(tmp_path)
+
+    worker = start_worker(socket_path)
+    try:
+        assert warm_worker.run_in_worker('sample_tables.generate_table', socket_path=socket_path) == 1
+        module_path.write_text('def generate_table():\n    return 1 + 1\n')
+        assert warm_worker.run_in_worker('sample_tables.generate_table', socket_path=socket_path) == 2
+    finally:
+        warm_worker.stop_worker(socket_path)
+        worker.join(10)
+        sys.modules.pop('sample_tables', None)
+
+
+def test_worker_access(tmp_path, monkeypatch):
+    '''Only clients knowing the key, readable by the user only, can submit requests'''
+    socket_path = tmp_path / 'worker.sock'
+    key_path = warm_worker.authkey_path(socket_path)
+    monkeypatch.setattr(warm_worker, 'PRELOADED_MODULES', [])
+    monkeypatch.chdir(tmp_path)
+
+    worker = start_worker(socket_path)
+    try:
+        assert os.stat(socket_path).st_mode & 0o077 == 0
+        assert os.stat(key_path).st_mode & 0o777 == 0o600
+        with pytest.raises(AuthenticationError):
+            Client(str(socket_path), family='AF_UNIX', authkey=b'wrong key')
+        assert warm_worker.worker_status(socket_path)['pid'] == os.getpid()
+    finally:
+        warm_worker.stop_worker(socket_path)
+        worker.join(10)
+    assert not worker.is_alive() and not socket_path.exists() and not key_path.exists()
@@ -0,0 +1,336 @@
+'''
+This script calculates the error measures of the experiments in Python, mirroring 'error_calculator.R'.
+
+The sMAPE, mSMAPE, MASE, MAE and RMSE of every series are calculated at once on (n_series, horizon) matrices,
+ignoring missing values as 'rowMeans(..., na.rm = TRUE)' does in R. The MASE scale of each series, the mean absolute
+seasonal difference of its training values, is calculated for all series together on a contiguous buffer of the
+training values (see 'series_buffer.py'), falling back to the lag 1 difference when the seasonal one is not defined.
+
+'calculate_errors' writes the same files as the R function: one file per error measure with the value of each series,
+and a summary file with the mean and median of each measure, which is read by 'tables_create.py' to build Table 2.
+'calculate_step_errors' keeps the error of every series at every step of the horizon instead, to be saved with 'error_store.py'.
+
+The parts of the measures that only depend on the dataset, the MASE scales and the actual values term of the mSMAPE
+denominator, are the same for every model evaluated on a dataset: 'calculate_error_scales' computes them once, and
+'scale_cache.py' keeps them on disk so every experiment on the dataset passes them to the functions below.
+'''
+import os
+import warnings
+
+import numpy as np
+
+try:
+    from src.utils.series_buffer import build_series_buffer
+except ImportError:
+    from utils.series_buffer import build_series_buffer
+
+'''Error measures written by 'calculate_errors', with the names used in the summary file'''
+ERROR_MEASURES = {
+    'smape': 'SMAPE',
+    'msmape': 'mSMAPE',
+    'mase': 'MASE',
+    'mae': 'MAE',
+    'rmse': 'RMSE',
+}
+
+'''
+Errors at each step of the horizon returned by 'calculate_step_errors', in this order. The per-series measures are
+their row means ignoring missing values, except the RMSE, which is the square root of the row mean of 'squared_error'.
+'''
+STEP_ERROR_MEASURES = ['smape', 'msmape', 'mase', 'absolute_error', 'squared_error']
+
+
+def row_nanmean(errors):
+    """
+    Calculates the mean of each row ignoring missing values, NaN for rows without values, as 'rowMeans(..., na.rm = TRUE)'.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanmean(errors, axis=1)
+
+
+def calculate_smape(forecasts, test_set):
+    """
+    Calculates the sMAPE of each series.
+
+    Parameters:
+    - forecasts (ndarray): Matrix of forecasts, with one row per series and one column per step of the horizon.
+    - test_set (ndarray): Matrix of the actual values, with the same dimensions as 'forecasts'.
+
+    Returns:
+    - An array with the sMAPE of each series.
+    """
+    return row_nanmean(smape_steps(forecasts, test_set))
+
+
+def smape_steps(forecasts, test_set):
+    """
+    Calculates the sMAPE at each step of the horizon, NaN where forecast and actual value are both zero.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 2 * np.abs(forecasts - test_set) / (np.abs(forecasts) + np.abs(test_set))
+
+
+def calculate_msmape(forecasts, test_set, epsilon=0.1, actual_denominators=None):
+    """
+    Calculates the mSMAPE of each series, the sMAPE with a denominator bounded away from zero.
+
+    Parameters:
+    - forecasts (ndarray): Matrix of forecasts, with one row per series and one column per step of the horizon.
+    - test_set (ndarray): Matrix of the actual values, with the same dimensions as 'forecasts'.
+    - epsilon (float): Constant added to the denominator.
+    - actual_denominators (ndarray, optional): The precomputed abs(test_set) + epsilon, from 'calculate_error_scales'.
+
+    Returns:
+    - An array with the mSMAPE of each series.
+    """
+    return row_nanmean(msmape_steps(forecasts, test_set, epsilon, actual_denominators))
+
+
+def msmape_steps(forecasts, test_set, epsilon=0.1, actual_denominators=None):
+    """
+    Calculates the mSMAPE at each step of the horizon.
+    """
+    if actual_denominators is None:
+        actual_denominators = np.abs(test_set) + epsilon
+    denominator = np.fmax(0.5 + epsilon, np.abs(forecasts) + actual_denominators)
+    return 2 * np.abs(forecasts - test_set) / denominator
+
+
+def calculate_mase_scales(training_set, lag):
+    """
+    Calculates the mean absolute difference at a lag of the training values of each series, ignoring missing values.
+
+    Parameters:
+    - training_set (list): The training values of each series, or a tuple (values, offsets) from 'build_series_buffer'.
+    - lag (int): The lag of the differences.
+
+    Returns:
+    - An array with the scale of each series, NaN for series with no more than 'lag' values.
+    """
+    values, offsets = training_set if isinstance(training_set, tuple) else build_series_buffer(training_set)
+    n_series = len(offsets) - 1
+    series_index = np.repeat(np.arange(n_series), np.diff(offsets))
+    # Missing values are dropped before differencing, as in R
+    observed = ~np.isnan(values)
+    values, series_index = values[observed], series_index[observed]
+    if len(values) <= lag:
+        return np.full(n_series, np.nan)
+    same_series = series_index[lag:] == series_index[:-lag]
+    differences = np.abs(values[lag:] - values[:-lag])[same_series]
+    differences_series = series_index[lag:][same_series]
+    sums = np.bincount(differences_series, weights=differences, minlength=n_series)
+    counts = np.bincount(differences_series, minlength=n_series)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts
+
+
+def calculate_mase(forecasts, test_set, training_set, seasonality, error_scales=None):
+    """
+    Calculates the MASE of each series, scaled by the seasonal naive error on its training values.
+    Series whose MASE is not defined with the seasonal scale use the lag 1 scale. Infinite and missing results are dropped.
+
+    Parameters:
+    - forecasts (ndarray): Matrix of forecasts, with one row per series and one column per step of the horizon.
+    - test_set (ndarray): Matrix of the actual values, with the same dimensions as 'forecasts'.
+    - training_set (list): The training values of each series, or a tuple (values, offsets) from 'build_series_buffer'.
+    - seasonality (int, float or list): The seasonality of the dataset, the smallest one if there are many.
+    - error_scales (dict, optional): The precomputed scales of the dataset, from 'calculate_error_scales'.
+
+    Returns:
+    - An array with the MASE of the series where it is defined.
+    """
+    if error_scales is None:
+        error_scales = calculate_error_scales(training_set, None, seasonality)
+    mean_absolute_errors = row_nanmean(np.abs(forecasts - test_set))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mase = mean_absolute_errors / error_scales['seasonal_scales']
+        undefined = np.isnan(mase)
+        if undefined.any():
+            mase[undefined] = mean_absolute_errors[undefined] / error_scales['naive_scales'][undefined]
+    return mase[np.isfinite(mase)]
+
+
+def calculate_error_scales(training_set, test_set, seasonality, epsilon=0.1):
+    """
+    Calculates the parts of the error measures that do not depend on the forecasts, shared by all models of a dataset.
+
+    Parameters:
+    - training_set (list): The training values of each series, or a tuple (values, offsets) from 'build_series_buffer'.
+    - test_set (array-like, optional): Matrix of the actual values. Without it, the mSMAPE term is not calculated.
+    - seasonality (int, float or list): The seasonality of the dataset, as in SEASONALITY_MAP.
+    - epsilon (float): Constant added to the mSMAPE denominator.
+
+    Returns:
+    - A dict with the MASE scales of each series at the seasonal lag, 'seasonal_scales', and at lag 1, 'naive_scales',
+      and the actual values term of the mSMAPE denominator, abs(test_set) + epsilon, 'msmape_denominators'.
+    """
+    if not isinstance(training_set, tuple):
+        training_set = build_series_buffer(training_set)
+    error_scales = {
+        'seasonal_scales': calculate_mase_scales(training_set, int(np.min(seasonality))),
+        'naive_scales': calculate_mase_scales(training_set, 1),
+    }
+    if test_set is not None:
+        error_scales['msmape_denominators'] = np.abs(np.asarray(test_set, dtype=float)) + epsilon
+    return error_scales
+
+
+def calculate_series_scales(training_set, seasonality, error_scales=None):
+    """
+    Calculates the MASE scale of each series: the seasonal one, or the lag 1 one when the seasonal scale is not defined.
+
+    Parameters:
+    - training_set (list): The training values of each series, or a tuple (values, offsets) from 'build_series_buffer'.
+    - seasonality (int, float or list): The seasonality of the dataset, as in SEASONALITY_MAP.
+    - error_scales (dict, optional): The precomputed scales of the dataset, from 'calculate_error_scales'.
+
+    Returns:
+    - An array with the scale of each series, NaN if neither scale is defined.
+    """
+    if error_scales is None:
+        error_scales = calculate_error_scales(training_set, None, seasonality)
+    undefined = np.isnan(error_scales['seasonal_scales'])
+    return np.where(undefined, error_scales['naive_scales'], error_scales['seasonal_scales'])
+
+
+def calculate_step_errors(forecasts, test_set, training_set, seasonality, error_scales=None):
+    """
+    Calculates the errors of each series at each step of the horizon.
+    The MASE of a step is its absolute error over the scale of the series, the seasonal one or the lag 1 one when the
+    seasonal scale is not defined, so it can be infinite for series with a zero scale.
+
+    Parameters:
+    - forecasts (array-like): Matrix of forecasts, with one row per series and one column per step of the horizon.
+    - test_set (array-like): Matrix of the actual values, with the same dimensions as 'forecasts'.
+    - training_set (list): The training values of each series, or a tuple (values, offsets) from 'build_series_buffer'.
+    - seasonality (int, float or list): The seasonality of the dataset, as in SEASONALITY_MAP.
+    - error_scales (dict, optional): The precomputed scales of the dataset, from 'calculate_error_scales'.
+
+    Returns:
+    - A float32 array of shape (len(STEP_ERROR_MEASURES), n_series, horizon).
+    """
+    forecasts = np.asarray(forecasts, dtype=float)
+    test_set = np.asarray(test_set, dtype=float)
+    if error_scales is None:
+        error_scales = calculate_error_scales(training_set, test_set, seasonality)
+    scales = calculate_series_scales(training_set, seasonality, error_scales)
+    absolute_errors = np.abs(forecasts - test_set)
+    step_errors = np.empty((len(STEP_ERROR_MEASURES),) + forecasts.shape, dtype=np.float32)
+    step_errors[0] = smape_steps(forecasts, test_set)
+    step_errors[1] = msmape_steps(forecasts, test_set, actual_denominators=error_scales.get('msmape_denominators'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        step_errors[2] = absolute_errors / scales[:, None]
+    step_errors[3] = absolute_errors
+    step_errors[4] = absolute_errors ** 2
+    return step_errors
+
+
+def calculate_mae(forecasts, test_set):
+    """
+    Calculates the MAE of each series.
+
+    Parameters:
+    - forecasts (ndarray): Matrix of forecasts, with one row per series and one column per step of the horizon.
+    - test_set (ndarray): Matrix of the actual values, with the same dimensions as 'forecasts'.
+
+    Returns:
+    - An array with the MAE of each series.
+    """
+    return row_nanmean(np.abs(forecasts - test_set))
+
+
+def calculate_rmse(forecasts, test_set):
+    """
+    Calculates the RMSE of each series.
+
+    Parameters:
+    - forecasts (ndarray): Matrix of forecasts, with one row per series and one column per step of the horizon.
+    - test_set (ndarray): Matrix of the actual values, with the same dimensions as 'forecasts'.
+
+    Returns:
+    - An array with the RMSE of each series.
+    """
+    return np.sqrt(row_nanmean((forecasts - test_set) ** 2))
+
+
+def format_error_value(value):
+    """
+    Formats a number with 15 significant digits, as R does when writing the error files.
+    """
+    return 'NaN' if np.isnan(value) else f'{value:.15g}'
+
+
+def summarize_errors(errors_per_series):
+    """
+    Builds the lines of the summary file: the mean and median of each error measure across the series.
+
+    Parameters:
+    - errors_per_series (dict): The errors of each series, keyed by the names in ERROR_MEASURES.
+
+    Returns:
+    - A list of strings such as 'Mean SMAPE: 0.123'.
+    """
+    lines = []
+    for error_measure, error_name in ERROR_MEASURES.items():
+        errors = errors_per_series[error_measure]
+        mean = np.mean(errors) if len(errors) else np.nan
+        median = np.median(errors) if len(errors) else np.nan
+        lines.append(f'Mean {error_name}: {format_error_value(mean)}')
+        lines.append(f'Median {error_name}: {format_error_value(median)}')
+    return lines
+
+
+def calculate_errors(forecasts, test_set, training_set, seasonality, output_file_name, error_scales=None):
+    """
+    Calculates all the error measures and writes them in the format of 'calculate_errors' in 'error_calculator.R'.
+
+    Parameters:
+    - forecasts (array-like): Matrix of forecasts, with one row per series and one column per step of the horizon.
+    - test_set (array-like): Matrix of the actual values, with the same dimensions as 'forecasts'.
+    - training_set (list): The training values of each series, or a tuple (values, offsets) from 'build_series_buffer'.
+    - seasonality (int, float or list): The seasonality of the dataset, as in SEASONALITY_MAP.
+    - output_file_name (str): The prefix of the error files, e.g. 'results/fixed_horizon_errors/m1_yearly_deepar_lag_2'.
+    - error_scales (dict, optional): The precomputed scales of the dataset, from 'calculate_error_scales' or 'scale_cache.py'.
+
+    Returns:
+    - A dictionary with the errors of each series, keyed by the names in ERROR_MEASURES.
+    """
+    forecasts = np.asarray(forecasts, dtype=float)
+    test_set = np.asarray(test_set, dtype=float)
+    if forecasts.shape != test_set.shape:
+        raise Exception(f'Forecasts {forecasts.shape} and test set {test_set.shape} must have the same dimensions.')
+    if error_scales is None:
+        error_scales = calculate_error_scales(training_set, test_set, seasonality)
+
+    errors_per_series = {
+        'smape': calculate_smape(forecasts, test_set),
+        'msmape': calculate_msmape(forecasts, test_set, actual_denominators=error_scales.get('msmape_denominators')),
+        'mase': calculate_mase(forecasts, test_set, training_set, seasonality, error_scales),
+        'mae': calculate_mae(forecasts, test_set),
+        'rmse': calculate_rmse(forecasts, test_set),
+    }
+    write_error_files(errors_per_series, output_file_name)
+    return errors_per_series
+
+
+def write_error_files(errors_per_series, output_file_name):
+    """
+    Prints the summary of the errors and writes the error files of 'calculate_errors'.
+
+    Parameters:
+    - errors_per_series (dict): The errors of each series, keyed by the names in ERROR_MEASURES.
+    - output_file_name (str): The prefix of the error files.
+    """
+    summary = summarize_errors(errors_per_series)
+    for line in summary:
+        print(line)
+
+    output_dir = os.path.dirname(output_file_name)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    for error_measure, errors in errors_per_series.items():
+        with open(f'{output_file_name}_{error_measure}.txt', 'w') as f:
+            f.writelines(f'{format_error_value(error)}\n' for error in errors)
+    with open(f'{output_file_name}.txt', 'w') as f:
+        f.write('\n'.join(summary) + '\n\n\n')
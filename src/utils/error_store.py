@@ -0,0 +1,104 @@
+'''
+This script stores the errors of every series at every step of the horizon for each run of an experiment,
+so rankings, bootstrap intervals and model comparisons can be calculated later without running the models again.
+
+Each run (dataset, model and lag, named as the files of 'results/fixed_horizon_errors') is saved as a single float32
+.npy file of shape (len(STEP_ERROR_MEASURES), n_series, horizon), as returned by 'calculate_step_errors'.
+The files are opened memory-mapped, so loading a measure or a few series only reads those values from disk.
+'''
+import os
+
+import numpy as np
+
+try:
+    from src.utils.error_calculator import STEP_ERROR_MEASURES
+except ImportError:
+    from utils.error_calculator import STEP_ERROR_MEASURES
+
+'''Directory where the error matrices are saved, next to the summary files of 'results/fixed_horizon_errors' '''
+ERROR_MATRICES_DIR = 'results/fixed_horizon_error_matrices'
+
+
+def error_matrix_path(run_name, matrices_dir=ERROR_MATRICES_DIR):
+    """
+    Returns the path of the error matrix of a run, e.g. 'm1_yearly_deepar_lag_2'.
+    """
+    return os.path.join(matrices_dir, f'{run_name}.npy')
+
+
+def save_error_matrix(step_errors, run_name, matrices_dir=ERROR_MATRICES_DIR):
+    """
+    Saves the errors of a run as a float32 .npy file, replacing any previous one atomically.
+
+    Parameters:
+    - step_errors (ndarray): Array of shape (len(STEP_ERROR_MEASURES), n_series, horizon), from 'calculate_step_errors'.
+    - run_name (str): Name of the run, e.g. 'm1_yearly_deepar_lag_2'.
+    - matrices_dir (str): Directory where the error matrices are saved.
+
+    Returns:
+    - The path of the saved file.
+    """
+    step_errors = np.asarray(step_errors, dtype=np.float32)
+    if step_errors.ndim != 3 or step_errors.shape[0] != len(STEP_ERROR_MEASURES):
+        raise Exception(f'The error matrix must have shape ({len(STEP_ERROR_MEASURES)}, n_series, horizon), got {step_errors.shape}.')
+    os.makedirs(matrices_dir, exist_ok=True)
+    path = error_matrix_path(run_name, matrices_dir)
+    temporary_path = path + '.tmp.npy'
+    np.save(temporary_path, step_errors)
+    os.replace(temporary_path, path)
+    return path
+
+
+def list_error_runs(matrices_dir=ERROR_MATRICES_DIR):
+    """
+    Lists the names of the runs with a saved error matrix.
+    """
+    if not os.path.exists(matrices_dir):
+        return []
+    return sorted(f[:-len('.npy')] for f in os.listdir(matrices_dir) if f.endswith('.npy') and not f.endswith('.tmp.npy'))
+
+
+def load_error_matrix(run_name, measure=None, series=None, matrices_dir=ERROR_MATRICES_DIR, copy=False):
+    """
+    Opens the error matrix of a run memory-mapped and selects a measure and a set of series.
+
+    Parameters:
+    - run_name (str): Name of the run, e.g. 'm1_yearly_deepar_lag_2'.
+    - measure (str, optional): One of STEP_ERROR_MEASURES. If None, all measures are returned.
+    - series (slice or array-like, optional): The rows (series) to select. If None, all series are returned.
+    - matrices_dir (str): Directory where the error matrices are saved.
+    - copy (bool): Whether to read the selection into memory. Otherwise a read-only memory-mapped view is returned
+      when the selection allows it (a measure and a slice of series), and values are read from disk when accessed.
+
+    Returns:
+    - An array of shape (n_series, horizon) for a measure, or (len(STEP_ERROR_MEASURES), n_series, horizon) otherwise.
+    """
+    step_errors = np.load(error_matrix_path(run_name, matrices_dir), mmap_mode='r')
+    if measure is not None:
+        if measure not in STEP_ERROR_MEASURES:
+            raise Exception(f'Unknown error measure {measure}: choose among {STEP_ERROR_MEASURES}')
+        step_errors = step_errors[STEP_ERROR_MEASURES.index(measure)]
+    if series is not None:
+        step_errors = step_errors[..., series, :]
+    return np.array(step_errors) if copy else step_errors
+
+
+def load_series_errors(run_name, measure, series=None, matrices_dir=ERROR_MATRICES_DIR):
+    """
+    Loads the error of each series of a run averaged over the horizon, ignoring missing values.
+    For 'squared_error' the square root of the mean is returned, the RMSE of each series.
+
+    Parameters:
+    - run_name (str): Name of the run, e.g. 'm1_yearly_deepar_lag_2'.
+    - measure (str): One of STEP_ERROR_MEASURES.
+    - series (slice or array-like, optional): The series to load. If None, all series are loaded.
+    - matrices_dir (str): Directory where the error matrices are saved.
+
+    Returns:
+    - A float64 array with one error per series.
+    """
+    step_errors = load_error_matrix(run_name, measure, series, matrices_dir).astype(float)
+    observed = ~np.isnan(step_errors)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        series_errors = np.where(observed, step_errors, 0).sum(axis=1) / observed.sum(axis=1)
+    return np.sqrt(series_errors) if measure == 'squared_error' else series_errors
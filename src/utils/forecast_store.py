@@ -0,0 +1,172 @@
+'''
+This script saves and reads the forecasts of the experiments in a binary format instead of CSV text.
+
+A run is saved as '{run_name}.npy', the (n_series, horizon) array of forecasts in float64 or float32, next to
+'{run_name}.json', which holds the names of the series (one per row), the dtype and shape and the metadata of the run.
+With 'compress=True' the array is saved in a compressed '{run_name}.npz' instead, smaller on disk but read into memory
+as a whole. The .npy files are opened memory-mapped, so reading a few series only reads those rows from disk.
+
+Writing the CSV of the forecasts, as the text files of 'results/fixed_horizon_forecasts', is kept as an option,
+and 'convert_text_forecasts' converts existing text forecasts into the binary format.
+'''
+import csv
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+'''Folder of the forecasts, shared with the text forecasts'''
+FORECASTS_DIR = 'results/fixed_horizon_forecasts'
+
+
+def forecast_paths(run_name, forecasts_dir=FORECASTS_DIR):
+    """
+    Returns the paths of the array (.npy), compressed array (.npz) and metadata (.json) files of a run.
+    """
+    base_path = os.path.join(forecasts_dir, run_name)
+    return {'npy': base_path + '.npy', 'npz': base_path + '.npz', 'json': base_path + '.json'}
+
+
+def export_forecasts_csv(forecasts, csv_path):
+    """
+    Writes the forecasts as text, one row of comma separated values per series, as the original experiments did.
+    """
+    with open(csv_path, 'w') as output:
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerows(np.asarray(forecasts).tolist())
+
+
+def save_forecasts(
+        forecasts,
+        run_name,
+        series_names=None,
+        metadata=None,
+        forecasts_dir=FORECASTS_DIR,
+        dtype=np.float64,
+        compress=False,
+        export_csv=False
+):
+    """
+    Saves the forecasts of a run in the binary format.
+
+    Parameters:
+    - forecasts (array-like): Matrix of forecasts, with one row per series and one column per step of the horizon.
+    - run_name (str): Name of the run, e.g. 'm1_yearly_deepar_lag_2'.
+    - series_names (list, optional): The name of each series. Defaults to the row numbers.
+    - metadata (dict, optional): Description of the run, e.g. the dataset, method, lag and horizon.
+    - forecasts_dir (str): Folder of the forecasts.
+    - dtype (type): np.float64 to keep the full precision or np.float32 to halve the size.
+    - compress (bool): Whether to save a compressed .npz instead of a memory-mappable .npy.
+    - export_csv (bool): Whether to also write the forecasts as '{run_name}.txt', in the text format.
+
+    Returns:
+    - The path of the saved array (str).
+    """
+    forecasts = np.asarray(forecasts, dtype=dtype)
+    if forecasts.ndim != 2:
+        raise Exception(f'The forecasts must be a (n_series, horizon) matrix, got shape {forecasts.shape}.')
+    series_names = [str(name) for name in series_names] if series_names is not None else [str(i) for i in range(len(forecasts))]
+    if len(series_names) != len(forecasts):
+        raise Exception(f'{len(series_names)} series names for {len(forecasts)} series of forecasts.')
+
+    os.makedirs(forecasts_dir, exist_ok=True)
+    paths = forecast_paths(run_name, forecasts_dir)
+    array_path, stale_path = (paths['npz'], paths['npy']) if compress else (paths['npy'], paths['npz'])
+    temporary_path = array_path + '.tmp' + os.path.splitext(array_path)[1]
+    if compress:
+        np.savez_compressed(temporary_path, forecasts=forecasts)
+    else:
+        np.save(temporary_path, forecasts)
+    os.replace(temporary_path, array_path)
+    if os.path.exists(stale_path):
+        os.remove(stale_path)
+
+    with open(paths['json'], 'w') as f:
+        json.dump({
+            'run_name': run_name,
+            'dtype': np.dtype(dtype).name,
+            'shape': list(forecasts.shape),
+            'compressed': compress,
+            'saved_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'metadata': metadata or {},
+            'series_names': series_names,
+        }, f, default=str)
+
+    if export_csv:
+        export_forecasts_csv(forecasts, os.path.join(forecasts_dir, f'{run_name}.txt'))
+    return array_path
+
+
+def load_forecasts(run_name, forecasts_dir=FORECASTS_DIR, series=None):
+    """
+    Reads the forecasts of a run saved by 'save_forecasts'.
+
+    Parameters:
+    - run_name (str): Name of the run, e.g. 'm1_yearly_deepar_lag_2'.
+    - forecasts_dir (str): Folder of the forecasts.
+    - series (slice or array-like, optional): The rows (series) to select. If None, all series are returned.
+
+    Returns:
+    - A tuple (forecasts, series_names, metadata). Uncompressed forecasts are a read-only memory-mapped array
+      (or a view of it for a slice of series).
+    """
+    paths = forecast_paths(run_name, forecasts_dir)
+    with open(paths['json']) as f:
+        description = json.load(f)
+    if os.path.exists(paths['npy']):
+        forecasts = np.load(paths['npy'], mmap_mode='r')
+    elif os.path.exists(paths['npz']):
+        with np.load(paths['npz']) as archive:
+            forecasts = archive['forecasts']
+    else:
+        raise Exception(f'No forecasts saved for {run_name} in {forecasts_dir}.')
+    series_names = description['series_names']
+    if series is not None:
+        forecasts = forecasts[series]
+        series_names = list(np.asarray(series_names, dtype=object)[series])
+    return forecasts, series_names, description['metadata']
+
+
+def convert_text_forecasts(text_path, forecasts_dir=None, dtype=np.float64, compress=False, metadata=None):
+    """
+    Converts a text forecasts file, one row of comma separated values per series, into the binary format.
+    Missing values ('NA' or empty) become NaN.
+
+    Parameters:
+    - text_path (str): Path of the text forecasts, e.g. 'results/fixed_horizon_forecasts/m1_yearly_ets.txt'.
+    - forecasts_dir (str, optional): Folder of the binary forecasts. Defaults to the folder of the text file.
+    - dtype (type): dtype of the saved array.
+    - compress (bool): Whether to save a compressed .npz.
+    - metadata (dict, optional): Description of the run.
+
+    Returns:
+    - The path of the saved array (str).
+    """
+    forecasts_dir = os.path.dirname(text_path) if forecasts_dir is None else forecasts_dir
+    run_name = os.path.splitext(os.path.basename(text_path))[0]
+    forecasts = pd.read_csv(text_path, header=None, dtype=float, na_values=['NA', 'NaN']).to_numpy()
+    metadata = {'converted_from': os.path.basename(text_path), **(metadata or {})}
+    return save_forecasts(forecasts, run_name, None, metadata, forecasts_dir, dtype, compress)
+
+
+def convert_forecasts_dir(forecasts_dir=FORECASTS_DIR, dtype=np.float64, compress=False):
+    """
+    Converts every text forecasts file of a folder that has no binary version yet.
+
+    Returns:
+    - The list of converted run names.
+    """
+    converted = []
+    for file_name in sorted(os.listdir(forecasts_dir)):
+        run_name, extension = os.path.splitext(file_name)
+        if extension != '.txt' or os.path.exists(forecast_paths(run_name, forecasts_dir)['json']):
+            continue
+        convert_text_forecasts(os.path.join(forecasts_dir, file_name), forecasts_dir, dtype, compress)
+        converted.append(run_name)
+    return converted
+
+
+if __name__ == '__main__':
+    print(f'Converted: {convert_forecasts_dir()}')
@@ -0,0 +1,208 @@
+'''
+This script records where the time and memory of the pipeline go, stage by stage.
+
+A run record is a dictionary describing one run of an entry point (a dataset and a method, for example) with the
+list of its stages. Each stage, measured with the 'record_stage' context manager, stores its wall time, CPU time of
+the process, and peak resident set size (RSS) of the process at its end. 'save_run_record' writes the record as a JSON
+file in RUN_RECORDS_DIR, and 'run_records_report' aggregates all the records into one table per stage and entry point.
+
+The peak RSS comes from the 'resource' module and only grows during the life of the process, so the peak of a stage
+is the highest memory used by the process up to the end of that stage. It is NaN where 'resource' is not available.
+'''
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+'''Folder of the run records'''
+RUN_RECORDS_DIR = 'results/run_records'
+
+
+def peak_rss_mb():
+    """
+    Returns the peak resident set size of the process in MB, or NaN where the 'resource' module is not available.
+    """
+    if resource is None:
+        return float('nan')
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 ** 2 if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def start_run_record(entry_point, run_name, **metadata):
+    """
+    Creates the record of a run.
+
+    Parameters:
+    - entry_point (str): The function being run, e.g. 'get_deep_nn_forecasts'.
+    - run_name (str): Name of the run, e.g. 'm1_yearly_deepar_lag_2'.
+    - metadata: Anything describing the run, e.g. dataset=..., method=...
+
+    Returns:
+    - The run record (dict), to be passed to 'record_stage' and 'save_run_record'.
+    """
+    return {
+        'entry_point': entry_point,
+        'run_name': run_name,
+        'metadata': metadata,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'stages': [],
+    }
+
+
+@contextmanager
+def record_stage(run_record, stage):
+    """
+    Measures the wall time, CPU time and peak RSS of the code inside the 'with' block and adds them to the run record.
+    A stage that is entered several times (in a loop, for example) accumulates its times.
+
+    Parameters:
+    - run_record (dict): The record from 'start_run_record'.
+    - stage (str): Name of the stage, e.g. 'load', 'train' or 'write'.
+    """
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall_seconds = time.perf_counter() - start_wall
+        cpu_seconds = time.process_time() - start_cpu
+        stages = {s['stage']: s for s in run_record['stages']}
+        if stage in stages:
+            stages[stage]['wall_seconds'] += wall_seconds
+            stages[stage]['cpu_seconds'] += cpu_seconds
+            stages[stage]['peak_rss_mb'] = peak_rss_mb()
+            stages[stage]['calls'] += 1
+        else:
+            run_record['stages'].append({
+                'stage': stage,
+                'wall_seconds': wall_seconds,
+                'cpu_seconds': cpu_seconds,
+                'peak_rss_mb': peak_rss_mb(),
+                'calls': 1,
+            })
+
+
+def record_iteration(run_record, stage, iterable):
+    """
+    Yields the items of an iterable, recording the time spent producing them as a stage.
+    Useful for lazy pipelines, where the work of a generator happens when its next item is requested.
+
+    Parameters:
+    - run_record (dict): The record from 'start_run_record'.
+    - stage (str): Name of the stage, e.g. 'transform'.
+    - iterable (iterable): The iterable whose items are produced in the stage.
+    """
+    iterator = iter(iterable)
+    end = object()
+    while True:
+        with record_stage(run_record, stage):
+            item = next(iterator, end)
+        if item is end:
+            return
+        yield item
+
+
+def save_run_record(run_record, records_dir=None):
+    """
+    Writes a run record as JSON, with its total wall and CPU time.
+
+    Parameters:
+    - run_record (dict): The record from 'start_run_record'.
+    - records_dir (str, optional): Folder of the run records. Defaults to RUN_RECORDS_DIR.
+
+    Returns:
+    - The path of the saved record (str).
+    """
+    records_dir = RUN_RECORDS_DIR if records_dir is None else records_dir
+    os.makedirs(records_dir, exist_ok=True)
+    run_record = {
+        **run_record,
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'wall_seconds': sum(s['wall_seconds'] for s in run_record['stages']),
+        'cpu_seconds': sum(s['cpu_seconds'] for s in run_record['stages']),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    file_name = f"{run_record['entry_point']}_{run_record['run_name']}_{datetime.now():%Y%m%d_%H%M%S_%f}.json"
+    path = os.path.join(records_dir, file_name)
+    with open(path, 'w') as f:
+        json.dump(run_record, f, indent=2, default=str)
+    return path
+
+
+def load_run_records(records_dir=None):
+    """
+    Reads all the run records into a table with one row per stage of each run.
+
+    Parameters:
+    - records_dir (str, optional): Folder of the run records. Defaults to RUN_RECORDS_DIR.
+
+    Returns:
+    - A DataFrame with the entry point, run name, metadata, start and the measures of each stage.
+    """
+    # pandas is only imported by the reports, so recording the stages of a run does not load it
+    import pandas as pd
+
+    records_dir = RUN_RECORDS_DIR if records_dir is None else records_dir
+    if not os.path.exists(records_dir):
+        return pd.DataFrame()
+    rows = []
+    for file_name in sorted(os.listdir(records_dir)):
+        if not file_name.endswith('.json'):
+            continue
+        with open(os.path.join(records_dir, file_name)) as f:
+            run_record = json.load(f)
+        for stage in run_record['stages']:
+            rows.append({
+                'entry_point': run_record['entry_point'],
+                'run_name': run_record['run_name'],
+                'started_at': run_record['started_at'],
+                **run_record['metadata'],
+                **stage,
+            })
+    return pd.DataFrame(rows)
+
+
+def run_records_report(records_dir=None, by=('entry_point', 'stage')):
+    """
+    Aggregates the run records: total and mean times, share of the wall time and highest peak RSS per group.
+
+    Parameters:
+    - records_dir (str, optional): Folder of the run records. Defaults to RUN_RECORDS_DIR.
+    - by (tuple): Columns to group by, e.g. ('entry_point', 'stage') or ('method', 'stage').
+
+    Returns:
+    - A DataFrame with one row per group, sorted by total wall time.
+    """
+    records = load_run_records(records_dir)
+    if records.empty:
+        return records
+    by = list(by)
+    report = (
+        records
+        .groupby(by, dropna=False)
+        .agg(
+            runs=('run_name', 'nunique'),
+            wall_seconds=('wall_seconds', 'sum'),
+            mean_wall_seconds=('wall_seconds', 'mean'),
+            cpu_seconds=('cpu_seconds', 'sum'),
+            max_peak_rss_mb=('peak_rss_mb', 'max'),
+        )
+        .assign(wall_share=lambda df: df.wall_seconds / df.wall_seconds.sum())
+        .sort_values('wall_seconds', ascending=False)
+        .reset_index()
+    )
+    return report
+
+
+if __name__ == '__main__':
+    import pandas as pd
+    pd.set_option('display.width', 200)
+    print(run_records_report())
+    if 'method' in load_run_records().columns:
+        print(run_records_report(by=('method', 'stage')))
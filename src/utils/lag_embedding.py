@@ -0,0 +1,249 @@
+'''
+This script builds the lag-embedded training data of the global models (pooled regression and CatBoost, see
+'models/global_models.R' and 'create_input_matrix' in 'utils/global_model_helper.R') without copying the series once
+per model and lag.
+
+The values of all series are normalized once, each by its mean as in 'create_input_matrix', into a single contiguous
+buffer with the offsets of the series (the layout of 'series_buffer.py'). The windows of any lag are then a strided
+view of that buffer from 'sliding_window_view', which costs no copy: row r is values[r:r + lag + 1], the 'lag' past
+values from the oldest to the most recent followed by the target. Only the rows starting at least 'lag' values before
+the end of their series are valid, so a window never crosses the boundary between two series; 'window_rows' gives
+their indices, and 'iter_lag_chunks' copies them a chunk at a time for the models that need a dense matrix.
+
+When the buffer is larger than MEMMAP_THRESHOLD_MB and a key is given, it is written once to a .npy file in
+LAG_EMBEDDING_DIR and memory-mapped, read-only, so both models, every lag of a sweep and every worker process reading
+the same dataset share the pages of a single materialization.
+'''
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+'''Default folder of the memory-mapped buffers, relative to the base directory'''
+LAG_EMBEDDING_DIR = 'results/lag_embedding_cache'
+
+'''Buffers larger than this are memory-mapped instead of kept in memory'''
+MEMMAP_THRESHOLD_MB = 64
+
+'''Number of windows copied at a time by 'iter_lag_chunks' '''
+CHUNK_ROWS = 2 ** 16
+
+ARRAY_NAMES = ['values', 'offsets', 'means']
+
+
+def lag_embedding_key(dataset_hash, forecast_horizon, normalization='mean'):
+    """
+    Builds the key of a normalized buffer, shared by all the models and lags trained on the same data.
+
+    Parameters:
+    - dataset_hash (str): The hash of the dataset file, e.g. from 'predictor_cache.file_sha256'.
+    - forecast_horizon (int): The number of values removed from the end of each series before training.
+    - normalization (str, optional): The normalization of the series, 'mean' or None.
+
+    Returns:
+    - The name of the cache entry (str).
+    """
+    key_content = json.dumps({
+        'dataset_hash': dataset_hash,
+        'forecast_horizon': forecast_horizon,
+        'normalization': normalization,
+    }, sort_keys=True)
+    return hashlib.sha256(key_content.encode()).hexdigest()[:32]
+
+
+def series_means(values, offsets):
+    """
+    Calculates the mean of every series of a buffer, replacing a mean of 0 by 1 to avoid dividing by zero, as in R.
+
+    Returns:
+    - A float64 array with one mean per series (NaN if the series is empty or has missing values).
+    """
+    lengths = np.diff(offsets)
+    # The buffer is padded so empty series at the end have a valid offset, and 'reduceat' returns the value at the
+    # offset for empty series instead of 0
+    sums = np.add.reduceat(np.append(values, 0.0), offsets[:-1]) if len(lengths) else np.zeros(0)
+    sums = np.where(lengths > 0, sums, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / lengths
+    means[means == 0] = 1
+    return means
+
+
+def normalize_buffer(values, offsets, means, out=None):
+    """
+    Divides every series of a buffer by its mean.
+
+    Parameters:
+    - values (ndarray): The buffer with the values of all series, from 'build_series_buffer'.
+    - offsets (ndarray): The offsets of the series inside the buffer.
+    - means (ndarray): The mean of each series.
+    - out (ndarray, optional): The array receiving the normalized buffer, e.g. a memory-mapped file.
+
+    Returns:
+    - The normalized buffer.
+    """
+    return np.divide(values, np.repeat(means, np.diff(offsets)), out=out)
+
+
+def load_lag_embedding(key, cache_dir=LAG_EMBEDDING_DIR):
+    """
+    Opens a memory-mapped normalized buffer, read-only.
+
+    Returns:
+    - The store (dict, see 'build_lag_embedding'), or None if it is not in the cache.
+    """
+    entry_dir = Path(cache_dir) / key
+    if not entry_dir.exists():
+        return None
+    store = {name: np.load(entry_dir / f'{name}.npy', mmap_mode='r') for name in ARRAY_NAMES}
+    store['offsets'] = np.asarray(store['offsets'])
+    store['means'] = np.asarray(store['means'])
+    return store
+
+
+def save_lag_embedding(values, offsets, means, key, cache_dir=LAG_EMBEDDING_DIR):
+    """
+    Normalizes a buffer directly into memory-mapped files of the cache.
+    The entry is written in a temporary folder and renamed, so processes building the same entry never read it partly written.
+    """
+    entry_dir = Path(cache_dir) / key
+    temporary_dir = Path(cache_dir) / f'.{key}.{os.getpid()}.tmp'
+    os.makedirs(temporary_dir, exist_ok=True)
+    normalized = np.lib.format.open_memmap(temporary_dir / 'values.npy', mode='w+', dtype=np.float64, shape=values.shape)
+    normalize_buffer(values, offsets, means, out=normalized)
+    normalized.flush()
+    del normalized
+    np.save(temporary_dir / 'offsets.npy', offsets)
+    np.save(temporary_dir / 'means.npy', means)
+    try:
+        os.replace(temporary_dir, entry_dir)
+    except OSError:
+        # Another process saved the same entry first
+        for name in ARRAY_NAMES:
+            os.remove(temporary_dir / f'{name}.npy')
+        os.rmdir(temporary_dir)
+
+
+def build_lag_embedding(
+        values,
+        offsets,
+        normalize=True,
+        key=None,
+        cache_dir=LAG_EMBEDDING_DIR,
+        memmap_threshold_mb=None
+):
+    """
+    Builds the normalized buffer from which the windows of every lag are taken.
+
+    Parameters:
+    - values (ndarray): The buffer with the values of all series, from 'build_series_buffer'. For the experiments, it is
+      the buffer of the training part of each series.
+    - offsets (ndarray): The offsets of the series inside the buffer.
+    - normalize (bool): Whether each series is divided by its mean.
+    - key (str, optional): The key of the buffer in the cache, from 'lag_embedding_key'. Without a key, the buffer is
+      kept in memory whatever its size.
+    - cache_dir (str): Folder of the memory-mapped buffers.
+    - memmap_threshold_mb (float, optional): Buffers larger than this are memory-mapped. Defaults to MEMMAP_THRESHOLD_MB.
+
+    Returns:
+    - The store (dict) with the normalized 'values' (read-only), the 'offsets' and the 'means' of the series
+      (all 1 if the series are not normalized), to be passed to 'lag_windows', 'iter_lag_chunks' and 'final_lags'.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    means = series_means(values, offsets) if normalize else np.ones(len(offsets) - 1)
+    if memmap_threshold_mb is None:
+        memmap_threshold_mb = MEMMAP_THRESHOLD_MB
+    if key is not None and values.nbytes > memmap_threshold_mb * 2 ** 20:
+        store = load_lag_embedding(key, cache_dir)
+        if store is None:
+            save_lag_embedding(values, offsets, means, key, cache_dir)
+            store = load_lag_embedding(key, cache_dir)
+        return store
+    normalized = normalize_buffer(values, offsets, means) if normalize else values.copy()
+    normalized.flags.writeable = False
+    return {'values': normalized, 'offsets': offsets, 'means': means}
+
+
+def window_rows(offsets, lag):
+    """
+    Finds the windows of a lag that lie inside a single series.
+
+    Parameters:
+    - offsets (ndarray): The offsets of the series inside the buffer.
+    - lag (int): The number of past values of each window.
+
+    Returns:
+    - An int64 array with the start of every valid window in the buffer, series after series.
+    """
+    starts = offsets[:-1]
+    counts = np.maximum(np.diff(offsets) - lag, 0)
+    # The start of each window is the start of its series plus its position inside the series
+    series_starts = np.repeat(starts - np.cumsum(np.concatenate([[0], counts[:-1]])), counts)
+    return series_starts + np.arange(counts.sum(), dtype=np.int64)
+
+
+def lag_windows(store, lag):
+    """
+    Gives the windows of a lag as a view of the normalized buffer.
+
+    Parameters:
+    - store (dict): The store from 'build_lag_embedding'.
+    - lag (int): The number of past values of each window.
+
+    Returns:
+    - A tuple (windows, rows): the read-only view of shape (len(values) - lag, lag + 1), where windows[r, :lag] are the
+      past values from the oldest to the most recent and windows[r, lag] the target, and the indices of its valid rows.
+    """
+    if lag < 1:
+        raise Exception(f'The lag must be at least 1, not {lag}.')
+    values = store['values']
+    if len(values) <= lag:
+        return np.empty((0, lag + 1)), np.empty(0, dtype=np.int64)
+    return sliding_window_view(values, lag + 1), window_rows(store['offsets'], lag)
+
+
+def series_windows(store, lag, series_index):
+    """
+    Gives the windows of one series as a view of the normalized buffer.
+    """
+    offsets = store['offsets']
+    series = store['values'][offsets[series_index]:offsets[series_index + 1]]
+    if len(series) <= lag:
+        return np.empty((0, lag + 1))
+    return sliding_window_view(series, lag + 1)
+
+
+def iter_lag_chunks(store, lag, chunk_rows=CHUNK_ROWS):
+    """
+    Copies the valid windows of a lag a chunk at a time, so the full design matrix is never in memory.
+
+    Parameters:
+    - store (dict): The store from 'build_lag_embedding'.
+    - lag (int): The number of past values of each window.
+    - chunk_rows (int): The number of windows of each chunk.
+
+    Yields:
+    - Tuples (X, y): the past values of the windows of the chunk, shape (n, lag), and their targets, shape (n,).
+    """
+    windows, rows = lag_windows(store, lag)
+    for chunk_start in range(0, len(rows), chunk_rows):
+        chunk = windows[rows[chunk_start:chunk_start + chunk_rows]]
+        yield chunk[:, :lag], chunk[:, lag]
+
+
+def final_lags(store, lag):
+    """
+    Gives the last 'lag' normalized values of every series, from the oldest to the most recent, which are the
+    inputs of the first forecast, as 'final_lags' in 'create_input_matrix' (in the reverse order).
+
+    Returns:
+    - A float64 array of shape (n_series, lag).
+    """
+    offsets = store['offsets']
+    if (np.diff(offsets) < lag).any():
+        raise Exception(f'All series must have at least {lag} values to take their final lags.')
+    return store['values'][offsets[1:, None] - lag + np.arange(lag)]
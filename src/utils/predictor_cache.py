@@ -0,0 +1,156 @@
+'''
+This script caches the trained GluonTS predictors of the deep learning experiments on disk,
+so changing only the evaluation or the post-processing of a run does not train the model again.
+
+A predictor is stored in its own folder, serialized by GluonTS, with a 'metadata.json' file describing the run.
+The folder is named after a key hashing everything that changes the trained model: the content of the dataset file,
+the method, the lag, the forecast horizon, the estimator hyperparameters and the GluonTS version.
+Loading a predictor refreshes its access time, and 'evict_predictor_cache' removes the entries not used for
+MAX_CACHE_AGE_DAYS and then the least recently used ones until the cache fits in MAX_CACHE_SIZE_MB.
+'''
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+'''Default folder of the cache, relative to the base directory'''
+PREDICTOR_CACHE_DIR = 'results/predictor_cache'
+
+'''Entries not used for this number of days are removed'''
+MAX_CACHE_AGE_DAYS = 30
+
+'''Maximum size of the cache: the least recently used entries are removed above it'''
+MAX_CACHE_SIZE_MB = 2048
+
+METADATA_FILE = 'metadata.json'
+
+
+def file_sha256(file_path, block_size=2 ** 20):
+    """
+    Calculates the SHA-256 hash of the content of a file, reading it in blocks.
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def predictor_cache_key(dataset_hash, method, lag, forecast_horizon, hyperparameters):
+    """
+    Builds the key of a trained predictor.
+
+    Parameters:
+    - dataset_hash (str): The hash of the dataset file, from 'file_sha256'.
+    - method (str): Name of the forecasting method, e.g. 'deepar'.
+    - lag (int): The number of past lags used by the model.
+    - forecast_horizon (int): The forecast horizon.
+    - hyperparameters (dict): The other arguments of the estimator and anything else changing the trained model.
+
+    Returns:
+    - The name of the cache entry (str), readable prefix followed by a hash of all the inputs.
+    """
+    key_content = json.dumps({
+        'dataset_hash': dataset_hash,
+        'method': method,
+        'lag': lag,
+        'forecast_horizon': forecast_horizon,
+        'hyperparameters': hyperparameters,
+    }, sort_keys=True, default=str)
+    return f'{method}_lag_{lag}_horizon_{forecast_horizon}_{hashlib.sha256(key_content.encode()).hexdigest()[:20]}'
+
+
+def load_cached_predictor(cache_key, cache_dir=PREDICTOR_CACHE_DIR):
+    """
+    Loads a trained predictor from the cache and refreshes its access time.
+
+    Parameters:
+    - cache_key (str): The key of the predictor, from 'predictor_cache_key'.
+    - cache_dir (str): Folder of the cache.
+
+    Returns:
+    - The GluonTS predictor, or None if it is not in the cache.
+    """
+    entry_dir = Path(cache_dir) / cache_key
+    metadata_path = entry_dir / METADATA_FILE
+    if not metadata_path.exists():
+        return None
+    from gluonts.model.predictor import Predictor
+    predictor = Predictor.deserialize(entry_dir)
+    os.utime(metadata_path)
+    return predictor
+
+
+def save_predictor(predictor, cache_key, metadata, cache_dir=PREDICTOR_CACHE_DIR):
+    """
+    Serializes a trained predictor into the cache. The entry is written to a temporary folder and renamed,
+    so an interrupted save never leaves an entry that looks complete.
+
+    Parameters:
+    - predictor (Predictor): The trained GluonTS predictor.
+    - cache_key (str): The key of the predictor, from 'predictor_cache_key'.
+    - metadata (dict): Description of the run saved next to the predictor.
+    - cache_dir (str): Folder of the cache.
+
+    Returns:
+    - The folder of the entry (Path).
+    """
+    entry_dir = Path(cache_dir) / cache_key
+    temporary_dir = Path(cache_dir) / f'.{cache_key}.{os.getpid()}.tmp'
+    shutil.rmtree(temporary_dir, ignore_errors=True)
+    temporary_dir.mkdir(parents=True)
+    predictor.serialize(temporary_dir)
+    with open(temporary_dir / METADATA_FILE, 'w') as f:
+        json.dump({**metadata, 'cache_key': cache_key, 'saved_at': time.time()}, f, indent=2, default=str)
+    shutil.rmtree(entry_dir, ignore_errors=True)
+    os.replace(temporary_dir, entry_dir)
+    return entry_dir
+
+
+def directory_size(directory):
+    """
+    Returns the total size in bytes of the files inside a directory.
+    """
+    return sum(f.stat().st_size for f in Path(directory).rglob('*') if f.is_file())
+
+
+def evict_predictor_cache(cache_dir=PREDICTOR_CACHE_DIR, max_age_days=MAX_CACHE_AGE_DAYS, max_size_mb=MAX_CACHE_SIZE_MB):
+    """
+    Removes the entries of the cache not used for 'max_age_days', then the least recently used ones until the
+    cache is not larger than 'max_size_mb'. Leftover temporary folders of interrupted saves are removed too.
+
+    Parameters:
+    - cache_dir (str): Folder of the cache.
+    - max_age_days (float): Maximum number of days since an entry was last used.
+    - max_size_mb (float): Maximum total size of the cache.
+
+    Returns:
+    - The list of removed cache keys.
+    """
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return []
+    entries = []
+    for entry_dir in cache_dir.iterdir():
+        metadata_path = entry_dir / METADATA_FILE
+        if not entry_dir.is_dir():
+            continue
+        if not metadata_path.exists():
+            # Temporary folder of an interrupted save, unless it is recent and may still be in progress
+            if time.time() - entry_dir.stat().st_mtime > 24 * 3600:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            continue
+        entries.append((metadata_path.stat().st_mtime, directory_size(entry_dir), entry_dir))
+
+    removed = []
+    oldest_allowed = time.time() - max_age_days * 24 * 3600
+    total_size = sum(size for _, size, _ in entries)
+    for last_used, size, entry_dir in sorted(entries):
+        if last_used >= oldest_allowed and total_size <= max_size_mb * 2 ** 20:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total_size -= size
+        removed.append(entry_dir.name)
+    return removed
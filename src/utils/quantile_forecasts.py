@@ -0,0 +1,80 @@
+'''
+This script turns the probabilistic forecasts of a GluonTS predictor into quantile forecasts without keeping the samples.
+
+'make_evaluation_predictions' followed by 'list(forecast_it)' holds every sample path of every series in memory,
+although only the median is used as the point forecast. Here the forecasts are consumed as the predictor yields them,
+the samples of a batch of series are reduced to the requested quantiles at once, and the quantiles are written into
+an array allocated up front, so at most one batch of samples is in memory at a time.
+
+The predictions are made on the training entries, whose targets end where the forecast horizon starts. This is what
+'make_evaluation_predictions' does internally, removing the last 'prediction_length' values of each test series.
+'''
+import numpy as np
+
+'''Default number of sample paths drawn per series, as in 'make_evaluation_predictions' '''
+NUM_SAMPLES = 100
+
+'''Number of series whose samples are reduced together'''
+PREDICTION_BATCH_SIZE = 256
+
+
+def reduce_samples_batch(samples_batch, quantiles):
+    """
+    Reduces the sample paths of a batch of series to quantiles.
+
+    Parameters:
+    - samples_batch (list): One array of shape (num_samples, horizon) per series.
+    - quantiles (list): The quantiles to calculate, between 0 and 1.
+
+    Returns:
+    - An array of shape (len(quantiles), len(samples_batch), horizon).
+    """
+    return np.quantile(np.stack(samples_batch), quantiles, axis=1)
+
+
+def predict_quantiles(
+        predictor,
+        dataset,
+        forecast_horizon,
+        quantiles=(0.5,),
+        num_samples=NUM_SAMPLES,
+        batch_size=PREDICTION_BATCH_SIZE
+):
+    """
+    Predicts the quantiles of every series of a dataset, streaming the forecasts of the predictor.
+
+    Parameters:
+    - predictor (Predictor): A trained GluonTS predictor.
+    - dataset (list): The entries to forecast from, e.g. the training entries of 'build_gluonts_entries'.
+    - forecast_horizon (int): The prediction length of the predictor.
+    - quantiles (list): The quantiles to keep, e.g. [0.5] for the median point forecasts.
+    - num_samples (int): Number of sample paths drawn per series.
+    - batch_size (int): Number of series whose samples are reduced together.
+
+    Returns:
+    - A float array of shape (len(quantiles), n_series, forecast_horizon).
+    """
+    n_series = len(dataset)
+    quantile_forecasts = np.empty((len(quantiles), n_series, forecast_horizon))
+    samples_batch = []
+    position = 0
+    for forecast in predictor.predict(dataset, num_samples=num_samples):
+        if hasattr(forecast, 'samples'):
+            samples_batch.append(forecast.samples)
+        else:
+            # Forecasts without samples, such as the point forecasts of N-BEATS, give their quantiles directly
+            if samples_batch:
+                raise Exception('Forecasts with and without samples cannot be mixed in the same prediction.')
+            quantile_forecasts[:, position] = [forecast.quantile(q) for q in quantiles]
+            position += 1
+            continue
+        if len(samples_batch) == batch_size:
+            quantile_forecasts[:, position:position + batch_size] = reduce_samples_batch(samples_batch, quantiles)
+            position += batch_size
+            samples_batch = []
+    if samples_batch:
+        quantile_forecasts[:, position:position + len(samples_batch)] = reduce_samples_batch(samples_batch, quantiles)
+        position += len(samples_batch)
+    if position != n_series:
+        raise Exception(f'The predictor returned {position} forecasts for {n_series} series.')
+    return quantile_forecasts
@@ -0,0 +1,91 @@
+'''
+This script caches the parts of the error measures that only depend on a dataset, so they are calculated once for all
+the models and lags evaluated on it instead of once per experiment.
+
+The entry of a dataset holds the arrays of 'calculate_error_scales' in 'error_calculator.py': the MASE scales of each
+series at the seasonal lag of SEASONALITY_MAP and at lag 1, from the training part of the series, and the actual values
+term of the mSMAPE denominator for each step of the test part. It is saved as a .npz file in SCALE_CACHE_DIR, next to
+the other dataset caches ('predictor_cache.py' and 'lag_embedding.py'), and named after a key hashing the content of the
+dataset file, the seasonality and how the series were split, so a changed file or split gets new scales.
+'''
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from src.utils.error_calculator import calculate_error_scales
+except ImportError:
+    from utils.error_calculator import calculate_error_scales
+
+'''Default folder of the cache, relative to the base directory'''
+SCALE_CACHE_DIR = 'results/scale_cache'
+
+
+def scale_cache_key(dataset_hash, seasonality, **split):
+    """
+    Builds the key of the error scales of a dataset.
+
+    Parameters:
+    - dataset_hash (str): The hash of the dataset file, e.g. from 'predictor_cache.file_sha256'.
+    - seasonality (int, float or list): The seasonality of the dataset, as in SEASONALITY_MAP.
+    - split: Anything defining the training and test parts of the series, e.g. forecast_horizon=6.
+
+    Returns:
+    - The name of the cache entry (str).
+    """
+    key_content = json.dumps({
+        'dataset_hash': dataset_hash,
+        'seasonality': int(np.min(seasonality)),
+        'split': split,
+    }, sort_keys=True)
+    return hashlib.sha256(key_content.encode()).hexdigest()[:32]
+
+
+def load_error_scales(key, cache_dir=SCALE_CACHE_DIR):
+    """
+    Loads the error scales of a dataset.
+
+    Returns:
+    - The dict of the error scales, or None if they are not in the cache.
+    """
+    entry_path = Path(cache_dir) / f'{key}.npz'
+    if not entry_path.exists():
+        return None
+    with np.load(entry_path) as entry:
+        return {name: entry[name] for name in entry.files}
+
+
+def save_error_scales(error_scales, key, cache_dir=SCALE_CACHE_DIR):
+    """
+    Saves the error scales of a dataset.
+    The file is written under a temporary name and renamed, so processes evaluating the same dataset never read it partly written.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = Path(cache_dir) / f'.{key}.{os.getpid()}.tmp.npz'
+    np.savez(temporary_path, **error_scales)
+    os.replace(temporary_path, Path(cache_dir) / f'{key}.npz')
+
+
+def get_error_scales(training_set, test_set, seasonality, key=None, cache_dir=SCALE_CACHE_DIR):
+    """
+    Gets the error scales of a dataset from the cache, calculating and saving them on the first call.
+
+    Parameters:
+    - training_set (list): The training values of each series, or a tuple (values, offsets) from 'build_series_buffer'.
+    - test_set (array-like, optional): Matrix of the actual values.
+    - seasonality (int, float or list): The seasonality of the dataset, as in SEASONALITY_MAP.
+    - key (str, optional): The key of the dataset, from 'scale_cache_key'. Without a key, the scales are only calculated.
+    - cache_dir (str): Folder of the cache.
+
+    Returns:
+    - The dict of the error scales, to be passed to 'calculate_errors' and 'calculate_step_errors'.
+    """
+    error_scales = load_error_scales(key, cache_dir) if key is not None else None
+    if error_scales is None or (test_set is not None and 'msmape_denominators' not in error_scales):
+        error_scales = calculate_error_scales(training_set, test_set, seasonality)
+        if key is not None:
+            save_error_scales(error_scales, key, cache_dir)
+    return error_scales
@@ -0,0 +1,111 @@
+'''
+This script builds the training and test data of the deep learning experiments without walking the dataset row by row.
+
+All the values of a dataset are copied once into a contiguous buffer, with an array of offsets marking where each series
+starts and ends. The train, test and full targets of every series are then slices (views) of that buffer, so splitting
+the last 'forecast_horizon' values of each series costs no copy. The start timestamps of all series are converted to
+periods in a single call, and the targets handed to GluonTS are views of a float32 copy of the buffer, the type GluonTS
+converts its targets to, so it does not copy them again.
+'''
+import numpy as np
+import pandas as pd
+
+
+def build_series_buffer(series_values):
+    """
+    Copies the values of all series into one contiguous buffer.
+
+    Parameters:
+    - series_values (iterable): The values of each series, as in the 'series_value' column of 'convert_tsf_to_dataframe'.
+      Missing values given as 'NaN' strings become NaN.
+
+    Returns:
+    - A tuple (values, offsets): the float64 buffer with all the values and an int64 array of length n_series + 1,
+      where the values of series i are values[offsets[i]:offsets[i + 1]].
+    """
+    arrays = [np.asarray(values, dtype=float) for values in series_values]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in arrays], out=offsets[1:])
+    values = np.concatenate(arrays) if arrays else np.empty(0)
+    return values, offsets
+
+
+def split_series_views(values, offsets, forecast_horizon):
+    """
+    Splits every series of a buffer into its train and test parts, as views of the buffer.
+
+    Parameters:
+    - values (ndarray): The buffer with the values of all series, from 'build_series_buffer'.
+    - offsets (ndarray): The offsets of the series inside the buffer.
+    - forecast_horizon (int): Number of values at the end of each series kept for the test.
+
+    Returns:
+    - A tuple (train_series, test_series, full_series) of lists of arrays, one per series.
+    """
+    starts, ends = offsets[:-1], offsets[1:]
+    if (ends - starts < forecast_horizon).any():
+        raise Exception(f'All series must have at least {forecast_horizon} values to split the forecast horizon.')
+    splits = ends - forecast_horizon
+    train_series = [values[start:split] for start, split in zip(starts, splits)]
+    test_series = [values[split:end] for split, end in zip(splits, ends)]
+    full_series = [values[start:end] for start, end in zip(starts, ends)]
+    return train_series, test_series, full_series
+
+
+def split_series_buffer(values, offsets, forecast_horizon):
+    """
+    Splits every series of a buffer into its train and test parts, with the train parts copied into a buffer of their own,
+    for the models trained on the whole dataset at once.
+
+    Parameters:
+    - values (ndarray): The buffer with the values of all series, from 'build_series_buffer'.
+    - offsets (ndarray): The offsets of the series inside the buffer.
+    - forecast_horizon (int): Number of values at the end of each series kept for the test.
+
+    Returns:
+    - A tuple (train_values, train_offsets, test_matrix): the buffer and offsets of the train parts, and the
+      (n_series, forecast_horizon) matrix of the test values.
+    """
+    starts, ends = offsets[:-1], offsets[1:]
+    if (ends - starts < forecast_horizon).any():
+        raise Exception(f'All series must have at least {forecast_horizon} values to split the forecast horizon.')
+    test_positions = ends[:, None] - forecast_horizon + np.arange(forecast_horizon)
+    train_mask = np.ones(len(values), dtype=bool)
+    train_mask[test_positions.ravel()] = False
+    train_offsets = offsets - forecast_horizon * np.arange(len(offsets))
+    return values[train_mask], train_offsets, values[test_positions]
+
+
+def bulk_start_periods(start_timestamps, freq):
+    """
+    Converts the start timestamps of all series to periods of the given frequency in a single call.
+
+    Parameters:
+    - start_timestamps (iterable): The start timestamp of each series.
+    - freq (str): The GluonTS frequency, from FREQUENCY_MAP.
+
+    Returns:
+    - A PeriodIndex with the start of each series.
+    """
+    return pd.DatetimeIndex(start_timestamps).to_period(freq)
+
+
+def build_gluonts_entries(values, offsets, starts, forecast_horizon, target_field='target', start_field='start'):
+    """
+    Builds the train and test entries of a GluonTS dataset, with targets that are float32 views of a single buffer.
+
+    Parameters:
+    - values (ndarray): The buffer with the values of all series, from 'build_series_buffer'.
+    - offsets (ndarray): The offsets of the series inside the buffer.
+    - starts (PeriodIndex): The start period of each series, from 'bulk_start_periods'.
+    - forecast_horizon (int): Number of values at the end of each series left out of the train entries.
+    - target_field (str): Name of the target field, 'FieldName.TARGET' in GluonTS.
+    - start_field (str): Name of the start field, 'FieldName.START' in GluonTS.
+
+    Returns:
+    - A tuple (train_entries, test_entries) of lists of dictionaries, which GluonTS accepts as datasets.
+    """
+    train_targets, _, full_targets = split_series_views(values.astype(np.float32), offsets, forecast_horizon)
+    train_entries = [{target_field: target, start_field: start} for target, start in zip(train_targets, starts)]
+    test_entries = [{target_field: target, start_field: start} for target, start in zip(full_targets, starts)]
+    return train_entries, test_entries
@@ -0,0 +1,207 @@
+'''
+This script hands a parsed dataset to worker processes through shared memory instead of pickling it into every task.
+
+'publish_dataset' copies the contiguous buffer of values and the offsets of the series (see 'series_buffer.py') into
+'multiprocessing.shared_memory' blocks, with a third block holding the pickled metadata (series names, start timestamps,
+frequency, horizon...). It returns a handle, a small dictionary with the names, dtypes and shapes of the blocks, which is
+what gets sent to the workers. 'attach_dataset' opens the blocks by name and returns NumPy arrays backed by the shared
+memory, so no process copies the values.
+
+Both sides are reference counted within their process: attaching a dataset that is already attached returns the same
+arrays, and the blocks are closed when 'release_dataset' is called as many times as 'attach_dataset'. The publisher
+unlinks the blocks when its own count, started by 'publish_dataset', reaches zero, so they disappear once the owner is
+done, even if a worker is still attached (its mapping stays valid until it releases it). Attached blocks are not
+registered to the resource tracker of the worker, which would otherwise unlink them when the worker exits.
+'''
+import pickle
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+try:
+    from src.utils.series_buffer import build_series_buffer
+except ImportError:
+    from utils.series_buffer import build_series_buffer
+
+'''Shared memory opened by this process, by handle name: the blocks, the attached dataset and the reference count'''
+_published = {}
+_attached = {}
+
+
+def create_block(nbytes):
+    """
+    Creates a shared memory block of at least one byte (empty blocks are not allowed).
+    """
+    return shared_memory.SharedMemory(create=True, size=max(int(nbytes), 1))
+
+
+def open_block(name):
+    """
+    Opens an existing shared memory block without registering it to the resource tracker of this process,
+    which would unlink it when the process exits although the block belongs to the publisher.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # 'track' was added in Python 3.13
+        pass
+    # Before 3.13 every attach registers the block. Unregistering it afterwards is not enough: spawned workers share
+    # the tracker of their parent, where it would remove the registration of the publisher, so it is never registered
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def publish_dataset(values, offsets, metadata=None):
+    """
+    Copies a dataset into shared memory.
+
+    Parameters:
+    - values (ndarray): The buffer with the values of all series, from 'build_series_buffer'.
+    - offsets (ndarray): The offsets of the series inside the buffer.
+    - metadata (dict, optional): Anything describing the dataset or its series, e.g. the series names.
+
+    Returns:
+    - The handle of the dataset (dict), to be sent to the workers and passed to 'attach_dataset' and 'unpublish_dataset'.
+    """
+    arrays = {'values': np.ascontiguousarray(values), 'offsets': np.ascontiguousarray(offsets, dtype=np.int64)}
+    metadata_bytes = pickle.dumps(metadata or {}, protocol=pickle.HIGHEST_PROTOCOL)
+    blocks = {}
+    try:
+        for block_name, array in arrays.items():
+            blocks[block_name] = create_block(array.nbytes)
+            np.ndarray(array.shape, array.dtype, buffer=blocks[block_name].buf)[...] = array
+        blocks['metadata'] = create_block(len(metadata_bytes))
+        blocks['metadata'].buf[:len(metadata_bytes)] = metadata_bytes
+    except Exception:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+        raise
+    handle = {
+        'name': blocks['values'].name,
+        'blocks': {block_name: block.name for block_name, block in blocks.items()},
+        'values_dtype': arrays['values'].dtype.str,
+        'values_shape': arrays['values'].shape,
+        'n_series': len(arrays['offsets']) - 1,
+        'metadata_nbytes': len(metadata_bytes),
+    }
+    _published[handle['name']] = {'blocks': blocks, 'refcount': 1}
+    return handle
+
+
+def publish_dataframe(dataset, value_column='series_value', **metadata):
+    """
+    Publishes a dataset loaded by 'convert_tsf_to_dataframe': the values of 'value_column' go into the shared buffer,
+    and the other columns, as lists, into the metadata with the keyword arguments (e.g. frequency=..., horizon=...).
+    """
+    values, offsets = build_series_buffer(dataset[value_column])
+    columns = dataset.drop(columns=value_column).to_dict('list')
+    return publish_dataset(values, offsets, {'columns': columns, **metadata})
+
+
+def retain_dataset(handle):
+    """
+    Adds a reference to a dataset published by this process, so one more 'unpublish_dataset' is needed to remove it.
+    """
+    _published[handle['name']]['refcount'] += 1
+
+
+def unpublish_dataset(handle):
+    """
+    Removes a reference to a dataset published by this process, and unlinks its blocks when none is left.
+
+    Returns:
+    - True if the blocks were unlinked.
+    """
+    published = _published.get(handle['name'])
+    if published is None:
+        raise Exception(f"Dataset {handle['name']} was not published by this process or was already unpublished.")
+    published['refcount'] -= 1
+    if published['refcount'] > 0:
+        return False
+    del _published[handle['name']]
+    for block in published['blocks'].values():
+        block.close()
+        block.unlink()
+    return True
+
+
+def attach_dataset(handle):
+    """
+    Attaches to a published dataset, without copying it.
+
+    Parameters:
+    - handle (dict): The handle from 'publish_dataset'.
+
+    Returns:
+    - A dict with the 'values' and 'offsets' arrays, backed by shared memory and read-only, and the 'metadata'.
+      The arrays must not be used after the matching 'release_dataset'.
+    """
+    attached = _attached.get(handle['name'])
+    if attached is not None:
+        attached['refcount'] += 1
+        return attached['dataset']
+    blocks = {block_name: open_block(name) for block_name, name in handle['blocks'].items()}
+    values = np.ndarray(handle['values_shape'], np.dtype(handle['values_dtype']), buffer=blocks['values'].buf)
+    offsets = np.ndarray((handle['n_series'] + 1,), np.int64, buffer=blocks['offsets'].buf)
+    values.flags.writeable = False
+    offsets.flags.writeable = False
+    dataset = {
+        'values': values,
+        'offsets': offsets,
+        'metadata': pickle.loads(blocks['metadata'].buf[:handle['metadata_nbytes']]),
+    }
+    _attached[handle['name']] = {'blocks': blocks, 'dataset': dataset, 'refcount': 1}
+    return dataset
+
+
+def release_dataset(handle):
+    """
+    Removes a reference to an attached dataset, and closes its blocks in this process when none is left.
+
+    Returns:
+    - True if the blocks were closed.
+    """
+    attached = _attached.get(handle['name'])
+    if attached is None:
+        raise Exception(f"Dataset {handle['name']} is not attached in this process.")
+    attached['refcount'] -= 1
+    if attached['refcount'] > 0:
+        return False
+    del _attached[handle['name']]
+    # The arrays must be dropped before closing, as a block whose buffer is still used cannot be closed
+    attached['dataset'].clear()
+    for block in attached['blocks'].values():
+        try:
+            block.close()
+        except BufferError:
+            pass  # An array of the caller is still alive: the mapping is closed when it is garbage collected
+    return True
+
+
+@contextmanager
+def shared_dataset(values, offsets, metadata=None):
+    """
+    Publishes a dataset for the duration of a 'with' block, yielding its handle.
+    """
+    handle = publish_dataset(values, offsets, metadata)
+    try:
+        yield handle
+    finally:
+        unpublish_dataset(handle)
+
+
+@contextmanager
+def attached_dataset(handle):
+    """
+    Attaches to a published dataset for the duration of a 'with' block, yielding the attached dataset.
+    """
+    dataset = attach_dataset(handle)
+    try:
+        yield dataset
+    finally:
+        release_dataset(handle)
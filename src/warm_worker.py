@@ -0,0 +1,343 @@
+'''
+This script runs an optional warm worker: a local process that keeps the parsed datasets and the heavy modules
+(pandas, statsmodels, arch...) loaded between the tasks of the pipeline, so iterating on the tables or the statistics
+does not parse the same .tsf files and import the same modules on every run.
+
+The worker listens on the Unix socket WARM_WORKER_SOCKET of 'config.py' and runs the functions of WORKER_FUNCTIONS
+(Table 1, Table 2, the error statistics and the dataset statistics) one request at a time. In the worker, the modules of
+these functions read the .tsf files through a cache of the parsed DataFrames, keyed by the path, modification time and
+size of each file, so a changed file is parsed again. The cache is limited to WARM_WORKER_MEMORY_MB and evicts the least
+recently used datasets first. In the same way, the worker records the modification time and size of the file of each
+module it runs, and reloads the modules edited since, so the tasks rerun by 'doit' after a change of their code run the
+new code. Changes to the other modules they import need a restart of the worker.
+
+The requests are pickled, so only the user running the worker may connect to it: the socket is created readable by this
+user only, and the clients authenticate with a random key written next to it, in a file readable by this user only.
+
+'run_in_worker' submits a function to the worker, and runs it in the calling process when no worker is running, so the
+pipeline works the same with or without it:
+
+    python src/warm_worker.py start    # in another terminal, or in the background
+    doit                               # the tasks now run in the worker
+    python src/warm_worker.py status
+    python src/warm_worker.py stop
+'''
+import importlib
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+
+import config
+
+'''The functions the worker runs, as module.function of the src folder'''
+WORKER_FUNCTIONS = [
+    'tables_create.generate_table1_dataframe',
+    'tables_create.generate_table2_dataframe',
+    'error_statistics.generate_error_statistics_tables',
+    'analysis_general.process_dataset',
+    'analysis_general.process_dataset_streaming',
+]
+
+'''The loader of the .tsf files replaced by the cached one in the modules of WORKER_FUNCTIONS'''
+TSF_LOADER_NAME = 'convert_tsf_to_dataframe'
+
+'''The modules imported when the worker starts'''
+PRELOADED_MODULES = ['tables_create', 'error_statistics', 'analysis_general']
+
+
+def import_src_module(module_name):
+    """
+    Imports a module of the src folder, as 'src.module' or 'module' depending on how the worker was started.
+    """
+    try:
+        return importlib.import_module(f'src.{module_name}')
+    except ImportError:
+        return importlib.import_module(module_name)
+
+
+def module_file_state(module):
+    """
+    Returns the modification time and size of the file of a module, which change when the module is edited.
+    """
+    stat = os.stat(module.__file__)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def import_worker_function(function_name, module_states=None):
+    """
+    Imports a function of WORKER_FUNCTIONS, reloading its module if its file changed since it was last run.
+
+    Parameters:
+    - function_name (str): The function, as module.function, e.g. 'tables_create.generate_table1_dataframe'.
+    - module_states (dict, optional): The state of the file of each module run by the worker, from 'module_file_state'.
+      It is updated with the module of the function. Without it, the modules are never reloaded.
+
+    Returns:
+    - A tuple (module, function).
+    """
+    if function_name not in WORKER_FUNCTIONS:
+        raise Exception(f'{function_name} is not one of the functions of the warm worker')
+    module_name, name = function_name.rsplit('.', 1)
+    module = import_src_module(module_name)
+    if module_states is not None:
+        state = module_file_state(module)
+        if module.__name__ in module_states and module_states[module.__name__] != state:
+            print(f'Reloading {module.__name__}')
+            module = importlib.reload(module)
+        module_states[module.__name__] = state
+    return module, getattr(module, name)
+
+
+def authkey_path(socket_path):
+    """
+    Returns the file of the key authenticating the clients of the worker listening on a socket.
+    """
+    return socket_path.with_name(socket_path.name + '.key')
+
+
+def write_authkey(socket_path):
+    """
+    Writes a new random key for the worker listening on a socket, in a file readable by the current user only.
+
+    Returns:
+    - The key (bytes).
+    """
+    authkey = os.urandom(32)
+    key_path = authkey_path(socket_path)
+    if key_path.exists():
+        key_path.unlink()
+    file_descriptor = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(file_descriptor, 'wb') as f:
+        f.write(authkey)
+    return authkey
+
+
+def start_dataset_cache(memory_mb=None):
+    """
+    Creates the cache of the parsed datasets.
+
+    Parameters:
+    - memory_mb (float, optional): The memory of the cached DataFrames. Defaults to WARM_WORKER_MEMORY_MB.
+
+    Returns:
+    - The cache (dict), to be passed to 'cached_tsf_loader'.
+    """
+    memory_mb = config.WARM_WORKER_MEMORY_MB if memory_mb is None else memory_mb
+    return {'entries': OrderedDict(), 'n_bytes': 0, 'max_bytes': memory_mb * 2 ** 20, 'hits': 0, 'misses': 0}
+
+
+def evict_datasets(dataset_cache):
+    """
+    Removes the least recently used datasets until the cache fits its memory, always keeping the last one.
+    """
+    entries = dataset_cache['entries']
+    while dataset_cache['n_bytes'] > dataset_cache['max_bytes'] and len(entries) > 1:
+        _, (_, n_bytes) = entries.popitem(last=False)
+        dataset_cache['n_bytes'] -= n_bytes
+
+
+def cached_tsf_loader(dataset_cache, loader):
+    """
+    Wraps a loader of .tsf files, such as 'convert_tsf_to_dataframe', so each file is parsed once.
+
+    Parameters:
+    - dataset_cache (dict): The cache, from 'start_dataset_cache'.
+    - loader (function): The loader, returning the DataFrame first and the information of the dataset after it.
+
+    Returns:
+    - The cached loader, with the same arguments. It returns a copy of the DataFrame and of the values of its series,
+      so the callers can modify them without changing the cached dataset.
+    """
+    def cached_loader(full_file_path_and_name, *args, **kwargs):
+        stat = os.stat(full_file_path_and_name)
+        key = (str(Path(full_file_path_and_name).resolve()), stat.st_mtime_ns, stat.st_size, args, tuple(sorted(kwargs.items())))
+        entries = dataset_cache['entries']
+        if key in entries:
+            entries.move_to_end(key)
+            dataset_cache['hits'] += 1
+            result, _ = entries[key]
+        else:
+            dataset_cache['misses'] += 1
+            result = loader(full_file_path_and_name, *args, **kwargs)
+            n_bytes = int(result[0].memory_usage(deep=True).sum())
+            entries[key] = (result, n_bytes)
+            dataset_cache['n_bytes'] += n_bytes
+            evict_datasets(dataset_cache)
+        df = result[0].copy()
+        # The copy of a DataFrame keeps the arrays stored in its object columns, so the series are copied one by one
+        if 'series_value' in df.columns:
+            df['series_value'] = df['series_value'].map(lambda values: values.copy() if hasattr(values, 'copy') else values)
+        return (df,) + tuple(result[1:])
+    cached_loader.loader = loader
+    return cached_loader
+
+
+def use_dataset_cache(module, dataset_cache):
+    """
+    Makes a module read the .tsf files through the cache, if it has a loader of .tsf files.
+    """
+    loader = getattr(module, TSF_LOADER_NAME, None)
+    if loader is not None and not hasattr(loader, 'loader'):
+        setattr(module, TSF_LOADER_NAME, cached_tsf_loader(dataset_cache, loader))
+
+
+def handle_request(request, dataset_cache, module_states=None):
+    """
+    Runs a request of a client in the worker.
+
+    Parameters:
+    - request (tuple): ('call', function_name, args, kwargs), ('status',) or ('stop',).
+    - dataset_cache (dict): The cache of the parsed datasets.
+    - module_states (dict, optional): The state of the files of the modules run by the worker, see 'import_worker_function'.
+
+    Returns:
+    - The response, a tuple ('ok', result) or ('error', traceback).
+    """
+    try:
+        if request[0] == 'call':
+            _, function_name, args, kwargs = request
+            module, function = import_worker_function(function_name, module_states)
+            use_dataset_cache(module, dataset_cache)
+            return ('ok', function(*args, **kwargs))
+        if request[0] in ['status', 'stop']:
+            return ('ok', {
+                'pid': os.getpid(),
+                'datasets': len(dataset_cache['entries']),
+                'memory_mb': dataset_cache['n_bytes'] / 2 ** 20,
+                'hits': dataset_cache['hits'],
+                'misses': dataset_cache['misses'],
+            })
+        raise Exception(f'Unknown request: {request[0]}')
+    except Exception:
+        return ('error', traceback.format_exc())
+
+
+def serve(socket_path=None, memory_mb=None):
+    """
+    Runs the warm worker until it receives a 'stop' request.
+
+    Parameters:
+    - socket_path (Path, optional): The Unix socket of the worker. Defaults to WARM_WORKER_SOCKET.
+    - memory_mb (float, optional): The memory of the cached datasets. Defaults to WARM_WORKER_MEMORY_MB.
+    """
+    socket_path = Path(config.WARM_WORKER_SOCKET if socket_path is None else socket_path)
+    if socket_path.exists():
+        if worker_status(socket_path) is not None:
+            raise Exception(f'A warm worker is already running on {socket_path}')
+        socket_path.unlink()
+    # The relative paths of the tasks are relative to the base directory, as when they run from 'doit'
+    os.chdir(config.BASE_DIR)
+    dataset_cache = start_dataset_cache(memory_mb)
+    module_states = {}
+    for module_name in PRELOADED_MODULES:
+        try:
+            module = import_src_module(module_name)
+            module_states[module.__name__] = module_file_state(module)
+        except ImportError as e:
+            print(f'Could not preload {module_name}: {e}')
+
+    # Only the user running the worker can submit functions to it: the socket is created with no permissions for the
+    # others, rather than restricted after it is bound, and the clients must know the key
+    authkey = write_authkey(socket_path)
+    umask = os.umask(0o077)
+    try:
+        listener = Listener(str(socket_path), family='AF_UNIX', authkey=authkey)
+    finally:
+        os.umask(umask)
+    print(f'Warm worker {os.getpid()} listening on {socket_path}')
+    try:
+        while True:
+            try:
+                connection = listener.accept()
+            except AuthenticationError:
+                print('Rejected a client with a wrong key')
+                continue
+            with connection:
+                request = connection.recv()
+                start_time = time.perf_counter()
+                response = handle_request(request, dataset_cache, module_states)
+                connection.send(response)
+                if request[0] == 'call':
+                    print(f'{request[1]} ({response[0]}) in {time.perf_counter() - start_time:.2f} s')
+                if request[0] == 'stop':
+                    break
+    finally:
+        listener.close()
+        for path in [socket_path, authkey_path(socket_path)]:
+            if path.exists():
+                path.unlink()
+
+
+def send_request(request, socket_path=None):
+    """
+    Sends a request to the warm worker.
+
+    Returns:
+    - The response of the worker, or None if no worker is running.
+    """
+    socket_path = Path(config.WARM_WORKER_SOCKET if socket_path is None else socket_path)
+    if not socket_path.exists():
+        return None
+    try:
+        authkey = authkey_path(socket_path).read_bytes()
+        connection = Client(str(socket_path), family='AF_UNIX', authkey=authkey)
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None
+    with connection:
+        connection.send(request)
+        return connection.recv()
+
+
+def worker_status(socket_path=None):
+    """
+    Returns the status of the warm worker (dict), or None if no worker is running.
+    """
+    response = send_request(('status',), socket_path)
+    return None if response is None else response[1]
+
+
+def stop_worker(socket_path=None):
+    """
+    Stops the warm worker. Returns its last status, or None if no worker was running.
+    """
+    response = send_request(('stop',), socket_path)
+    return None if response is None else response[1]
+
+
+def run_in_worker(function_name, *args, socket_path=None, **kwargs):
+    """
+    Runs a function of WORKER_FUNCTIONS in the warm worker, or in this process if no worker is running.
+
+    Parameters:
+    - function_name (str): The function, as module.function, e.g. 'tables_create.generate_table1_dataframe'.
+    - args, kwargs: The arguments of the function.
+    - socket_path (Path, optional): The Unix socket of the worker. Defaults to WARM_WORKER_SOCKET.
+
+    Returns:
+    - The result of the function.
+    """
+    response = send_request(('call', function_name, args, kwargs), socket_path)
+    if response is None:
+        _, function = import_worker_function(function_name)
+        return function(*args, **kwargs)
+    status, result = response
+    if status == 'error':
+        raise Exception(f'{function_name} failed in the warm worker:\n{result}')
+    return result
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'start'
+    if command == 'start':
+        serve()
+    elif command == 'status':
+        print(worker_status() or 'No warm worker is running')
+    elif command == 'stop':
+        print(stop_worker() or 'No warm worker is running')
+    else:
+        raise Exception(f'Unknown command: {command}')
@@ -1,7 +1,3 @@
-from datetime import datetime
-from distutils.util import strtobool
-
-import pandas as pd
 import os
 import config
 
@@ -19,7 +15,13 @@ DATASETS_TO_IGNORE = [
 
 
 def convert_tables_to_json():
-    csv_tables = [t for t in os.listdir(BASE_DIR / 'output' / 'tables') if t.endswith('.csv') and t != 'table1.csv']
+    import pandas as pd
+
+    # Only the error tables hold one row per dataset, the statistics of Table 2 are not shown on the website
+    csv_tables = [
+        t for t in os.listdir(BASE_DIR / 'output' / 'tables')
+        if t.endswith('.csv') and (t == 'table2.csv' or t.startswith('table_'))
+    ]
     error_metric_results = {}
     for table_name in csv_tables:
         try: